@@ -0,0 +1,230 @@
+import numpy as np
+import pandas as pd
+import time
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from dataset import load_all_treatment_data
+
+MAX_LAG = 60  # Lags reported in the ACF/PACF tables (one sample per minute: one hour)
+SOKAL_WINDOW = 5  # Sokal's automatic window: sum lags up to the first M >= SOKAL_WINDOW * tau(M)
+REPORTED_LAGS = [1, 2, 5, 10, 30, 60]
+METRICS = ["tps", "cpu_usage", "ram_usage"]
+
+
+def acf_fft(values, max_lag=None):
+    """
+    Sample autocorrelation function through the FFT in O(n log n).
+
+    The demeaned series is zero-padded to a power of two of at least 2n (so the
+    circular correlation equals the linear one) and the autocovariances are the
+    inverse transform of its power spectrum, divided by n as in statsmodels' acf.
+
+    Args:
+        values: 1-D array without missing values
+        max_lag: Last lag returned (default: n - 1)
+
+    Returns:
+        Array of autocorrelations for lags 0..max_lag (NaN when the series is constant)
+    """
+    values = np.asarray(values, dtype="float64")
+    n = len(values)
+    max_lag = n - 1 if max_lag is None else min(max_lag, n - 1)
+    if n == 0:
+        return np.empty(0)
+    centered = values - values.mean()
+    size = 1 << int(2 * n - 1).bit_length()
+    spectrum = np.fft.rfft(centered, size)
+    autocovariance = np.fft.irfft(spectrum * np.conjugate(spectrum), size)[:max_lag + 1]
+    if autocovariance[0] <= 0:
+        return np.full(max_lag + 1, np.nan)
+    return autocovariance / autocovariance[0]
+
+
+def pacf_from_acf(acf, max_lag=None):
+    """
+    Partial autocorrelations for lags 0..max_lag from the ACF (Durbin-Levinson recursion).
+    """
+    max_lag = len(acf) - 1 if max_lag is None else min(max_lag, len(acf) - 1)
+    pacf = np.full(max_lag + 1, np.nan)
+    if max_lag < 0 or np.isnan(acf[0]):
+        return pacf
+    pacf[0] = 1.0
+    phi = np.empty(0)
+    variance = 1.0
+    for k in range(1, max_lag + 1):
+        reflection = (acf[k] - np.dot(phi, acf[k - 1:0:-1])) / variance if variance > 0 else 0.0
+        phi = np.append(phi - reflection * phi[::-1], reflection)
+        variance *= 1 - reflection ** 2
+        pacf[k] = reflection
+    return pacf
+
+
+def integrated_time(acf, window=SOKAL_WINDOW):
+    """
+    Integrated autocorrelation time tau = 1 + 2 * sum of rho_k, with the sum cut at
+    Sokal's automatic window (the first M with M >= window * tau(M)); the effective
+    sample size of n dependent samples is n / tau.
+
+    tau is clamped to at least 1 (never more effective samples than samples); a
+    constant series gives NaN.
+    """
+    if len(acf) == 0 or np.isnan(acf[0]):
+        return np.nan
+    taus = 2 * np.cumsum(acf) - 1
+    within = np.arange(len(taus)) >= window * taus
+    cut = int(np.argmax(within)) if within.any() else len(taus) - 1
+    return max(1.0, taus[cut])
+
+
+def iteration_segments(df, metric):
+    """
+    Time-ordered values of metric for every (treatment, iteration), found with one
+    lexsort over integer codes instead of a pandas groupby.
+
+    Yields:
+        (treatment, iteration, values) with missing values dropped
+    """
+    rows = df[df[metric].notna()]
+    treatments = rows["treatment"].astype("category")
+    iterations = rows["iteration"].astype("category")
+    treatment_codes = treatments.cat.codes.to_numpy()
+    iteration_codes = iterations.cat.codes.to_numpy()
+    dates = pd.DatetimeIndex(rows["date"]).asi8
+    order = np.lexsort((dates, iteration_codes, treatment_codes))
+    values = rows[metric].to_numpy(dtype="float64")[order]
+    keys = treatment_codes[order].astype("int64") * (len(iterations.cat.categories) + 1) + iteration_codes[order]
+    bounds = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1], True])
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        yield (treatments.cat.categories[treatment_codes[order[start]]],
+               iterations.cat.categories[iteration_codes[order[start]]], values[start:stop])
+
+
+def iteration_autocorrelation(df, metrics=METRICS, max_lag=MAX_LAG):
+    """
+    ACF, PACF, integrated autocorrelation time and effective sample size of every
+    treatment x iteration x metric series.
+
+    Iterations are separate runs of the server, so each is its own series; a
+    constant iteration counts as one effective sample.
+
+    Returns:
+        (per-iteration DataFrame with n, tau, ess and the REPORTED_LAGS of the ACF and
+         PACF, dict {(metric, treatment, iteration): (acf, pacf)} up to max_lag)
+    """
+    rows = []
+    functions = {}
+    for metric in metrics:
+        for treatment, iteration, values in iteration_segments(df, metric):
+            n = len(values)
+            acf = acf_fft(values)
+            tau = integrated_time(acf)
+            ess = n / tau if not np.isnan(tau) else min(n, 1.0)
+            pacf = pacf_from_acf(acf, max_lag)
+            row = {"treatment": treatment, "iteration": iteration, "metric": metric, "n": n,
+                   "tau": tau, "ess": ess}
+            for lag in REPORTED_LAGS:
+                row[f"acf_{lag}"] = acf[lag] if lag < len(acf) else np.nan
+            for lag in REPORTED_LAGS[:2]:
+                row[f"pacf_{lag}"] = pacf[lag] if lag < len(pacf) else np.nan
+            rows.append(row)
+            functions[(metric, treatment, iteration)] = (acf[:max_lag + 1], pacf)
+    return pd.DataFrame(rows), functions
+
+
+def effective_sample_sizes(df, metric=None, per_iteration=None):
+    """
+    Effective sample size of every treatment: the sum of its iterations' n / tau.
+
+    Args:
+        df: Combined data (ignored when per_iteration is given)
+        metric: Metric whose sizes to return
+        per_iteration: iteration_autocorrelation(...)[0], to reuse it
+
+    Returns:
+        Dict {treatment: effective sample size}
+    """
+    if per_iteration is None:
+        per_iteration = iteration_autocorrelation(df, [metric])[0]
+    rows = per_iteration[per_iteration["metric"] == metric] if metric is not None else per_iteration
+    return rows.groupby("treatment", observed=True, sort=True)["ess"].sum().to_dict()
+
+
+def treatment_report(per_iteration):
+    """n, effective n, their ratio and the n-weighted tau of every treatment and metric."""
+    grouped = per_iteration.groupby(["metric", "treatment"], observed=True, sort=False)
+    report = grouped.agg(n=("n", "sum"), ess=("ess", "sum"), iterations=("iteration", "size")).reset_index()
+    report["tau"] = report["n"] / report["ess"]
+    report["ess_ratio"] = report["ess"] / report["n"]
+    return report
+
+
+def treatment_functions(per_iteration, functions, max_lag=MAX_LAG):
+    """
+    ACF and PACF of every treatment and metric: the per-iteration functions averaged
+    with weights n - lag (the number of pairs each iteration contributes at that lag).
+
+    Returns:
+        Long DataFrame with metric, treatment, lag, acf and pacf
+    """
+    rows = []
+    lags = np.arange(max_lag + 1)
+    for (metric, treatment), group in per_iteration.groupby(["metric", "treatment"], observed=True, sort=False):
+        acf_sum, pacf_sum, weight_sum = np.zeros(max_lag + 1), np.zeros(max_lag + 1), np.zeros(max_lag + 1)
+        for iteration, n in zip(group["iteration"], group["n"]):
+            acf, pacf = functions[(metric, treatment, iteration)]
+            weights = np.clip(n - lags[:len(acf)], 0, None).astype("float64")
+            valid = ~np.isnan(acf)
+            acf_sum[:len(acf)] += np.where(valid, acf * weights, 0)
+            pacf_sum[:len(pacf)] += np.where(valid[:len(pacf)], np.nan_to_num(pacf) * weights[:len(pacf)], 0)
+            weight_sum[:len(acf)] += np.where(valid, weights, 0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rows.append(pd.DataFrame({"metric": metric, "treatment": treatment, "lag": lags,
+                                      "acf": acf_sum / weight_sum, "pacf": pacf_sum / weight_sum}))
+    return pd.concat(rows, ignore_index=True) if rows else pd.DataFrame()
+
+
+def comprehensive_autocorrelation_analysis(df, save_path="autocorrelation_analysis"):
+    """
+    Autocorrelation and effective sample size report for all metrics
+    """
+    if df is None or df.empty:
+        print("No data to analyze")
+        return
+
+    os.makedirs(save_path, exist_ok=True)
+    start = time.perf_counter()
+    per_iteration, functions = iteration_autocorrelation(df)
+    report = treatment_report(per_iteration)
+    elapsed = time.perf_counter() - start
+
+    print("\n" + "="*80)
+    print("AUTOCORRELATION AND EFFECTIVE SAMPLE SIZE")
+    print("="*80)
+    print(f"{len(per_iteration)} treatment x iteration x metric series in {elapsed:.2f}s")
+    for metric, rows in report.groupby("metric", sort=False):
+        print(f"\n{metric.upper()}:")
+        for _, row in rows.iterrows():
+            print(f"  {row['treatment']}: n={row['n']}, effective n={row['ess']:.0f} "
+                  f"({row['ess_ratio']:.1%}), tau={row['tau']:.1f}, iterations={row['iterations']}")
+
+    per_iteration.to_csv(f"{save_path}/autocorrelation_by_iteration.csv", index=False)
+    report.to_csv(f"{save_path}/effective_sample_sizes.csv", index=False)
+    treatment_functions(per_iteration, functions).to_csv(f"{save_path}/acf_pacf_by_treatment.csv", index=False)
+    print(f"\nAutocorrelation results saved in: {save_path}")
+    return report
+
+def main():
+    """
+    Main function to compute the autocorrelation report
+    """
+    df = load_all_treatment_data()
+
+    if df is not None:
+        comprehensive_autocorrelation_analysis(df)
+    else:
+        print("Failed to load data. Please check your data files.")
+
+if __name__ == "__main__":
+    main()
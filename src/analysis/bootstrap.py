@@ -0,0 +1,322 @@
+import numpy as np
+import pandas as pd
+import argparse
+import time
+import os
+import sys
+from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from dataset import load_all_treatment_data
+
+BOOTSTRAP_RESAMPLES = 10_000
+BOOTSTRAP_SEED = 20250612
+CONFIDENCE = 0.95
+PERCENTILES = [0.05, 0.95]  # Reported besides the mean and the median
+TASK_RESAMPLES = 1_000  # Resamples per process pool task (and per seeded stream)
+BATCH_RESAMPLES = 250  # Most resamples built and summarized at once inside a task...
+BATCH_BYTES = 64 * 2**20  # ...as long as their dense (resamples, n) work arrays fit in this many bytes
+BYTES_PER_VALUE = 48  # Indices, weights, reordered weights, cumulative weights and one comparison mask
+BOOTSTRAP_MODES = ["block", "cluster"]
+MIN_CLUSTERS = 5  # Fewer iterations than this make cluster intervals unreliable (flagged as few_clusters)
+METRICS = ["tps", "cpu_usage", "ram_usage"]
+
+
+def default_block_length(n):
+    """Moving-block length for a series of n samples: n ** (1/3), the usual rate for means."""
+    return max(1, int(round(n ** (1 / 3))))
+
+
+def statistic_names(percentiles=PERCENTILES):
+    return ["mean", "median"] + [f"p{q * 100:g}" for q in percentiles]
+
+
+def treatment_series(df, metric):
+    """
+    Non-missing values of metric per treatment, in time order within each iteration segment.
+
+    The iteration column holds the trimmed activity segments of each iteration
+    ("1_1", "1_2", ... for iteration 1, "2" when it was not split); the iteration
+    itself is the label before the underscore.
+
+    Returns:
+        Dict {treatment: dict with 'values' (time order), 'segments' (segment code of
+        every value; each segment is one contiguous run), 'clusters' (iteration code of
+        every value), 'order' (positions that sort the values) and 'sorted' (the sorted values)}
+    """
+    rows = df.loc[df[metric].notna(), ["treatment", "iteration", "date", metric]]
+    series = {}
+    for treatment, data in rows.groupby("treatment", observed=True, sort=True):
+        data = data.sort_values(["iteration", "date"], kind="mergesort")
+        values = data[metric].to_numpy(dtype="float64")
+        segments = pd.factorize(data["iteration"])[0]
+        clusters = pd.factorize(data["iteration"].astype(str).str.split("_").str[0])[0]
+        order = np.argsort(values, kind="mergesort")
+        series[treatment] = {"values": values, "segments": segments, "clusters": clusters,
+                             "order": order, "sorted": values[order]}
+    return series
+
+
+def block_indices(segments, block_length, count, rng):
+    """
+    Moving-block bootstrap resamples of one treatment's series as a (count, n) integer matrix.
+
+    Block starts are drawn uniformly over all n positions, so segments are chosen in
+    proportion to their length; a block that runs past the end of its segment wraps
+    to the segment's start (circular blocks), so no block spans a trimmed gap and
+    segments shorter than block_length still work.
+    """
+    n = len(segments)
+    segment_starts = np.flatnonzero(np.r_[True, segments[1:] != segments[:-1]])
+    segment_lengths = np.diff(np.r_[segment_starts, n])
+    segment_of = np.repeat(np.arange(len(segment_starts)), segment_lengths)
+
+    blocks = -(-n // block_length)
+    starts = rng.integers(0, n, size=(count, blocks))
+    first = segment_starts[segment_of[starts]][..., None]
+    length = segment_lengths[segment_of[starts]][..., None]
+    indices = first + (starts[..., None] - first + np.arange(block_length)) % length
+    return indices.reshape(count, blocks * block_length)[:, :n]
+
+
+def cluster_indices(clusters, count, rng):
+    """
+    Cluster bootstrap resamples as a (count, clusters) integer matrix: each row draws
+    as many iterations as the treatment has, with replacement.
+    """
+    clusters = int(clusters.max()) + 1 if len(clusters) else 0
+    return rng.integers(0, clusters, size=(count, clusters))
+
+
+def _resample_weights(series, mode, block_length, count, rng):
+    """(count, n) matrix of how many times each value (in sorted order) is drawn."""
+    segments = series["segments"]
+    n = len(segments)
+    if mode == "block":
+        indices = block_indices(segments, block_length, count, rng)
+        rows = np.repeat(np.arange(count) * n, indices.shape[1])
+        weights = np.bincount(rows + indices.ravel(), minlength=count * n).reshape(count, n)
+    else:
+        picks = cluster_indices(series["clusters"], count, rng)
+        clusters = picks.shape[1]
+        rows = np.repeat(np.arange(count) * clusters, clusters)
+        multiplicity = np.bincount(rows + picks.ravel(), minlength=count * clusters).reshape(count, clusters)
+        weights = multiplicity[:, series["clusters"]]
+    return weights[:, series["order"]]
+
+
+def weighted_statistics(weights, sorted_values, percentiles=PERCENTILES):
+    """
+    Mean, median and percentiles of every resample, given as count weights over the
+    sorted values; quantiles interpolate linearly as Series.quantile does.
+
+    Returns:
+        (resamples, statistics) array in the order of statistic_names(percentiles)
+    """
+    total = weights.sum(axis=1)
+    cumulative = np.cumsum(weights, axis=1)
+    columns = [weights @ sorted_values / total]
+    last = len(sorted_values) - 1
+    for q in [0.5] + list(percentiles):
+        position = q * (total - 1)
+        lower = np.floor(position)
+        below = np.minimum((cumulative <= lower[:, None]).sum(axis=1), last)
+        above = np.minimum((cumulative <= lower[:, None] + 1).sum(axis=1), last)
+        columns.append(sorted_values[below] + (sorted_values[above] - sorted_values[below]) * (position - lower))
+    return np.column_stack(columns)
+
+
+def batch_resamples(n):
+    """Resamples summarized at once for a series of n values: BATCH_RESAMPLES, fewer when they exceed BATCH_BYTES."""
+    return max(1, min(BATCH_RESAMPLES, BATCH_BYTES // (BYTES_PER_VALUE * max(n, 1))))
+
+
+def _bootstrap_task(series, mode, block_length, percentiles, count, seed):
+    """
+    Statistics of count resamples of one series from one seeded stream (a process
+    pool task), in batches sized by batch_resamples so memory stays bounded whatever n.
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    size = batch_resamples(len(series["values"]))
+    for start in range(0, count, size):
+        batch = min(size, count - start)
+        weights = _resample_weights(series, mode, block_length, batch, rng)
+        results.append(weighted_statistics(weights, series["sorted"], percentiles))
+    return np.vstack(results)
+
+
+def bootstrap_distributions(df, metrics=METRICS, mode="block", resamples=BOOTSTRAP_RESAMPLES,
+                            percentiles=PERCENTILES, block_length=None, seed=BOOTSTRAP_SEED, jobs=None):
+    """
+    Bootstrap distributions of the mean, median and percentiles of every treatment and metric.
+
+    Args:
+        df: Combined data (needs 'treatment', 'iteration' and 'date')
+        metrics: Metrics to resample
+        mode: "block" (moving blocks within each segment's time series) or
+            "cluster" (whole iterations)
+        resamples: Resamples per treatment and metric
+        percentiles: Percentiles reported besides the mean and median
+        block_length: Block length in samples (default: default_block_length per treatment)
+        seed: Seed; each (metric, treatment, TASK_RESAMPLES chunk) gets its own spawned
+            stream, so the result does not depend on jobs
+        jobs: Worker processes (default: CPU count; 1 runs in this process)
+
+    Returns:
+        Dict {(metric, treatment): dict with 'estimate' (statistics of the data),
+        'distribution' ((resamples, statistics) array), 'n', 'clusters' and 'block_length'}
+    """
+    if mode not in BOOTSTRAP_MODES:
+        raise ValueError(f"Unknown bootstrap mode '{mode}' (use one of {', '.join(BOOTSTRAP_MODES)})")
+
+    jobs_list = []
+    results = {}
+    chunks = [min(TASK_RESAMPLES, resamples - start) for start in range(0, resamples, TASK_RESAMPLES)]
+    streams = iter(np.random.SeedSequence(seed).spawn(len(metrics) * df["treatment"].nunique() * len(chunks)))
+    for metric in metrics:
+        for treatment, series in treatment_series(df, metric).items():
+            n = len(series["values"])
+            length = block_length or default_block_length(n)
+            results[(metric, treatment)] = {
+                "estimate": weighted_statistics(np.ones((1, n)), series["sorted"], percentiles)[0],
+                "n": n,
+                "clusters": int(series["clusters"].max()) + 1,
+                "block_length": length if mode == "block" else None,
+            }
+            for count in chunks:
+                jobs_list.append(((metric, treatment), (series, mode, length, percentiles, count, next(streams))))
+
+    jobs = min(jobs or os.cpu_count() or 1, len(jobs_list)) if jobs_list else 1
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [(key, pool.submit(_bootstrap_task, *args)) for key, args in jobs_list]
+            parts = [(key, future.result()) for key, future in futures]
+    else:
+        parts = [(key, _bootstrap_task(*args)) for key, args in jobs_list]
+
+    for key in results:
+        results[key]["distribution"] = np.vstack([part for part_key, part in parts if part_key == key])
+    return results
+
+
+def percentile_interval(distribution, confidence=CONFIDENCE):
+    """Percentile bootstrap interval of every column of a (resamples, statistics) array."""
+    alpha = 1 - confidence
+    if len(distribution) == 0:
+        nan = np.full(distribution.shape[1], np.nan)
+        return nan, nan
+    return np.quantile(distribution, alpha / 2, axis=0), np.quantile(distribution, 1 - alpha / 2, axis=0)
+
+
+def bootstrap_intervals(distributions, confidence=CONFIDENCE, percentiles=PERCENTILES, mode="block"):
+    """
+    Confidence intervals of every statistic and of every between-treatment difference.
+
+    Treatments are resampled independently, so the difference distribution of a pair
+    is the row-wise difference of their two distributions.
+
+    In cluster mode a treatment with a single iteration has no between-iteration
+    variation to resample (every resample is the data itself), so its interval and
+    those of its differences are NaN rather than zero-width.
+
+    Returns:
+        (intervals, differences) DataFrames with the estimate, ci_low and ci_high of
+        every statistic; intervals flag treatments with fewer than MIN_CLUSTERS
+        iterations in cluster mode (few_clusters), differences are group1 - group2 and
+        flag whether the interval excludes zero
+    """
+    names = statistic_names(percentiles)
+
+    def resampled(result):
+        """The bootstrap distribution, empty when it cannot vary."""
+        if mode == "cluster" and result["clusters"] < 2:
+            return result["distribution"][:0]
+        return result["distribution"]
+
+    intervals = []
+    for (metric, treatment), result in distributions.items():
+        low, high = percentile_interval(resampled(result), confidence)
+        for k, statistic in enumerate(names):
+            intervals.append({
+                "metric": metric, "treatment": treatment, "statistic": statistic,
+                "estimate": result["estimate"][k], "ci_low": low[k], "ci_high": high[k],
+                "confidence": confidence, "mode": mode, "n": result["n"],
+                "clusters": result["clusters"], "block_length": result["block_length"],
+                "few_clusters": mode == "cluster" and result["clusters"] < MIN_CLUSTERS,
+            })
+
+    differences = []
+    metrics = list(dict.fromkeys(metric for metric, _ in distributions))
+    for metric in metrics:
+        treatments = [treatment for key_metric, treatment in distributions if key_metric == metric]
+        for treatment1, treatment2 in combinations(treatments, 2):
+            first, second = distributions[(metric, treatment1)], distributions[(metric, treatment2)]
+            first_distribution, second_distribution = resampled(first), resampled(second)
+            if len(first_distribution) and len(second_distribution):
+                low, high = percentile_interval(first_distribution - second_distribution, confidence)
+            else:
+                low, high = percentile_interval(first_distribution[:0], confidence)
+            for k, statistic in enumerate(names):
+                differences.append({
+                    "metric": metric, "group1": treatment1, "group2": treatment2, "statistic": statistic,
+                    "estimate": first["estimate"][k] - second["estimate"][k], "ci_low": low[k], "ci_high": high[k],
+                    "excludes_zero": low[k] > 0 or high[k] < 0, "confidence": confidence, "mode": mode,
+                })
+    return pd.DataFrame(intervals), pd.DataFrame(differences)
+
+
+def print_mean_intervals(intervals):
+    """Print the mean and its interval per metric and treatment."""
+    means = intervals[intervals["statistic"] == "mean"]
+    for metric, rows in means.groupby("metric", sort=False):
+        print(f"\n{metric.upper()} mean ({rows['mode'].iloc[0]} bootstrap, {rows['confidence'].iloc[0]:.0%} CI):")
+        for _, row in rows.iterrows():
+            note = ""
+            if row["few_clusters"]:
+                note = " (1 iteration: no interval)" if row["clusters"] < 2 else f" (only {row['clusters']} iterations)"
+            print(f"  {row['treatment']}: {row['estimate']:.3f} [{row['ci_low']:.3f}, {row['ci_high']:.3f}] "
+                  f"n={row['n']}{note}")
+
+
+def main():
+    """
+    Bootstrap confidence intervals of the treatment summaries and their differences
+    """
+    parser = argparse.ArgumentParser(description="Block and cluster bootstrap confidence intervals.")
+    parser.add_argument("--mode", choices=BOOTSTRAP_MODES + ["both"], default="both",
+                        help="block: moving blocks within iterations, cluster: whole iterations (default: both)")
+    parser.add_argument("--resamples", type=int, default=BOOTSTRAP_RESAMPLES,
+                        help=f"Resamples (default: {BOOTSTRAP_RESAMPLES})")
+    parser.add_argument("--block-length", type=int, default=None, help="Block length in samples (default: n^(1/3))")
+    parser.add_argument("--confidence", type=float, default=CONFIDENCE, help=f"Confidence level (default: {CONFIDENCE})")
+    parser.add_argument("--percentiles", type=float, nargs="*", default=PERCENTILES,
+                        help="Percentiles reported besides the mean and median (default: 0.05 0.95)")
+    parser.add_argument("--seed", type=int, default=BOOTSTRAP_SEED, help="Seed of the resampling streams")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--output", default="bootstrap_analysis", help="Output folder (default: bootstrap_analysis)")
+    args = parser.parse_args()
+
+    df = load_all_treatment_data()
+    if df is None:
+        print("Failed to load data. Please check your data files.")
+        return
+
+    os.makedirs(args.output, exist_ok=True)
+    modes = BOOTSTRAP_MODES if args.mode == "both" else [args.mode]
+    for mode in modes:
+        start = time.perf_counter()
+        distributions = bootstrap_distributions(df, METRICS, mode, args.resamples, args.percentiles,
+                                                args.block_length, args.seed, args.jobs)
+        intervals, differences = bootstrap_intervals(distributions, args.confidence, args.percentiles, mode)
+        print(f"\n{mode.capitalize()} bootstrap: {args.resamples} resamples in {time.perf_counter() - start:.1f}s")
+        print_mean_intervals(intervals)
+
+        intervals.to_csv(f"{args.output}/bootstrap_intervals_{mode}.csv", index=False)
+        differences.to_csv(f"{args.output}/bootstrap_differences_{mode}.csv", index=False)
+        print(f"\nBootstrap results saved: {args.output}/bootstrap_intervals_{mode}.csv, "
+              f"{args.output}/bootstrap_differences_{mode}.csv")
+
+if __name__ == "__main__":
+    main()
@@ -1,74 +1,44 @@
 import pandas as pd
 import numpy as np
 import scipy.stats as stats
-from scipy.stats import kruskal
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
-import glob
+import sys
 
-def load_all_treatment_data():
-    """
-    Load and combine all treatment data for Kruskal-Wallis analysis
-    """
-    # Get all CSV files
-    data_files = glob.glob("../../data/processed/response_variables/T*_response_variables_*.csv")
-    
-    if not data_files:
-        print("No data files found. Make sure you're running from the analysis folder.")
-        return None
-    
-    all_data = []
-    for file in data_files:
-        try:
-            df = pd.read_csv(file)
-            all_data.append(df)
-        except Exception as e:
-            print(f"Error loading {file}: {e}")
-    
-    if not all_data:
-        print("No valid data found.")
-        return None
-    
-    # Combine all data
-    combined_df = pd.concat(all_data, ignore_index=True)
-    print(f"Loaded data for treatments: {sorted(combined_df['treatment'].unique())}")
-    print(f"Total records: {len(combined_df)}")
-    
-    return combined_df
-
-def prepare_data_for_kruskal(df, metric):
-    """
-    Prepare data groups for Kruskal-Wallis test
-    """
-    treatments = sorted(df['treatment'].unique())
-    data_groups = []
-    group_names = []
-    
-    for treatment in treatments:
-        treatment_data = df[df['treatment'] == treatment][metric].dropna()
-        if len(treatment_data) > 0:
-            data_groups.append(treatment_data.values)
-            group_names.append(treatment)
-    
-    return data_groups, group_names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from dataset import load_all_treatment_data, load_accumulators, treatment_sketches
+from rendering import finish_figure
+from rank_tests import rank_metric, kruskal_h, effective_sizes
+from autocorrelation import effective_sample_sizes
+from permutation_tests import PERMUTATIONS, PAIRWISE_FILE, metric_permutation_test, pairwise_rows
 
-def perform_kruskal_wallis_test(df, metric):
+def perform_kruskal_wallis_test(df, metric, ranked=None, permutations=0, block_by=None, effective_n=None):
     """
     Perform Kruskal-Wallis test for a specific metric
+
+    H comes from the pooled ranks of rank_tests.rank_groups (pass them as ranked
+    to share one ranking with the post-hoc Dunn test). With permutations > 0 a
+    permutation p-value (labels shuffled within block_by blocks, if given) is
+    added next to the asymptotic chi-square one, and the whole permutation_test
+    result (with the pairwise p-values post-hoc reuses) under 'permutation'.
+    With effective_n ({treatment: effective sample size}, see
+    autocorrelation.effective_sample_sizes) H is also computed with the
+    effective group sizes.
     """
-    data_groups, group_names = prepare_data_for_kruskal(df, metric)
+    ranked = rank_metric(df, metric) if ranked is None else ranked
+    group_names = ranked["names"]
     
-    if len(data_groups) < 2:
+    if len(group_names) < 2:
         print(f"Not enough groups for {metric} analysis")
         return None
     
     # Perform Kruskal-Wallis test
-    h_statistic, p_value = kruskal(*data_groups)
+    h_statistic, p_value, degrees_freedom = kruskal_h(ranked)
     
     # Calculate effect size (eta-squared for Kruskal-Wallis)
-    n_total = sum(len(group) for group in data_groups)
-    eta_squared = (h_statistic - len(data_groups) + 1) / (n_total - len(data_groups))
+    n_total = ranked["n"]
+    eta_squared = (h_statistic - len(group_names) + 1) / (n_total - len(group_names))
     
     # Interpret effect size
     if eta_squared < 0.01:
@@ -82,14 +52,29 @@ def perform_kruskal_wallis_test(df, metric):
         'metric': metric,
         'h_statistic': h_statistic,
         'p_value': p_value,
-        'degrees_freedom': len(data_groups) - 1,
+        'degrees_freedom': degrees_freedom,
         'effect_size_eta_squared': eta_squared,
         'effect_size_interpretation': effect_size_interpretation,
         'significant': p_value < 0.05,
         'groups': group_names,
-        'group_sizes': [len(group) for group in data_groups]
+        'group_sizes': ranked["sizes"].tolist()
     }
     
+    if effective_n is not None:
+        effective = effective_sizes(ranked, effective_n)
+        h_effective, p_effective, _ = kruskal_h(ranked, effective)
+        result['effective_group_sizes'] = [round(size, 1) for size in effective.tolist()]
+        result['h_statistic_effective'] = h_effective
+        result['p_value_effective'] = p_effective
+        result['significant_effective'] = p_effective < 0.05
+    
+    if permutations > 0:
+        permutation = metric_permutation_test(df, metric, permutations, block_by, ranked=ranked)
+        result['p_value_permutation'] = permutation['p_value']
+        result['permutations'] = permutations
+        result['significant_permutation'] = permutation['p_value'] < 0.05
+        result['permutation'] = permutation
+    
     return result
 
 def create_kruskal_wallis_summary_plot(results, save_path="kruskal_analysis"):
@@ -141,9 +126,9 @@ def create_kruskal_wallis_summary_plot(results, save_path="kruskal_analysis"):
     plt.savefig(filename, dpi=300, bbox_inches='tight')
     print(f"Summary plot saved: {filename}")
     
-    plt.show()
+    finish_figure()
 
-def comprehensive_kruskal_wallis_analysis(df, save_path="kruskal_analysis"):
+def comprehensive_kruskal_wallis_analysis(df, save_path="kruskal_analysis", permutations=PERMUTATIONS):
     """
     Perform comprehensive Kruskal-Wallis analysis for all metrics
     """
@@ -162,6 +147,9 @@ def comprehensive_kruskal_wallis_analysis(df, save_path="kruskal_analysis"):
     }
     
     all_results = []
+    pairwise = []
+    # Median and IQR come from the stored quantile sketches instead of sorting every group
+    accumulators = load_accumulators()
     
     print("\n" + "="*80)
     print("KRUSKAL-WALLIS NON-PARAMETRIC ANALYSIS")
@@ -176,14 +164,25 @@ def comprehensive_kruskal_wallis_analysis(df, save_path="kruskal_analysis"):
         print("-" * 50)
         
         # Perform Kruskal-Wallis test
-        result = perform_kruskal_wallis_test(df, metric)
+        # Autocorrelated minute samples: the group sizes the test can rely on are the effective ones
+        effective_n = effective_sample_sizes(df, metric)
+        result = perform_kruskal_wallis_test(df, metric, permutations=permutations, effective_n=effective_n)
         
         if result:
+            permutation = result.pop('permutation', None)
+            if permutation is not None:
+                pairwise.extend(pairwise_rows(metric, permutation))
             all_results.append(result)
             
             # Print results
             print(f"H-statistic: {result['h_statistic']:.4f}")
             print(f"P-value: {result['p_value']:.6f}")
+            if 'p_value_permutation' in result:
+                print(f"Permutation p-value ({result['permutations']} permutations): {result['p_value_permutation']:.6f}")
+            if 'p_value_effective' in result:
+                print(f"With effective sample sizes (n={sum(result['group_sizes'])}, "
+                      f"effective n={sum(result['effective_group_sizes']):.0f}): "
+                      f"H={result['h_statistic_effective']:.4f}, p={result['p_value_effective']:.6f}")
             print(f"Degrees of freedom: {result['degrees_freedom']}")
             print(f"Effect size (η²): {result['effect_size_eta_squared']:.4f} ({result['effect_size_interpretation']})")
             
@@ -195,15 +194,13 @@ def comprehensive_kruskal_wallis_analysis(df, save_path="kruskal_analysis"):
             
             # Print descriptive statistics by group
             print(f"\nDescriptive statistics for {metric}:")
-            treatments = sorted(df['treatment'].unique())
-            for treatment in treatments:
-                treatment_data = df[df['treatment'] == treatment][metric].dropna()
-                if len(treatment_data) > 0:
-                    median_val = treatment_data.median()
-                    q1 = treatment_data.quantile(0.25)
-                    q3 = treatment_data.quantile(0.75)
+            treatments = [str(treatment) for treatment in df['treatment'].unique()]
+            for treatment, accumulator in treatment_sketches(metric, accumulators, treatments).items():
+                n = accumulator.moments.count
+                if n > 0:
+                    q1, median_val, q3 = accumulator.sketch.quantile([0.25, 0.5, 0.75])
                     iqr = q3 - q1
-                    print(f"  {treatment}: Median={median_val:.2f}, IQR={iqr:.2f}, n={len(treatment_data)}")
+                    print(f"  {treatment}: Median={median_val:.2f}, IQR={iqr:.2f}, n={n}")
     
     # Save results to CSV
     if all_results:
@@ -211,6 +208,11 @@ def comprehensive_kruskal_wallis_analysis(df, save_path="kruskal_analysis"):
         results_filename = f"{save_path}/kruskal_wallis_results.csv"
         results_df.to_csv(results_filename, index=False)
         print(f"\nKruskal-Wallis results saved: {results_filename}")
+    if pairwise:
+        # The post-hoc analysis reads these instead of permuting the same ranks again
+        pairwise_filename = f"{save_path}/{PAIRWISE_FILE}"
+        pd.DataFrame(pairwise).to_csv(pairwise_filename, index=False)
+        print(f"Pairwise permutation p-values saved: {pairwise_filename}")
     
     # Create summary visualization
     create_kruskal_wallis_summary_plot(all_results, save_path)
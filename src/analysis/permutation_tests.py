@@ -0,0 +1,268 @@
+import numpy as np
+import pandas as pd
+import argparse
+import time
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from dataset import load_all_treatment_data
+from rank_tests import rank_groups, rank_metric, kruskal_h, dunn_test
+
+PERMUTATIONS = 10_000
+PERMUTATION_SEED = 20250611
+TASK_PERMUTATIONS = 1_000  # Permutations per process pool task (and per seeded stream)
+BATCH_PERMUTATIONS = 250  # Most permutations shuffled at once inside a task...
+BATCH_BYTES = 64 * 2**20  # ...as long as their shuffled ranks fit in this many bytes
+BLOCK_CHOICES = ["hour", "weekday", "date"]
+PAIRWISE_FILE = "permutation_pairwise.csv"  # Pairwise permutation p-values the Kruskal-Wallis stage saves for post-hoc
+
+
+def block_labels(df, metric, by):
+    """
+    Block of every value of metric, in the pooled order of rank_metric(df, metric).
+
+    Args:
+        df: Combined data
+        metric: Metric being tested (rows where it is missing are dropped, as in the ranking)
+        by: "hour" (hour of day), "weekday", "date" (calendar day) or a column of df
+
+    Returns:
+        Integer block codes aligned with rank_metric(df, metric)["ranks"]
+    """
+    if by == "hour":
+        labels = df["date"].dt.hour
+    elif by == "weekday":
+        labels = df["date"].dt.weekday
+    elif by == "date":
+        labels = df["date"].dt.date
+    else:
+        labels = df[by]
+    keep = df[metric].notna()
+    codes = pd.Series(pd.factorize(labels[keep])[0], index=labels[keep].index)
+    # Same treatment order and within-treatment row order as treatment_groups/rank_groups
+    grouped = codes.groupby(df.loc[keep, "treatment"], observed=True, sort=True)
+    return np.concatenate([values.to_numpy() for _, values in grouped]) if len(codes) else np.empty(0, dtype="int64")
+
+
+def _permutation_plan(ranked, blocks=None):
+    """Arrays every task needs: ranks sorted by block, block boundaries and group one-hot matrix."""
+    n = ranked["n"]
+    blocks = np.zeros(n, dtype="int64") if blocks is None else np.asarray(blocks)
+    if len(blocks) != n:
+        raise ValueError(f"Got {len(blocks)} block labels for {n} ranked values")
+    order = np.argsort(blocks, kind="mergesort")
+    sorted_blocks = blocks[order]
+    bounds = np.flatnonzero(np.r_[True, sorted_blocks[1:] != sorted_blocks[:-1], True])
+    onehot = np.zeros((n, len(ranked["names"])))
+    onehot[np.arange(n), ranked["codes"][order]] = 1.0
+    first, second = np.triu_indices(len(ranked["names"]), k=1)
+    return {
+        "ranks": ranked["ranks"][order],
+        "bounds": bounds,
+        "onehot": onehot,
+        "sizes": ranked["sizes"].astype("float64"),
+        "n": n,
+        "tie_sum": ranked["tie_sum"],
+        "first": first,
+        "second": second,
+    }
+
+
+def _statistics(rank_sums, plan):
+    """Kruskal-Wallis H and Dunn's |z| of every pair for a (permutations x groups) matrix of rank sums."""
+    n, sizes = plan["n"], plan["sizes"]
+    ties = 1 - plan["tie_sum"] / (n ** 3 - n)
+    h = (12 / (n * (n + 1)) * np.sum(rank_sums ** 2 / sizes, axis=1) - 3 * (n + 1)) / ties
+    mean_ranks = rank_sums / sizes
+    variance = n * (n + 1) / 12 - plan["tie_sum"] / (12 * (n - 1))
+    scale = np.sqrt(variance * (1 / sizes[plan["first"]] + 1 / sizes[plan["second"]]))
+    z = np.abs(mean_ranks[:, plan["first"]] - mean_ranks[:, plan["second"]]) / scale
+    return h, z
+
+
+def batch_permutations(n):
+    """Permutations shuffled at once for n ranks: BATCH_PERMUTATIONS, fewer when their float64 ranks exceed BATCH_BYTES."""
+    return max(1, min(BATCH_PERMUTATIONS, BATCH_BYTES // (8 * max(n, 1))))
+
+
+def _permutation_task(plan, observed_h, observed_z, permutations, seed):
+    """
+    Run one seeded stream of permutations (a process pool task).
+
+    Labels are shuffled by permuting the ranks within each block (the whole data
+    when there are no blocks), in place in one reused (batch, n) buffer sized by
+    batch_permutations, so memory stays bounded whatever n; the group rank sums
+    of a batch are one matrix product with the group one-hot matrix.
+
+    Returns:
+        (count of H >= observed H, count per pair of |z| >= observed |z|,
+         count per pair of max |z| >= observed |z|)
+    """
+    rng = np.random.default_rng(seed)
+    # Tolerance so that permutations tied with the observed statistic count as extreme
+    h_bound = observed_h - 1e-9 * max(1.0, abs(observed_h))
+    z_bound = observed_z - 1e-9 * np.maximum(1.0, observed_z)
+    h_count = 0
+    z_count = np.zeros(len(observed_z), dtype="int64")
+    max_count = np.zeros(len(observed_z), dtype="int64")
+    bounds = plan["bounds"]
+    buffer = np.empty((min(batch_permutations(plan["n"]), permutations), plan["n"]))
+    done = 0
+    while done < permutations:
+        batch = min(len(buffer), permutations - done)
+        shuffled = buffer[:batch]
+        shuffled[:] = plan["ranks"]
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            if stop - start > 1:
+                block = shuffled[:, start:stop]
+                rng.permuted(block, axis=1, out=block)
+        h, z = _statistics(shuffled @ plan["onehot"], plan)
+        h_count += int(np.sum(h >= h_bound))
+        z_count += np.sum(z >= z_bound, axis=0)
+        if z.shape[1]:
+            max_count += np.sum(z.max(axis=1)[:, None] >= z_bound, axis=0)
+        done += batch
+    return h_count, z_count, max_count
+
+
+def permutation_test(ranked, permutations=PERMUTATIONS, blocks=None, seed=PERMUTATION_SEED, jobs=None):
+    """
+    Permutation test of Kruskal-Wallis H and of every pairwise Dunn |z| over the
+    shared pooled ranks (see rank_tests.rank_groups).
+
+    Treatment labels are exchanged between observations (within the same block
+    when blocks are given), which does not rely on the asymptotic chi-square or
+    normal distributions. The permutations are split into TASK_PERMUTATIONS-sized
+    tasks, each with its own stream spawned from seed, so the result depends only on
+    seed and permutations, not on jobs.
+
+    Args:
+        ranked: rank_groups output
+        permutations: Number of random permutations
+        blocks: Optional block label of every pooled value (see block_labels);
+            labels are only exchanged within a block
+        seed: Seed of the permutation streams
+        jobs: Worker processes (default: CPU count; 1 runs in this process)
+
+    Returns:
+        Dict with 'names', 'pairs', observed 'h_statistic' and 'z' (signed), the
+        permutation p-values 'p_value' (H), 'p_pairwise' (per pair) and
+        'p_pairwise_maxt' (per pair, family-wise adjusted with the maximum |z|
+        of each permutation, Westfall-Young single step), 'permutations' and 'n'
+    """
+    plan = _permutation_plan(ranked, blocks)
+    observed_h = kruskal_h(ranked)[0]
+    dunn = dunn_test(ranked)
+    observed_z = np.abs(dunn["z"])
+
+    tasks = [min(TASK_PERMUTATIONS, permutations - start) for start in range(0, permutations, TASK_PERMUTATIONS)]
+    seeds = np.random.SeedSequence(seed).spawn(len(tasks))
+    jobs = min(jobs or os.cpu_count() or 1, len(tasks)) if tasks else 1
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(_permutation_task, plan, observed_h, observed_z, count, task_seed)
+                       for count, task_seed in zip(tasks, seeds)]
+            counts = [future.result() for future in futures]
+    else:
+        counts = [_permutation_task(plan, observed_h, observed_z, count, task_seed)
+                  for count, task_seed in zip(tasks, seeds)]
+
+    h_count = sum(count[0] for count in counts)
+    z_count = sum((count[1] for count in counts), np.zeros(len(observed_z), dtype="int64"))
+    max_count = sum((count[2] for count in counts), np.zeros(len(observed_z), dtype="int64"))
+    return {
+        "names": ranked["names"],
+        "pairs": dunn["pairs"],
+        "h_statistic": observed_h,
+        "z": dunn["z"],
+        "p_value": (1 + h_count) / (1 + permutations),
+        "p_pairwise": (1 + z_count) / (1 + permutations),
+        "p_pairwise_maxt": (1 + max_count) / (1 + permutations),
+        "permutations": permutations,
+        "n": ranked["n"],
+    }
+
+
+def metric_permutation_test(df, metric, permutations=PERMUTATIONS, block_by=None, seed=PERMUTATION_SEED,
+                            jobs=None, ranked=None):
+    """permutation_test of one metric of the combined data, blocked by block_by (see block_labels) if given."""
+    ranked = rank_metric(df, metric) if ranked is None else ranked
+    blocks = block_labels(df, metric, block_by) if block_by else None
+    return permutation_test(ranked, permutations, blocks, seed, jobs)
+
+
+def pairwise_rows(metric, result, block_by=None):
+    """Rows of the pairwise permutation p-values of one permutation_test result, for PAIRWISE_FILE."""
+    rows = []
+    for k, (i, j) in enumerate(result["pairs"]):
+        rows.append({
+            "metric": metric, "group1": result["names"][i], "group2": result["names"][j],
+            "z_statistic": result["z"][k], "p_permutation": result["p_pairwise"][k],
+            "p_permutation_maxt": result["p_pairwise_maxt"][k], "permutations": result["permutations"],
+            "n": result["n"], "block_by": block_by,
+        })
+    return rows
+
+
+def stored_pairwise(path, metric, ranked, permutations):
+    """
+    Pairwise permutation p-values of metric saved by an earlier unblocked run over
+    the same ranking (same groups, n and number of permutations), so the post-hoc
+    analysis does not permute the ranks the Kruskal-Wallis stage already permuted.
+
+    Returns:
+        Dict with 'p_pairwise' and 'p_pairwise_maxt' arrays in dunn_test pair order,
+        or None when path is missing or was computed differently
+    """
+    if not os.path.exists(path):
+        return None
+    stored = pd.read_csv(path, float_precision="round_trip")
+    stored = stored[(stored["metric"] == metric) & stored["block_by"].isna()]
+    names = ranked["names"]
+    first, second = np.triu_indices(len(names), k=1)
+    expected = [(names[i], names[j]) for i, j in zip(first, second)]
+    if (list(zip(stored["group1"].astype(str), stored["group2"].astype(str))) != expected
+            or not (stored["n"] == ranked["n"]).all() or not (stored["permutations"] == permutations).all()):
+        return None
+    return {"p_pairwise": stored["p_permutation"].to_numpy(), "p_pairwise_maxt": stored["p_permutation_maxt"].to_numpy()}
+
+
+def main():
+    """
+    Print the permutation and asymptotic p-values of Kruskal-Wallis and of the
+    pairwise comparisons for every metric
+    """
+    parser = argparse.ArgumentParser(description="Permutation tests for Kruskal-Wallis and Dunn's pairwise comparisons.")
+    parser.add_argument("--permutations", type=int, default=PERMUTATIONS, help=f"Permutations (default: {PERMUTATIONS})")
+    parser.add_argument("--block-by", default=None,
+                        help=f"Permute only within blocks: {', '.join(BLOCK_CHOICES)} or a column name")
+    parser.add_argument("--seed", type=int, default=PERMUTATION_SEED, help="Seed of the permutation streams")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    df = load_all_treatment_data()
+    if df is None:
+        print("Failed to load data. Please check your data files.")
+        return
+
+    for metric in ["tps", "cpu_usage", "ram_usage"]:
+        start = time.perf_counter()
+        ranked = rank_metric(df, metric)
+        result = metric_permutation_test(df, metric, args.permutations, args.block_by, args.seed, args.jobs, ranked)
+        elapsed = time.perf_counter() - start
+        dunn = dunn_test(ranked)
+
+        blocked = f", within {args.block_by} blocks" if args.block_by else ""
+        print(f"\n{metric.upper()} ({result['permutations']} permutations{blocked}, {elapsed:.1f}s)")
+        print(f"  Kruskal-Wallis H={result['h_statistic']:.4f}, asymptotic p={kruskal_h(ranked)[1]:.6g}, "
+              f"permutation p={result['p_value']:.6g}")
+        print(f"  {'Pair':<12}{'z':>9}{'p (normal)':>13}{'p (perm)':>11}{'p (max-T)':>11}")
+        for k, (i, j) in enumerate(result["pairs"]):
+            pair = f"{result['names'][i]}-{result['names'][j]}"
+            print(f"  {pair:<12}{result['z'][k]:>9.3f}{dunn['p_value'][k]:>13.4g}"
+                  f"{result['p_pairwise'][k]:>11.4g}{result['p_pairwise_maxt'][k]:>11.4g}")
+
+if __name__ == "__main__":
+    main()
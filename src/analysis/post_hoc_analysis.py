@@ -4,40 +4,20 @@ import scipy.stats as stats
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
-import glob
-from itertools import combinations
+import sys
 
-def load_all_treatment_data():
-    """
-    Load and combine all treatment data for post-hoc analysis
-    """
-    # Get all CSV files
-    data_files = glob.glob("../../data/processed/response_variables/T*_response_variables_*.csv")
-    
-    if not data_files:
-        print("No data files found. Make sure you're running from the analysis folder.")
-        return None
-    
-    all_data = []
-    for file in data_files:
-        try:
-            df = pd.read_csv(file)
-            all_data.append(df)
-        except Exception as e:
-            print(f"Error loading {file}: {e}")
-    
-    if not all_data:
-        print("No valid data found.")
-        return None
-    
-    # Combine all data
-    combined_df = pd.concat(all_data, ignore_index=True)
-    print(f"Loaded data for treatments: {sorted(combined_df['treatment'].unique())}")
-    print(f"Total records: {len(combined_df)}")
-    
-    return combined_df
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from dataset import load_all_treatment_data, treatment_groups
+from rendering import finish_figure
+from rank_tests import rank_groups, dunn_test, effective_sizes
+from autocorrelation import effective_sample_sizes
+from permutation_tests import PERMUTATIONS, PAIRWISE_FILE, permutation_test, stored_pairwise
+
+# Absolute, so the post-hoc analysis finds the Kruskal-Wallis results from any folder
+KRUSKAL_RESULTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kruskal_analysis",
+                                    "kruskal_wallis_results.csv")
 
-def check_kruskal_results(kruskal_results_file="kruskal_analysis/kruskal_wallis_results.csv"):
+def check_kruskal_results(kruskal_results_file=KRUSKAL_RESULTS_FILE):
     """
     Check which metrics showed significant results in Kruskal-Wallis test
     """
@@ -61,69 +41,98 @@ def check_kruskal_results(kruskal_results_file="kruskal_analysis/kruskal_wallis_
         print(f"Error reading Kruskal-Wallis results: {e}")
         return None
 
-def perform_dunn_post_hoc(df, metric, alpha=0.05):
+def perform_dunn_post_hoc(df, metric, alpha=0.05, ranked=None, permutations=0, effective_n=None,
+                          pairwise_file=None):
     """
     Perform Dunn's post-hoc test for pairwise comparisons after Kruskal-Wallis
-    Using Mann-Whitney U test with multiple comparison corrections
+
+    The pooled data is ranked once (rank_tests.rank_groups, the same ranking
+    Kruskal-Wallis uses; pass it as ranked to reuse it) and every pairwise
+    z-statistic comes from those shared mean ranks, with tie correction and
+    Bonferroni, Holm and Benjamini-Hochberg adjusted p-values. With
+    permutations > 0 each pair also gets a permutation p-value and a max-T
+    (family-wise) adjusted one, read from pairwise_file (saved by the
+    Kruskal-Wallis stage) when it holds the same test. With effective_n ({treatment: effective sample
+    size}, see autocorrelation.effective_sample_sizes) each pair is also tested
+    with the effective group sizes.
     """
-    treatments = sorted(df['treatment'].unique())
+    groups = treatment_groups(df, metric)
+    ranked = rank_groups(groups) if ranked is None else ranked
+    treatments = ranked["names"]
+    medians = {treatment: groups[treatment].median() for treatment in treatments}
     comparisons = []
     
-    # Get all pairwise combinations
-    pairs = list(combinations(treatments, 2))
+    dunn = dunn_test(ranked)
+    pairs = dunn["pairs"]
+    permutation = None
+    if permutations > 0 and pairs:
+        if pairwise_file is not None:
+            permutation = stored_pairwise(pairwise_file, metric, ranked, permutations)
+        if permutation is None:
+            permutation = permutation_test(ranked, permutations)
+    effective = effective_sizes(ranked, effective_n) if effective_n is not None else None
+    dunn_effective = dunn_test(ranked, effective) if effective is not None else None
     
     # Multiple comparison corrections
-    bonferroni_alpha = alpha / len(pairs)
+    bonferroni_alpha = alpha / len(pairs) if pairs else alpha
     
     print(f"\nPerforming {len(pairs)} pairwise comparisons for {metric}")
     print(f"Bonferroni corrected α = {bonferroni_alpha:.6f}")
     
-    for treatment1, treatment2 in pairs:
-        group1 = df[df['treatment'] == treatment1][metric].dropna()
-        group2 = df[df['treatment'] == treatment2][metric].dropna()
+    for k, (i, j) in enumerate(pairs):
+        treatment1, treatment2 = treatments[i], treatments[j]
+        n1, n2 = int(ranked["sizes"][i]), int(ranked["sizes"][j])
+        z_statistic = dunn["z"][k]
+        p_value = dunn["p_value"][k]
         
-        if len(group1) > 0 and len(group2) > 0:
-            # Mann-Whitney U test
-            u_statistic, p_value = stats.mannwhitneyu(group1, group2, alternative='two-sided')
-            
-            # Calculate effect size (r = Z / sqrt(N))
-            n1, n2 = len(group1), len(group2)
-            # Better z-score calculation
-            mean_rank_diff = abs(group1.rank().mean() - group2.rank().mean())
-            pooled_n = n1 + n2
-            z_approx = (u_statistic - (n1 * n2 / 2)) / np.sqrt(n1 * n2 * (pooled_n + 1) / 12)
-            effect_size_r = abs(z_approx) / np.sqrt(pooled_n)
-            
-            # Interpret effect size
-            if effect_size_r < 0.1:
-                effect_interpretation = "Negligible"
-            elif effect_size_r < 0.3:
-                effect_interpretation = "Small"
-            elif effect_size_r < 0.5:
-                effect_interpretation = "Medium"
-            else:
-                effect_interpretation = "Large"
-            
-            comparison = {
-                'group1': treatment1,
-                'group2': treatment2,
-                'u_statistic': u_statistic,
-                'p_value': p_value,
-                'p_bonferroni': min(p_value * len(pairs), 1.0),
-                'significant_uncorrected': p_value < alpha,
-                'significant_bonferroni': p_value < bonferroni_alpha,
-                'effect_size_r': effect_size_r,
-                'effect_interpretation': effect_interpretation,
-                'median_group1': group1.median(),
-                'median_group2': group2.median(),
-                'mean_rank_group1': group1.rank().mean(),
-                'mean_rank_group2': group2.rank().mean(),
-                'n_group1': n1,
-                'n_group2': n2,
-                'winner': treatment1 if group1.median() > group2.median() else treatment2
-            }
-            
-            comparisons.append(comparison)
+        # Calculate effect size (r = Z / sqrt(N))
+        effect_size_r = abs(z_statistic) / np.sqrt(n1 + n2)
+        
+        # Interpret effect size
+        if effect_size_r < 0.1:
+            effect_interpretation = "Negligible"
+        elif effect_size_r < 0.3:
+            effect_interpretation = "Small"
+        elif effect_size_r < 0.5:
+            effect_interpretation = "Medium"
+        else:
+            effect_interpretation = "Large"
+        
+        comparison = {
+            'group1': treatment1,
+            'group2': treatment2,
+            'z_statistic': z_statistic,
+            'p_value': p_value,
+            'p_bonferroni': dunn["p_bonferroni"][k],
+            'p_holm': dunn["p_holm"][k],
+            'p_bh': dunn["p_bh"][k],
+            'significant_uncorrected': p_value < alpha,
+            'significant_bonferroni': dunn["p_bonferroni"][k] < alpha,
+            'significant_holm': dunn["p_holm"][k] < alpha,
+            'significant_bh': dunn["p_bh"][k] < alpha,
+            'effect_size_r': effect_size_r,
+            'effect_interpretation': effect_interpretation,
+            'median_group1': medians[treatment1],
+            'median_group2': medians[treatment2],
+            'mean_rank_group1': ranked["mean_ranks"][i],
+            'mean_rank_group2': ranked["mean_ranks"][j],
+            'n_group1': n1,
+            'n_group2': n2,
+            'winner': treatment1 if medians[treatment1] > medians[treatment2] else treatment2
+        }
+        if permutation is not None:
+            comparison['p_permutation'] = permutation["p_pairwise"][k]
+            comparison['p_permutation_maxt'] = permutation["p_pairwise_maxt"][k]
+            comparison['significant_permutation_maxt'] = permutation["p_pairwise_maxt"][k] < alpha
+        if dunn_effective is not None:
+            comparison['ess_group1'] = effective[i]
+            comparison['ess_group2'] = effective[j]
+            comparison['z_effective'] = dunn_effective["z"][k]
+            comparison['p_effective'] = dunn_effective["p_value"][k]
+            comparison['p_effective_bonferroni'] = dunn_effective["p_bonferroni"][k]
+            comparison['significant_effective_bonferroni'] = dunn_effective["p_bonferroni"][k] < alpha
+        
+        comparisons.append(comparison)
     
     return comparisons
 
@@ -188,7 +197,7 @@ def create_post_hoc_visualization(all_comparisons, save_path="post_hoc_analysis"
         plt.savefig(filename, dpi=300, bbox_inches='tight')
         print(f"Post-hoc visualization saved: {filename}")
         
-        plt.show()
+        finish_figure()
 
 def create_effect_size_summary(all_comparisons, save_path="post_hoc_analysis"):
     """
@@ -242,9 +251,11 @@ def create_effect_size_summary(all_comparisons, save_path="post_hoc_analysis"):
     plt.savefig(filename, dpi=300, bbox_inches='tight')
     print(f"Effect sizes summary saved: {filename}")
     
-    plt.show()
+    finish_figure()
 
-def comprehensive_post_hoc_analysis(df, metrics_to_analyze=None, save_path="post_hoc_analysis"):
+def comprehensive_post_hoc_analysis(df, metrics_to_analyze=None, save_path="post_hoc_analysis",
+                                    permutations=PERMUTATIONS,
+                                    kruskal_results_file=KRUSKAL_RESULTS_FILE):
     """
     Perform comprehensive post-hoc analysis for specified metrics
     """
@@ -254,7 +265,7 @@ def comprehensive_post_hoc_analysis(df, metrics_to_analyze=None, save_path="post
     
     # Check Kruskal-Wallis results first
     if metrics_to_analyze is None:
-        significant_metrics = check_kruskal_results()
+        significant_metrics = check_kruskal_results(kruskal_results_file)
         if not significant_metrics:
             print("\nNo significant metrics found in Kruskal-Wallis test.")
             print("Post-hoc analysis is only meaningful when the omnibus test is significant.")
@@ -265,11 +276,12 @@ def comprehensive_post_hoc_analysis(df, metrics_to_analyze=None, save_path="post
     os.makedirs(save_path, exist_ok=True)
     
     all_comparisons = []
+    pairwise_file = os.path.join(os.path.dirname(kruskal_results_file), PAIRWISE_FILE)
     
     print("\n" + "="*80)
     print("POST-HOC PAIRWISE COMPARISONS ANALYSIS")
     print("="*80)
-    print("Using Dunn's test (Mann-Whitney U with Bonferroni correction)")
+    print("Using Dunn's test on the pooled ranks (Bonferroni, Holm and Benjamini-Hochberg corrections)")
     print("Only analyzing metrics with significant Kruskal-Wallis results")
     print("="*80)
     
@@ -278,7 +290,9 @@ def comprehensive_post_hoc_analysis(df, metrics_to_analyze=None, save_path="post
         print("-" * 50)
         
         # Perform post-hoc comparisons
-        comparisons = perform_dunn_post_hoc(df, metric)
+        comparisons = perform_dunn_post_hoc(df, metric, permutations=permutations,
+                                            effective_n=effective_sample_sizes(df, metric),
+                                            pairwise_file=pairwise_file)
         
         if comparisons:
             # Add metric info to each comparison
@@ -309,6 +323,13 @@ def comprehensive_post_hoc_analysis(df, metrics_to_analyze=None, save_path="post
             print(f"  Total comparisons: {total_comps}")
             print(f"  Significant (uncorrected): {sig_uncorrected}")
             print(f"  Significant (Bonferroni): {sig_corrected}")
+            print(f"  Significant (Holm): {sum(1 for c in comparisons if c['significant_holm'])}")
+            print(f"  Significant (Benjamini-Hochberg): {sum(1 for c in comparisons if c['significant_bh'])}")
+            print(f"  Significant (Bonferroni, effective sample sizes): "
+                  f"{sum(1 for c in comparisons if c['significant_effective_bonferroni'])}")
+            if permutations > 0:
+                print(f"  Significant (permutation max-T, {permutations} permutations): "
+                      f"{sum(1 for c in comparisons if c['significant_permutation_maxt'])}")
     
     # Save results to CSV
     if all_comparisons:
@@ -0,0 +1,144 @@
+import numpy as np
+import scipy.stats as stats
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from dataset import treatment_groups
+
+P_ADJUSTMENTS = ["bonferroni", "holm", "bh"]
+
+
+def rank_groups(groups):
+    """
+    Rank the pooled values of every group once, with average ranks for ties.
+
+    One stable sort of the pooled data gives the ranks, the tie correction of
+    Kruskal-Wallis and Dunn's test, and (per group) the rank sums both need, so
+    the omnibus test and every pairwise comparison share the same ranking.
+
+    Args:
+        groups: Dict {name: values} (e.g. treatment_groups(df, metric)); empty groups are skipped
+
+    Returns:
+        Dict with 'names', 'sizes' (per group), 'codes' (group position of every
+        pooled value), 'ranks' (pooled ranks, 1..N), 'rank_sums' and 'mean_ranks'
+        (per group), 'n' and 'tie_sum' (sum of t**3 - t over tied runs)
+    """
+    groups = {name: np.asarray(values, dtype="float64") for name, values in groups.items() if len(values) > 0}
+    names = list(groups)
+    sizes = np.array([len(values) for values in groups.values()], dtype="int64")
+    pooled = np.concatenate(list(groups.values())) if names else np.empty(0)
+    codes = np.repeat(np.arange(len(names)), sizes)
+    n = len(pooled)
+
+    order = np.argsort(pooled, kind="mergesort")
+    ordered = pooled[order]
+    # Runs of equal values get the mean of the ranks they span
+    run_starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]]) if n else np.empty(0, dtype="int64")
+    run_lengths = np.diff(np.r_[run_starts, n])
+    ranks = np.empty(n)
+    ranks[order] = np.repeat(run_starts + (run_lengths + 1) / 2, run_lengths)
+
+    rank_sums = np.bincount(codes, weights=ranks, minlength=len(names))
+    return {
+        "names": names,
+        "sizes": sizes,
+        "codes": codes,
+        "ranks": ranks,
+        "rank_sums": rank_sums,
+        "mean_ranks": rank_sums / np.maximum(sizes, 1),
+        "n": n,
+        "tie_sum": float(np.sum(run_lengths.astype("float64") ** 3 - run_lengths)),
+    }
+
+
+def rank_metric(df, metric):
+    """rank_groups of the treatment groups of one metric."""
+    return rank_groups(treatment_groups(df, metric))
+
+
+def effective_sizes(ranked, sizes_by_name):
+    """Array of effective sample sizes in ranked["names"] order, from a {name: size} dict."""
+    return np.array([sizes_by_name[name] for name in ranked["names"]], dtype="float64")
+
+
+def kruskal_h(ranked, effective=None):
+    """
+    Tie-corrected Kruskal-Wallis H from rank_groups output (same value as scipy.stats.kruskal).
+
+    Args:
+        ranked: rank_groups output
+        effective: Optional effective sample size per group (effective_sizes); each
+            group's squared mean rank deviation is then weighted by it instead of by
+            its n, which deflates H by the variance inflation of autocorrelated samples
+
+    Returns:
+        (H, asymptotic chi-square p-value, degrees of freedom)
+    """
+    n, sizes = ranked["n"], ranked["sizes"]
+    if effective is None:
+        h = 12 / (n * (n + 1)) * np.sum(ranked["rank_sums"] ** 2 / sizes) - 3 * (n + 1)
+    else:
+        h = 12 / (n * (n + 1)) * np.sum(effective * (ranked["mean_ranks"] - (n + 1) / 2) ** 2)
+    ties = 1 - ranked["tie_sum"] / (n ** 3 - n)
+    h = h / ties if ties > 0 else np.nan
+    df = len(sizes) - 1
+    return h, stats.chi2.sf(h, df), df
+
+
+def adjust_p_values(p_values, method):
+    """
+    Correct p-values for multiple comparisons.
+
+    Args:
+        p_values: Array of raw p-values
+        method: "bonferroni", "holm" (step-down family-wise) or "bh"
+            (Benjamini-Hochberg false discovery rate)
+
+    Returns:
+        Array of adjusted p-values, capped at 1, in the input order
+    """
+    p_values = np.asarray(p_values, dtype="float64")
+    m = len(p_values)
+    if m == 0:
+        return p_values
+    if method == "bonferroni":
+        return np.minimum(p_values * m, 1.0)
+
+    order = np.argsort(p_values, kind="mergesort")
+    ordered = p_values[order]
+    if method == "holm":
+        adjusted = np.maximum.accumulate(ordered * (m - np.arange(m)))
+    elif method == "bh":
+        adjusted = np.minimum.accumulate((ordered * m / np.arange(1, m + 1))[::-1])[::-1]
+    else:
+        raise ValueError(f"Unknown p-value adjustment '{method}' (use one of {', '.join(P_ADJUSTMENTS)})")
+    result = np.empty(m)
+    result[order] = np.minimum(adjusted, 1.0)
+    return result
+
+
+def dunn_test(ranked, effective=None):
+    """
+    Dunn's test (1964) for every pair of groups, from the shared pooled ranks.
+
+    z = (mean rank i - mean rank j) / sqrt((N(N+1)/12 - T/(12(N-1))) (1/n_i + 1/n_j)),
+    with T the tie sum; all pairs are computed at once from the per-group mean ranks.
+    With effective (effective sample size per group) n_i and n_j are replaced by
+    the effective sizes.
+
+    Returns:
+        Dict with 'pairs' (list of (i, j) group positions, i < j), 'z' and
+        two-sided 'p_value' arrays, and one 'p_<method>' array per P_ADJUSTMENTS
+    """
+    n, mean_ranks = ranked["n"], ranked["mean_ranks"]
+    sizes = ranked["sizes"] if effective is None else effective
+    first, second = np.triu_indices(len(sizes), k=1)
+    variance = n * (n + 1) / 12 - ranked["tie_sum"] / (12 * (n - 1)) if n > 1 else np.nan
+    z = (mean_ranks[first] - mean_ranks[second]) / np.sqrt(variance * (1 / sizes[first] + 1 / sizes[second]))
+    p_values = 2 * stats.norm.sf(np.abs(z))
+    result = {"pairs": list(zip(first.tolist(), second.tolist())), "z": z, "p_value": p_values}
+    for method in P_ADJUSTMENTS:
+        result[f"p_{method}"] = adjust_p_values(p_values, method)
+    return result
@@ -0,0 +1,71 @@
+import io
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from downsampling import pixel_budget, plot_downsampled, downsample_trace
+
+try:
+    import plotly.graph_objects as go
+except ImportError:
+    go = None
+
+
+def synthetic_trace(rows, seed=0):
+    """TPS-like series, one sample every 30 s, with a slow drift, noise and a few lag spikes."""
+    rng = np.random.default_rng(seed)
+    dates = pd.Series(pd.date_range("2025-06-10", periods=rows, freq="30s", tz="America/Costa_Rica"))
+    tps = 19.5 + 0.3 * np.sin(np.arange(rows) / 2_000) + rng.normal(0, 0.2, size=rows)
+    spikes = rng.choice(rows, size=max(1, rows // 50_000), replace=False)
+    tps[spikes] -= rng.uniform(5, 15, size=len(spikes))
+    return dates, pd.Series(tps)
+
+
+def render_png(dates, tps, max_points):
+    """Seconds and bytes of a 15 in wide, 300 dpi PNG of the trace."""
+    start = time.perf_counter()
+    fig, ax = plt.subplots(figsize=(15, 4))
+    if max_points:
+        plot_downsampled(ax, dates, tps, max_points, linewidth=1)
+    else:
+        ax.plot(dates, tps, linewidth=1)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=300)
+    plt.close(fig)
+    return time.perf_counter() - start, buffer.tell()
+
+
+def html_size(dates, tps, max_points):
+    """Bytes of the plotly HTML (without plotly.js) of the trace."""
+    x, y, _ = downsample_trace(dates, tps, max_points)
+    fig = go.Figure(go.Scattergl(x=x, y=y, mode="lines"))
+    return len(fig.to_html(include_plotlyjs=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark time-series rendering with and without downsampling.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="Trace lengths to render (default: 10k 100k 1M)")
+    parser.add_argument("--full-max-rows", type=int, default=1_000_000,
+                        help="Longest trace also rendered without downsampling (default: 1M)")
+    args = parser.parse_args()
+    max_points = pixel_budget(15, 300)
+
+    print(f"Point budget: {max_points} per trace")
+    print(f"{'Rows':>10}{'Full s':>9}{'Full KB':>10}{'LTTB s':>9}{'LTTB KB':>10}"
+          + (f"{'HTML KB':>10}{'LTTB HTML KB':>14}" if go is not None else ""))
+    for rows in args.rows:
+        dates, tps = synthetic_trace(rows)
+        full = render_png(dates, tps, None) if rows <= args.full_max_rows else (np.nan, np.nan)
+        reduced = render_png(dates, tps, max_points)
+        line = f"{rows:>10,}{full[0]:>9.2f}{full[1] / 1024:>10.0f}{reduced[0]:>9.2f}{reduced[1] / 1024:>10.0f}"
+        if go is not None:
+            line += f"{html_size(dates, tps, None) / 1024:>10.0f}{html_size(dates, tps, max_points) / 1024:>14.0f}"
+        print(line)
@@ -0,0 +1,148 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from extract_response_vars_iterations import label_active_segments
+
+
+def legacy_trim_inactive_periods(df, max_minutes_without_players=1, verbose=True):
+    """
+    Previous implementation: groupby(cumsum) over the runs and a Python loop per run.
+    Kept here only as the benchmark baseline.
+    """
+    if df.empty:
+        return [], {"total_minutes": 0, "accepted_minutes": 0, "rejected_minutes": 0, "discarded_segments": []}
+
+    df_sorted = df.sort_values("date").copy()
+    df_sorted["players_online"] = df_sorted["players_online"].fillna(0)
+    total_duration = (df_sorted["date"].iloc[-1] - df_sorted["date"].iloc[0]).total_seconds() / 60
+
+    df_sorted["time_diff"] = df_sorted["date"].diff().dt.total_seconds().fillna(0) / 60
+    next_diff = df_sorted["date"].shift(-1) - df_sorted["date"]
+    df_sorted["next_diff"] = next_diff.dt.total_seconds().fillna(0) / 60
+
+    no_players_mask = df_sorted["players_online"] == 0
+    if not no_players_mask.any():
+        stats = {
+            "total_minutes": total_duration,
+            "accepted_minutes": total_duration,
+            "rejected_minutes": 0,
+            "discarded_segments": []
+        }
+        return [df_sorted], stats
+
+    groups = (no_players_mask != no_players_mask.shift()).cumsum()
+    group_data = df_sorted.groupby(groups)
+
+    active_periods = []
+    discarded_segments = []
+    total_rejected_minutes = 0
+    current_active = []
+
+    for (group_id, group_df) in group_data:
+        is_inactive = group_df["players_online"].iloc[0] == 0
+
+        if is_inactive:
+            if len(group_df) == 1:
+                duration = group_df["next_diff"].iloc[0]
+            else:
+                duration = (group_df["date"].iloc[-1] - group_df["date"].iloc[0]).total_seconds() / 60
+        else:
+            current_active.append(group_df)
+            continue
+
+        if duration > max_minutes_without_players:
+            if current_active:
+                active_periods.append(pd.concat(current_active))
+                current_active = []
+
+            excess_time = duration - max_minutes_without_players
+            total_rejected_minutes += excess_time
+
+            discarded_segments.append({
+                "start": (group_df["date"].iloc[0] + pd.Timedelta(minutes=max_minutes_without_players)).strftime('%H:%M'),
+                "end": group_df["date"].iloc[-1].strftime('%H:%M'),
+                "duration": excess_time
+            })
+
+            if verbose:
+                print(f"Trimmed {excess_time:.2f} min inactivity: "
+                      f"{group_df['date'].iloc[0].strftime('%H:%M')} - "
+                      f"{group_df['date'].iloc[-1].strftime('%H:%M')}")
+        else:
+            current_active.append(group_df)
+
+    if current_active:
+        active_periods.append(pd.concat(current_active))
+
+    accepted_minutes = total_duration - total_rejected_minutes
+    stats = {
+        "total_minutes": round(total_duration, 2),
+        "accepted_minutes": round(accepted_minutes, 2),
+        "rejected_minutes": round(total_rejected_minutes, 2),
+        "discarded_segments": discarded_segments
+    }
+
+    return active_periods, stats
+
+
+def synthetic_series(rows, mean_run_rows, seed=0):
+    """
+    Plan-like plan_tps series: one sample every 30 s (with jitter), players online
+    alternating between idle and active runs of geometric length.
+    """
+    rng = np.random.default_rng(seed)
+    run_lengths = rng.geometric(1 / mean_run_rows, size=rows // mean_run_rows * 2 + 10)
+    run_lengths = run_lengths[:np.searchsorted(np.cumsum(run_lengths), rows) + 1]
+    idle = np.arange(len(run_lengths)) % 2 == 0
+    players = np.repeat(np.where(idle, 0, 1), run_lengths)[:rows]
+    players = players * rng.integers(1, 12, size=rows)
+
+    step_ms = 30_000 + rng.integers(-500, 500, size=rows)
+    dates_ms = 1_749_600_000_000 + np.cumsum(step_ms)
+    return pd.DataFrame({
+        "date": pd.to_datetime(dates_ms, unit="ms").tz_localize("UTC").tz_convert("America/Costa_Rica"),
+        "tps": rng.normal(19.5, 0.5, size=rows),
+        "players_online": players,
+    })
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark inactivity trimming against the previous loop.")
+    parser.add_argument("--rows", type=int, default=10_000_000, help="Synthetic series length (default: 10M)")
+    parser.add_argument("--legacy-rows", type=int, default=None,
+                        help="Rows given to the previous implementation (default: --rows)")
+    parser.add_argument("--mean-run", type=int, default=20, help="Mean idle/active run length in rows (default: 20)")
+    parser.add_argument("--max-minutes", type=float, default=5, help="max_minutes_without_players (default: 5)")
+    args = parser.parse_args()
+    legacy_rows = args.legacy_rows or args.rows
+
+    df = synthetic_series(args.rows, args.mean_run)
+    print(f"Synthetic series: {len(df):,} rows, mean run length {args.mean_run} rows")
+
+    elapsed, (labelled, stats) = time_call(label_active_segments, df, args.max_minutes, False)
+    print(f"Run-length encoded:   {elapsed:8.2f} s  ({len(df) / elapsed:,.0f} rows/s), "
+          f"{labelled['segment'].max()} segments, {len(stats['discarded_segments'])} runs trimmed")
+
+    subset = df.iloc[:legacy_rows]
+    legacy_elapsed, (legacy_periods, legacy_stats) = time_call(legacy_trim_inactive_periods, subset, args.max_minutes, False)
+    print(f"Previous loop:        {legacy_elapsed:8.2f} s  ({len(subset) / legacy_elapsed:,.0f} rows/s) "
+          f"on {len(subset):,} rows")
+
+    # Same rows, segments and statistics on the rows both implementations saw
+    subset_elapsed, (subset_labelled, subset_stats) = time_call(label_active_segments, subset, args.max_minutes, False)
+    same = (subset_stats == legacy_stats
+            and len(legacy_periods) == subset_labelled["segment"].nunique()
+            and pd.concat(legacy_periods)["date"].equals(subset_labelled["date"]))
+    print(f"Results identical: {same}")
+    print(f"Speed-up on {len(subset):,} rows: {legacy_elapsed / subset_elapsed:.1f}x")
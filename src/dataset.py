@@ -0,0 +1,476 @@
+import os
+import glob
+import json
+import pickle
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+import response_store
+import online_stats
+from server_logs import file_sha256
+
+# Absolute paths, so the analysis and visualization scripts work from any folder
+PROCESSED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "processed")
+STORE_PATH = os.path.normpath(os.path.join(PROCESSED_PATH, "response_store"))
+CSV_FOLDER = os.path.normpath(os.path.join(PROCESSED_PATH, "response_variables"))
+
+# Combined frame pickled next to its sources, reused until a source file changes
+DATASET_CACHE_PATH = os.path.normpath(os.path.join(PROCESSED_PATH, "dataset_cache.pkl"))
+DATASET_CACHE_VERSION = 3  # Bump when the combined frame's schema changes
+
+# Canonical in-memory schema of the combined frame (treatment and iteration are categorical).
+# tps and cpu_usage stay float64: the statistical tests rank them, and float32 would
+# merge distinct values into new ties and shift the results
+COMPACT_DTYPES = {
+    "tps": "float64",
+    "cpu_usage": "float64",
+    "ram_usage": "uint32",  # MB
+    "players_online": "uint16",
+    "avg_ping": "Float32",  # Nullable: no ping is recorded while nobody is online
+}
+
+SUMMARY_METRICS = [("tps", "tps"), ("cpu", "cpu_usage"), ("ram", "ram_usage")]
+
+# Per-file, per-iteration accumulators (online_stats) behind the summary tables
+SUMMARY_STATE_PATH = os.path.normpath(os.path.join(PROCESSED_PATH, "summary_accumulators.json"))
+SUMMARY_STATE_VERSION = 1  # Bump when the accumulator format changes
+ACCUMULATED_METRICS = ["tps", "cpu_usage", "ram_usage", "players_online", "avg_ping"]
+
+_memo = {}  # In-process copy: {"sources": ..., "frame": DataFrame}
+
+
+def source_files():
+    """CSV exports and Parquet store files the combined frame is built from."""
+    files = sorted(glob.glob(os.path.join(CSV_FOLDER, "T*_response_variables_*.csv")))
+    files += sorted(glob.glob(os.path.join(STORE_PATH, "treatment=*", "**", "*.parquet"), recursive=True))
+    return files
+
+
+def _stat_sources(files):
+    return {path: (os.stat(path).st_size, os.stat(path).st_mtime_ns) for path in files}
+
+
+def _same_sources(cached, stats):
+    """
+    Compare cached {path: (size, mtime_ns, sha256)} entries with the current files.
+    A file whose size and mtime match is unchanged; otherwise its SHA-256 decides,
+    so a touched or copied but identical file does not invalidate the cache.
+    Returns the refreshed entries, or None when any source changed.
+    """
+    if cached is None or set(cached) != set(stats):
+        return None
+    refreshed = {}
+    for path, (size, mtime_ns) in stats.items():
+        cached_size, cached_mtime_ns, digest = cached[path]
+        if (cached_size, cached_mtime_ns) != (size, mtime_ns):
+            if cached_size != size or file_sha256(path) != digest:
+                return None
+        refreshed[path] = (size, mtime_ns, digest)
+    return refreshed
+
+
+def _read_disk_cache(cache_path):
+    try:
+        with open(cache_path, "rb") as f:
+            entry = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+    if not isinstance(entry, dict) or entry.get("version") != DATASET_CACHE_VERSION:
+        return None
+    return entry
+
+
+def _write_disk_cache(cache_path, sources, frame):
+    folder = os.path.dirname(cache_path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump({"version": DATASET_CACHE_VERSION, "sources": sources, "frame": frame},
+                        f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Could not write dataset cache {cache_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _read_summary_state(state_path):
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(state, dict) or state.get("version") != SUMMARY_STATE_VERSION:
+        return {}
+    return state["files"]
+
+
+def _write_summary_state(state_path, files):
+    folder = os.path.dirname(state_path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"version": SUMMARY_STATE_VERSION, "files": files}, f, separators=(",", ":"))
+        os.replace(tmp_path, state_path)
+    except OSError as e:
+        print(f"Could not write summary accumulators {state_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def summary_sources(root=STORE_PATH, csv_folder=CSV_FOLDER):
+    """
+    Files the accumulators are built from: the store files when the store is used,
+    the CSV files otherwise. Paths are absolute, so they are the same whatever the
+    working directory of the caller.
+    """
+    if response_store.store_is_current(root, csv_folder) and response_store.pyarrow_available():
+        files = glob.glob(os.path.join(root, "treatment=*", "**", "*.parquet"), recursive=True)
+    else:
+        files = glob.glob(os.path.join(csv_folder, "T*_response_variables_*.csv"))
+    return sorted(os.path.abspath(path) for path in files)
+
+
+def load_accumulators(state_path=SUMMARY_STATE_PATH, refresh=False, root=STORE_PATH, csv_folder=CSV_FOLDER):
+    """
+    Streaming accumulators (count, moments, min/max and a quantile sketch) of
+    ACCUMULATED_METRICS for every iteration, in constant memory per iteration.
+
+    Accumulators are kept per source file in state_path. A file whose size and
+    mtime (or SHA-256) did not change is not read again, so after the live tail
+    appends a store file or one treatment is re-extracted, only those files are
+    streamed and everything else is merged from the stored accumulators. The
+    extractor calls this after writing, so the sketches are ready before any
+    analysis runs.
+
+    Args:
+        state_path: JSON file with the per-file accumulators; None disables persistence
+        refresh: Ignore the stored accumulators and read every file
+        root: Parquet response store
+        csv_folder: Folder with the T*_response_variables_*.csv files
+
+    Returns:
+        Dict {(treatment, iteration): {metric: online_stats.MetricAccumulator}}
+    """
+    cached = {} if refresh or state_path is None else _read_summary_state(state_path)
+    entries = {}
+    changed = False
+    streamed = 0
+    for path in summary_sources(root, csv_folder):
+        stat = os.stat(path)
+        entry = cached.get(path)
+        if entry is not None and (entry["size"], entry["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+            if entry["size"] != stat.st_size or file_sha256(path) != entry["sha256"]:
+                entry = None
+            else:
+                entry = dict(entry, mtime_ns=stat.st_mtime_ns)
+                changed = True
+        if entry is None:
+            groups = online_stats.accumulate(response_store.iter_file_chunks(path, ACCUMULATED_METRICS),
+                                             ACCUMULATED_METRICS, by=["treatment", "iteration"])
+            entry = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": file_sha256(path),
+                "groups": [[str(treatment), str(iteration),
+                            {metric: accumulator.to_dict() for metric, accumulator in metrics.items()}]
+                           for (treatment, iteration), metrics in groups.items()],
+            }
+            changed = True
+            streamed += 1
+        entries[path] = entry
+    if streamed:
+        print(f"Accumulators: read {streamed} new or changed of {len(entries)} data files")
+    if state_path is not None and (changed or set(entries) != set(cached)):
+        _write_summary_state(state_path, entries)
+
+    accumulators = {}
+    for entry in entries.values():
+        for treatment, iteration, metrics in entry["groups"]:
+            part = {metric: online_stats.MetricAccumulator.from_dict(data) for metric, data in metrics.items()}
+            key = (treatment, iteration)
+            accumulators[key] = online_stats.merge_accumulators([accumulators[key], part]) if key in accumulators else part
+    return accumulators
+
+
+def treatment_accumulators(accumulators):
+    """
+    Merge per-iteration accumulators (see load_accumulators) into treatment totals.
+
+    Returns:
+        Dict {treatment: {metric: online_stats.MetricAccumulator}} in treatment order
+    """
+    by_treatment = {}
+    for (treatment, _), metrics in accumulators.items():
+        by_treatment.setdefault(treatment, []).append(metrics)
+    return {treatment: online_stats.merge_accumulators(by_treatment[treatment]) for treatment in sorted(by_treatment)}
+
+
+def treatment_sketches(metric, accumulators=None, treatments=None, iterations=None):
+    """
+    Quantile sketch of metric per treatment, merged from the per-iteration sketches.
+    Any percentile can then be read with sketch.quantile(q) without the raw rows
+    (see online_stats.QuantileSketch for the error bound).
+
+    Args:
+        metric: One of ACCUMULATED_METRICS
+        accumulators: Result of load_accumulators; loaded when None
+        treatments: Treatment labels to keep; None for all
+        iterations: Iteration labels to keep (e.g. ["1", "3_2"]); None for all
+
+    Returns:
+        Dict {treatment: online_stats.MetricAccumulator} in treatment order (.sketch, .moments)
+    """
+    if accumulators is None:
+        accumulators = load_accumulators()
+    parts = {}
+    for (treatment, iteration), metrics in accumulators.items():
+        if metric not in metrics:
+            continue
+        if treatments is not None and treatment not in treatments:
+            continue
+        if iterations is not None and iteration not in iterations:
+            continue
+        parts.setdefault(treatment, []).append(metrics[metric])
+    return {treatment: online_stats.merge_accumulators([{metric: part} for part in parts[treatment]])[metric]
+            for treatment in sorted(parts)}
+
+
+def summary_from_accumulators(totals):
+    """
+    treatment_summary computed from treatment totals (see treatment_accumulators)
+    instead of a DataFrame.
+    """
+    summary = pd.DataFrame({"treatment": list(totals)})
+    for prefix, metric in SUMMARY_METRICS:
+        moments = [totals[treatment][metric].moments if metric in totals[treatment] else online_stats.RunningMoments()
+                   for treatment in totals]
+        for stat in ["min", "max", "mean"]:
+            values = pd.Series([getattr(m, stat) if m.count else np.nan for m in moments], dtype="float64")
+            # Integer metrics (RAM) keep integer min/max, as when read straight from the CSVs
+            if (stat != "mean" and COMPACT_DTYPES.get(metric, "").startswith("uint") and values.notna().all()
+                    and (values == values.round()).all()):
+                values = values.astype("int64")
+            summary[f"{prefix}_{stat}"] = values.round(2).to_numpy()
+    return summary
+
+
+def compact_frame(df):
+    """
+    Downcast a response variables frame, in place, to COMPACT_DTYPES.
+
+    Integer columns with missing values get the nullable type (UInt32, UInt16), and
+    a column whose values do not fit its compact type (negative, fractional or too
+    large) is left as it is. treatment and iteration become categorical.
+
+    Returns:
+        The same DataFrame
+    """
+    for col, dtype in COMPACT_DTYPES.items():
+        if col not in df.columns:
+            continue
+        if dtype.startswith("uint"):
+            values = df[col].to_numpy(dtype="float64", na_value=np.nan)
+            missing = np.isnan(values)
+            present = values[~missing]
+            if len(present) and (present.min() < 0 or present.max() > np.iinfo(dtype).max
+                                 or (present != np.round(present)).any()):
+                continue
+            if missing.any():
+                df[col] = pd.array(values, dtype="Float64").astype(dtype.replace("uint", "UInt"))
+            else:
+                df[col] = values.astype(dtype)
+        else:
+            df[col] = df[col].astype(dtype)
+    for col in ["treatment", "iteration"]:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(str).astype("category")
+    return df
+
+
+def memory_report(df, label="Combined dataset"):
+    """
+    Print the memory used by each column of df (deep, so strings are counted).
+
+    Returns:
+        Total bytes
+    """
+    usage = df.memory_usage(deep=True, index=True)
+    total = int(usage.sum())
+    print(f"{label}: {len(df):,} rows, {total / 1e6:.2f} MB ({total / max(len(df), 1):.1f} bytes/row)")
+    for col in df.columns:
+        print(f"  {col:<16}{str(df[col].dtype):<40}{usage[col] / 1e6:10.2f} MB")
+    return total
+
+
+def load_dataset(cache_path=DATASET_CACHE_PATH, refresh=False):
+    """
+    Combined response variables of every treatment in the compact schema
+    (COMPACT_DTYPES), parsed once and shared.
+
+    The frame is memoized in-process and pickled to cache_path; both copies are
+    reused while the source CSVs and store files are unchanged (size and mtime, or
+    SHA-256 when those differ). Otherwise it is rebuilt with
+    response_store.load_response_variables, which reads the Parquet store when it
+    is available and current and the CSV files otherwise.
+
+    Args:
+        cache_path: Pickle file for the on-disk cache; None keeps only the in-process copy
+        refresh: Ignore both caches and rebuild
+
+    Returns:
+        DataFrame, or None when no data was found
+    """
+    files = source_files()
+    if not files:
+        return None
+    stats = _stat_sources(files)
+
+    if not refresh:
+        sources = _same_sources(_memo.get("sources"), stats)
+        if sources is not None:
+            _memo["sources"] = sources
+            return _memo["frame"]
+
+        entry = _read_disk_cache(cache_path) if cache_path else None
+        sources = _same_sources(entry["sources"], stats) if entry else None
+        if sources is not None:
+            if sources != entry["sources"]:
+                _write_disk_cache(cache_path, sources, entry["frame"])
+            _memo.update(sources=sources, frame=entry["frame"])
+            return entry["frame"]
+
+    frame = response_store.load_response_variables(root=STORE_PATH, csv_folder=CSV_FOLDER)
+    if frame is None:
+        return None
+    compact_frame(frame)
+    sources = {path: stat + (file_sha256(path),) for path, stat in stats.items()}
+    if cache_path:
+        _write_disk_cache(cache_path, sources, frame)
+    _memo.update(sources=sources, frame=frame)
+    return frame
+
+
+def load_all_treatment_data(columns=None, treatments=None):
+    """
+    Load the combined data of all treatments from the shared cache.
+
+    Args:
+        columns: Measurement columns to keep (date, treatment and iteration are always kept); None for all
+        treatments: Treatment labels to keep, e.g. ["T2", "T5"]; None for all
+
+    Returns:
+        DataFrame, or None when no data was found
+    """
+    df = load_dataset()
+    if df is None:
+        print(f"No data files found in {CSV_FOLDER}. Run extract_response_vars_iterations.py first.")
+        return None
+
+    if treatments is not None:
+        df = df[df["treatment"].isin(treatments)].reset_index(drop=True)
+    if columns is not None:
+        df = df[list(dict.fromkeys(["date"] + list(columns) + ["treatment", "iteration"]))]
+    else:
+        # Shallow copy, so a script adding columns does not change the cached frame
+        df = df.copy(deep=False)
+
+    print(f"Loaded data for treatments: {sorted(df['treatment'].unique())}")
+    print(f"Total records: {len(df)}")
+    return df
+
+
+def treatment_groups(df, metric):
+    """
+    Non-missing values of metric for each treatment, split in a single groupby pass
+    instead of one boolean mask per treatment.
+
+    Values are returned as float64 (the integer columns are compact), since scipy.stats
+    computes in its input dtype.
+
+    Returns:
+        Dict {treatment: Series} for every treatment present in df, in treatment order
+        (a Series is empty when all of the treatment's values are missing)
+    """
+    return {treatment: values.dropna().astype("float64")
+            for treatment, values in df.groupby("treatment", observed=True, sort=True)[metric]}
+
+
+def load_raw_data(columns=None, treatments=None):
+    """Alias of load_all_treatment_data kept for the dashboards ('date' is already parsed)."""
+    return load_all_treatment_data(columns, treatments)
+
+
+def treatment_summary(df):
+    """
+    Min, max and mean of TPS, CPU and RAM per treatment, rounded to 2 decimals.
+
+    Returns:
+        DataFrame with a 'treatment' column and <tps|cpu|ram>_<min|max|mean> columns
+    """
+    summary = pd.DataFrame({"treatment": sorted(df["treatment"].unique())})
+    grouped = df.groupby("treatment", observed=True)
+    for prefix, metric in SUMMARY_METRICS:
+        stats = grouped[metric].agg(["min", "max", "mean"])
+        for stat in ["min", "max", "mean"]:
+            values = summary["treatment"].map(stats[stat]).astype("float64")
+            # Integer metrics (RAM) keep integer min/max, as when read straight from the CSVs
+            if stat != "mean" and pd.api.types.is_integer_dtype(df[metric]) and values.notna().all():
+                values = values.astype("int64")
+            summary[f"{prefix}_{stat}"] = values.round(2).to_numpy()
+    return summary
+
+
+def load_summary_data():
+    """
+    Per-treatment summary statistics (see treatment_summary) merged from the stored
+    accumulators (see load_accumulators), without loading the response variables.
+    """
+    accumulators = load_accumulators()
+    if not accumulators:
+        print(f"No data files found in {CSV_FOLDER}. Run extract_response_vars_iterations.py first.")
+        return None
+
+    df_summary = summary_from_accumulators(treatment_accumulators(accumulators))
+    print(f"Loaded and calculated summary for treatments: {df_summary['treatment'].tolist()}")
+    print(f"Summary data shape: {df_summary.shape}")
+    return df_summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared response variables dataset.")
+    parser.add_argument("--refresh", action="store_true", help="Rebuild the cached dataset")
+    parser.add_argument("--memory-report", action="store_true",
+                        help="Compare the compact frame with the frame read from the CSVs as text")
+    parser.add_argument("--percentiles", metavar="METRIC",
+                        help="Print percentiles of METRIC per treatment from the quantile sketches")
+    parser.add_argument("--q", type=float, nargs="+", default=[1, 5, 25, 50, 75, 95, 99],
+                        help="Percentiles for --percentiles (default: 1 5 25 50 75 95 99)")
+    args = parser.parse_args()
+
+    if args.percentiles:
+        if args.percentiles not in ACCUMULATED_METRICS:
+            parser.error(f"--percentiles takes one of {ACCUMULATED_METRICS}")
+        sketches = treatment_sketches(args.percentiles, load_accumulators(refresh=args.refresh))
+        print(f"{args.percentiles} percentiles (sketch rank error about {1.7 / online_stats.SKETCH_K:.1%} of n)")
+        print(f"{'Treatment':<10}{'n':>8}" + "".join(f"{f'p{q:g}':>10}" for q in args.q))
+        for treatment, accumulator in sketches.items():
+            values = accumulator.sketch.quantile([q / 100 for q in args.q])
+            print(f"{treatment:<10}{accumulator.moments.count:>8}" + "".join(f"{value:>10.2f}" for value in values))
+        raise SystemExit
+
+    df = load_dataset(refresh=args.refresh)
+    if df is None:
+        print(f"No data files found in {CSV_FOLDER}. Run extract_response_vars_iterations.py first.")
+    elif args.memory_report:
+        csv_files = glob.glob(os.path.join(CSV_FOLDER, "T*_response_variables_*.csv"))
+        text_df = pd.concat([pd.read_csv(file) for file in csv_files], ignore_index=True)
+        text_bytes = memory_report(text_df, "CSV frame (pd.read_csv)")
+        compact_bytes = memory_report(df, "Compact frame")
+        print(f"Compact frame uses {compact_bytes / text_bytes:.1%} of the CSV frame "
+              f"({text_bytes / compact_bytes:.1f}x smaller)")
+    else:
+        print(f"Dataset: {len(df):,} rows, treatments {sorted(df['treatment'].unique())}")
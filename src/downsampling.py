@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+SCREEN_DPI = 100
+INTERACTIVE_WIDTH_PX = 1600  # Point budget per trace for the plotly figures (about a full-width browser plot)
+WEBGL_THRESHOLD = 1000  # Points per trace above which the plotly figures use WebGL (go.Scattergl)
+
+
+def pixel_budget(width_inches, dpi=SCREEN_DPI):
+    """
+    Points worth drawing per trace on a plot width_inches wide at dpi: about one
+    per pixel column, more cannot be told apart.
+    """
+    return max(3, int(width_inches * dpi))
+
+
+def _as_float(x):
+    """x as float64 numbers (datetimes, tz-aware or not, as nanoseconds since the epoch)."""
+    if pd.api.types.is_datetime64_any_dtype(x):
+        return pd.DatetimeIndex(x).asi8.astype("float64")
+    return np.asarray(x, dtype="float64")
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets (Steinarsson 2013) selection of n_out points.
+
+    The first and last points are always kept; the rest are split into n_out - 2
+    buckets of equal count and from each bucket the point forming the largest
+    triangle with the point chosen in the previous bucket and the mean of the next
+    bucket is kept. Peaks, dips and level changes survive, unlike with every-nth
+    or mean decimation. Bucket means are computed at once; the per-bucket argmax
+    depends on the previous choice, so it runs once per output point.
+
+    Args:
+        x: Sorted x values (numbers or datetimes)
+        y: y values, without missing values
+        n_out: Number of points to keep
+
+    Returns:
+        Sorted integer positions of the kept points (all of them when n_out >= len(y))
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = _as_float(x)
+    y = np.asarray(y, dtype="float64")
+
+    # Bucket i covers [edges[i], edges[i + 1]) of the points between the first and the last
+    edges = (np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype("int64") + 1
+    edges[-1] = n - 1
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:-1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:-1], edges[:-1]) / counts
+    # The point after the last bucket is the last point itself
+    mean_x = np.append(mean_x, x[-1])
+    mean_y = np.append(mean_y, y[-1])
+
+    selected = np.empty(n_out, dtype="int64")
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        bx, by = x[start:stop], y[start:stop]
+        area = np.abs((x[a] - mean_x[i + 1]) * (by - y[a]) - (x[a] - bx) * (mean_y[i + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def envelope_indices(y, n_buckets):
+    """
+    Min/max envelope of y over n_buckets buckets of equal count.
+
+    Returns:
+        (center positions, bucket minima, bucket maxima), one entry per bucket
+    """
+    y = np.asarray(y, dtype="float64")
+    n_buckets = max(1, min(n_buckets, len(y)))
+    starts = (np.arange(n_buckets) * len(y) / n_buckets).astype("int64")
+    stops = np.append(starts[1:], len(y))
+    return (starts + stops - 1) // 2, np.minimum.reduceat(y, starts), np.maximum.reduceat(y, starts)
+
+
+def downsample_trace(x, y, max_points):
+    """
+    Reduce one trace to at most max_points points for drawing.
+
+    Missing y values are dropped and the trace is sorted by x. When the trace fits
+    the budget it is returned as is; otherwise the line is its LTTB selection and the
+    min/max envelope (max_points // 2 buckets, drawn as a band under the line) keeps
+    the full range of values each pixel column covers.
+
+    Args:
+        x: Series of x values (dates)
+        y: Series of y values, aligned with x
+        max_points: Point budget (see pixel_budget); None or 0 keeps every point
+
+    Returns:
+        (x, y, envelope), envelope None when nothing was dropped, else
+        (x, minima, maxima)
+    """
+    trace = pd.DataFrame({"x": pd.Series(x).reset_index(drop=True), "y": pd.Series(y).reset_index(drop=True)})
+    trace = trace.dropna(subset=["y"])
+    if not trace["x"].is_monotonic_increasing:
+        trace = trace.sort_values("x", kind="stable")
+    if not max_points or len(trace) <= max_points:
+        return trace["x"], trace["y"], None
+
+    kept = lttb_indices(trace["x"], trace["y"], max_points)
+    centers, low, high = envelope_indices(trace["y"], max_points // 2)
+    envelope = (trace["x"].iloc[centers], low, high)
+    return trace["x"].iloc[kept], trace["y"].iloc[kept], envelope
+
+
+def plot_downsampled(ax, x, y, max_points, color=None, label=None, **kwargs):
+    """
+    Draw a trace on a matplotlib Axes through downsample_trace: the LTTB line and,
+    when points were dropped, the min/max envelope as a translucent band.
+
+    Args:
+        ax: Axes to draw on
+        x, y: Series of the trace
+        max_points: Point budget (see pixel_budget)
+        color, label, **kwargs: Passed to ax.plot
+
+    Returns:
+        True when the trace was downsampled
+    """
+    line_x, line_y, envelope = downsample_trace(x, y, max_points)
+    lines = ax.plot(line_x, line_y, color=color, label=label, **kwargs)
+    if envelope is not None:
+        envelope_x, low, high = envelope
+        ax.fill_between(envelope_x, low, high, color=lines[0].get_color(), alpha=0.25, linewidth=0)
+    return envelope is not None
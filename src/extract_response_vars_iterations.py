@@ -1,156 +1,97 @@
-import sqlite3
 import pandas as pd
 from datetime import datetime
 import os
-import re
 import pytz
+import argparse
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import json
+import pickle
+import tempfile
+import numpy as np
+import plan_db
+import manifest
+import server_logs
+import response_store
+import dataset
+from inactivity import StreamingInactivityTrimmer, inactivity_runs
+from interval_set import IntervalSet, find_overlapping_windows, to_epoch_ms
 
 # === CONFIGURATION ===
 db_path = "data/raw/database.db"
+db_read_only = False  # Open db_path through a mode=ro URI (--snapshot ro)
+SNAPSHOT_DB_PATH = "data/processed/plan_snapshot.db"  # Local copy taken by --snapshot backup
+STATE_PATH = "data/processed/extraction_state.json"  # Watermarks for --incremental
+MANIFEST_STATE_PATH = "data/processed/manifest_state.json"  # Per-treatment hashes of the last extraction
+SUMMARY_STATE_PATH = "data/processed/summary_accumulators.json"  # Per-iteration sketches (dataset.load_accumulators)
 local_tz = pytz.timezone('America/Costa_Rica')
 verbose = False  # Set to True to enable detailed logging
+write_store = True  # Also write the Parquet response store (disable with --no-store)
+STREAM_ROW_BYTES = 1024  # Conservative per-row footprint of a --stream chunk (query, merge and CSV copies)
 
-# Format: (iteration_number, start_year, start_month, start_day, start_hour, start_minute,
-#                       end_year,   end_month,   end_day,   end_hour,   end_minute)
-# ========== TRATAMIENTO T1 ==========
-iterations1 = [
-    #(itr, st_yr, st_mon, st_day, st_hr, st_min,  end_yr, end_mo, end_day, end_hr, end_min)
-    ("1", 2025, 6, 11, 18, 0, 2025, 6, 12, 6, 0),
-]
-
-# ========== TRATAMIENTO T2 ==========
-iterations2 = [
-    #(itr, st_yr, st_mon, st_day, st_hr, st_min,  end_yr, end_mo, end_day, end_hr, end_min)
-    ("1", 2025, 6, 22, 21, 2, 2025, 6, 28, 16, 10),
-]
-
-# ========== TRATAMIENTO T3 ==========
-iterations3 = [
-    #(itr, st_yr, st_mon, st_day, st_hr, st_min,  end_yr, end_mo, end_day, end_hr, end_min)
-    ("1", 2025, 6, 12, 23, 0, 2025, 6, 14, 16, 0),
-    ("2", 2025, 6, 21, 22, 20, 2025, 6, 22, 12, 0),
-]
-
-# ========== TRATAMIENTO T4 ==========
-iterations4 = [
-    #(itr, st_yr, st_mon, st_day, st_hr, st_min,  end_yr, end_mo, end_day, end_hr, end_min)
-    # ("1", 2025, 6, 19, 11, 0, 2025, 6, 19, 11, 0),  # Eliminado - comentado
-    ("1", 2025, 6, 21, 18, 0, 2025, 6, 21, 22, 0),
-]
-
-# ========== TRATAMIENTO T5 ==========
-iterations5 = [
-    #(itr, st_yr, st_mon, st_day, st_hr, st_min,  end_yr, end_mo, end_day, end_hr, end_min)
-    ("1", 2025, 6, 14, 16, 0, 2025, 6, 19, 10, 0),
-    ("2", 2025, 6, 21, 15, 0, 2025, 6, 21, 18, 0),
-]
-
-# ========== TRATAMIENTO T6 ==========
-iterations6 = [
-    #(itr, st_yr, st_mon, st_day, st_hr, st_min,  end_yr, end_mo, end_day, end_hr, end_min)
-    ("1", 2025, 6, 20, 21, 9, 2025, 6, 21, 15, 0),
-    ("2", 2025, 6, 22, 15, 2, 2025, 6, 22, 18, 0),
-    ("3", 2025, 6, 28, 16, 10, 2025, 6, 30, 23, 10),  # En progreso - sin fecha fin
-]
-
-# ========== TRATAMIENTO T7 ==========
-iterations7 = [
-    #(itr, st_yr, st_mon, st_day, st_hr, st_min,  end_yr, end_mo, end_day, end_hr, end_min)
-    # ("1", 2025, 6, 12, 9, 0, 2025, 6, 12, 23, 0),   # Eliminado por mod - comentado
-    ("1", 2025, 6, 20, 18, 9, 2025, 6, 20, 20, 59),
-    ("2", 2025, 6, 22, 18, 0, 2025, 6, 22, 21, 0),
-]
+# Columns written to every response variables CSV
+NUMERIC_COLUMNS = ['tps', 'cpu_usage', 'ram_usage', 'players_online', 'avg_ping']
+OUTPUT_COLUMNS = ['date', 'tps', 'cpu_usage', 'ram_usage', 'players_online', 'avg_ping', 'treatment', 'iteration']
+
+# Treatments, their iteration windows and trim parameters, and the excluded windows
+# are declared in the experiment manifest (see experiment.toml).
 
 import pandas as pd
 
-def trim_inactive_periods(df, max_minutes_without_players=1, verbose=True):
+def label_active_segments(df, max_minutes_without_players=1, verbose=True):
     """
     Trims periods of inactivity longer than specified minutes by completely removing excess inactivity.
+    Run boundaries, durations and segment numbers are computed as arrays (see
+    inactivity.inactivity_runs), with no Python loop over the runs.
     
     Args:
         df: DataFrame with 'date' and 'players_online' columns
         max_minutes_without_players: Maximum allowed minutes without players
-        verbose: Show processing details (default: False)
+        verbose: Show processing details (default: True)
         
     Returns:
-        Tuple: (List of DataFrames for active periods, dict with statistics)
+        Tuple: (DataFrame of the kept rows with a 1-based 'segment' column, dict with statistics)
     """
     if df.empty:
-        return [], {"total_minutes": 0, "accepted_minutes": 0, "rejected_minutes": 0, "discarded_segments": []}
+        return df.assign(segment=pd.Series(dtype="int64")), {"total_minutes": 0, "accepted_minutes": 0, "rejected_minutes": 0, "discarded_segments": []}
     
     # Sort and prepare data
     df_sorted = df.sort_values("date").copy()
     df_sorted["players_online"] = df_sorted["players_online"].fillna(0)
-    total_duration = (df_sorted["date"].iloc[-1] - df_sorted["date"].iloc[0]).total_seconds() / 60
-    
-    # Create time differences between consecutive rows
-    df_sorted["time_diff"] = df_sorted["date"].diff().dt.total_seconds().fillna(0) / 60
-    next_diff = df_sorted["date"].shift(-1) - df_sorted["date"]
-    df_sorted["next_diff"] = next_diff.dt.total_seconds().fillna(0) / 60
+    dates = df_sorted["date"]
+    total_duration = (dates.iloc[-1] - dates.iloc[0]).total_seconds() / 60
     
-    # Find inactive periods
-    no_players_mask = df_sorted["players_online"] == 0
-    if not no_players_mask.any():
+    players = df_sorted["players_online"].to_numpy()
+    if not (players == 0).any():
         stats = {
             "total_minutes": total_duration,
             "accepted_minutes": total_duration,
             "rejected_minutes": 0,
             "discarded_segments": []
         }
-        return [df_sorted], stats
+        return df_sorted.assign(segment=1), stats
     
-    # Group consecutive inactive periods
-    groups = (no_players_mask != no_players_mask.shift()).cumsum()
-    group_data = df_sorted.groupby(groups)
+    segment, dropped_first, dropped_last, excess = inactivity_runs(dates, players, max_minutes_without_players)
     
-    active_periods = []
-    discarded_segments = []
-    total_rejected_minutes = 0
-    current_active = []  # Track current active period rows
-    
-    for (group_id, group_df) in group_data:
-        is_inactive = group_df["players_online"].iloc[0] == 0
-        
-        # Calculate true duration of inactive period
-        if is_inactive:
-            if len(group_df) == 1:
-                duration = group_df["next_diff"].iloc[0]
-            else:
-                duration = (group_df["date"].iloc[-1] - group_df["date"].iloc[0]).total_seconds() / 60
-        else:
-            current_active.append(group_df)
-            continue
-            
-        # Process long inactive periods
-        if duration > max_minutes_without_players:
-            if current_active:
-                active_periods.append(pd.concat(current_active))
-                current_active = []
-            
-            # Calculate excess time to remove
-            excess_time = duration - max_minutes_without_players
-            total_rejected_minutes += excess_time
-            
-            # Record discarded segment
-            discarded_segments.append({
-                "start": (group_df["date"].iloc[0] + pd.Timedelta(minutes=max_minutes_without_players)).strftime('%H:%M'),
-                "end": group_df["date"].iloc[-1].strftime('%H:%M'),
-                "duration": excess_time
-            })
-            
-            if verbose:
-                print(f"Trimmed {excess_time:.2f} min inactivity: "
-                      f"{group_df['date'].iloc[0].strftime('%H:%M')} - "
-                      f"{group_df['date'].iloc[-1].strftime('%H:%M')}")
-        else:
-            # Short inactivity remains in active data
-            current_active.append(group_df)
+    # Record discarded segments
+    run_start = pd.DatetimeIndex(dates.iloc[dropped_first])
+    run_end = pd.DatetimeIndex(dates.iloc[dropped_last])
+    excess = excess.tolist()
+    discarded_segments = [
+        {"start": start, "end": end, "duration": excess_time}
+        for start, end, excess_time in zip(
+            (run_start + pd.Timedelta(minutes=max_minutes_without_players)).strftime('%H:%M'),
+            run_end.strftime('%H:%M'),
+            excess
+        )
+    ]
     
-    # Add final active segment
-    if current_active:
-        active_periods.append(pd.concat(current_active))
+    if verbose:
+        for excess_time, start, end in zip(excess, run_start.strftime('%H:%M'), run_end.strftime('%H:%M')):
+            print(f"Trimmed {excess_time:.2f} min inactivity: {start} - {end}")
     
-    # Calculate statistics
+    # Calculate statistics (summed in run order, like the running total it replaces)
+    total_rejected_minutes = sum(excess)
     accepted_minutes = total_duration - total_rejected_minutes
     stats = {
         "total_minutes": round(total_duration, 2),
@@ -159,54 +100,178 @@ def trim_inactive_periods(df, max_minutes_without_players=1, verbose=True):
         "discarded_segments": discarded_segments
     }
     
+    kept = segment > 0
+    return df_sorted[kept].assign(segment=segment[kept]), stats
+
+
+def trim_inactive_periods(df, max_minutes_without_players=1, verbose=True):
+    """
+    List-returning form of label_active_segments.
+    
+    Returns:
+        Tuple: (List of DataFrames for active periods, dict with statistics)
+    """
+    labelled, stats = label_active_segments(df, max_minutes_without_players, verbose)
+    active_periods = [period.drop(columns="segment") for _, period in labelled.groupby("segment", sort=True)]
     return active_periods, stats
 
 
-def extract_chunky_intervals(log_folder="data/raw/logs"):
+def extract_chunky_intervals(log_folder="data/raw/logs", jobs=None, cache_path=server_logs.EVENT_CACHE_PATH):
     """
-    Scans all log files in the given folder for Chunky processing intervals.
+    Scans all log files (plain and rotated .log.gz) in the given folder for Chunky processing intervals.
+    Parsing is done by server_logs, one worker process per file; events of unchanged
+    files come from the cache at cache_path (None to always parse).
 
     Returns:
         List of (start_datetime, end_datetime) tuples representing when Chunky was running.
     """
-    pattern_start = re.compile(r"\[(\d{2}:\d{2}:\d{2})\].*\[Chunky\] Task running")
-    pattern_end = re.compile(r"\[(\d{2}:\d{2}:\d{2})\].*\[Chunky\] Task finished")
+    return server_logs.chunky_intervals(log_folder, jobs=jobs, cache_path=cache_path)
+
+def window_to_epoch_ms(sy, sM, sd, sh, sm, ey, eM, ed, eh, em):
+    """Convert a local start/end window definition to UTC epoch milliseconds."""
+    local_start = local_tz.localize(datetime(sy, sM, sd, sh, sm, 0))
+    local_end = local_tz.localize(datetime(ey, eM, ed, eh, em, 0))
+    start_ms = int(local_start.astimezone(pytz.utc).timestamp() * 1000)
+    end_ms = int(local_end.astimezone(pytz.utc).timestamp() * 1000)
+    return start_ms, end_ms
+
+def build_exclusion_set(chunky_intervals_naive=None, manual_windows=()):
+    """
+    Build a single IntervalSet with every window whose samples must be discarded:
+    Chunky pregeneration tasks, backups, restarts and manually excluded windows.
+
+    Args:
+        chunky_intervals_naive: Naive local (start, end) datetimes; parsed from the logs if None
+        manual_windows: (label, start..., end...) window tuples from the manifest's exclusions
+
+    Returns:
+        IntervalSet over UTC epoch milliseconds
+    """
+    if chunky_intervals_naive is None:
+        chunky_intervals_naive = extract_chunky_intervals()
+
+    chunky = IntervalSet.from_pairs(
+        (local_tz.localize(start), local_tz.localize(end)) for start, end in chunky_intervals_naive
+    )
+
+    manual_pairs = [window_to_epoch_ms(*window[1:]) for window in manual_windows]
+    return chunky.union(IntervalSet.from_pairs(manual_pairs))
+
+def check_iteration_overlaps(treatments):
+    """
+    Warn about iteration windows that overlap across (or within) treatments.
+    Boundary samples of touching windows are extracted by both BETWEEN queries.
+
+    Args:
+        treatments: List of (filename, iterations, treatment_number) tuples
+
+    Returns:
+        List of overlaps as returned by find_overlapping_windows
+    """
+    windows = []
+    for _, iterations, treatment_number in treatments:
+        for iteration, *bounds in iterations:
+            start_ms, end_ms = window_to_epoch_ms(*bounds)
+            windows.append((f"T{treatment_number}-{iteration}", start_ms, end_ms))
+
+    overlaps = find_overlapping_windows(windows)
+    for label_a, label_b, start_ms, end_ms in overlaps:
+        start = pd.Timestamp(start_ms, unit="ms", tz="UTC").tz_convert(local_tz).strftime('%Y-%m-%d %H:%M')
+        end = pd.Timestamp(end_ms, unit="ms", tz="UTC").tz_convert(local_tz).strftime('%Y-%m-%d %H:%M')
+        kind = "share a boundary at" if start_ms == end_ms else "overlap from"
+        detail = start if start_ms == end_ms else f"{start} to {end}"
+        print(f"Warning: iteration windows {label_a} and {label_b} {kind} {detail}")
+    return overlaps
+
+def prepare_iteration_data(df, df_ping, exclusions):
+    """
+    Drops excluded samples, converts dates to local time and attaches the nearest
+    previous average ping to every plan_tps row.
+
+    Args:
+        df: plan_tps rows with raw epoch-ms dates
+        df_ping: plan_ping rows with raw epoch-ms dates
+        exclusions: IntervalSet of windows to drop
 
-    intervals = []
+    Returns:
+        DataFrame with local-time dates, metrics and avg_ping
+    """
+    # Drop every excluded sample in one vectorized pass over the raw epoch-ms dates
+    df = df[~exclusions.contains(df["date"].to_numpy())].copy()
+    df["date"] = pd.to_datetime(df["date"], unit="ms").dt.tz_localize('UTC').dt.tz_convert(local_tz)
 
-    for filename in sorted(os.listdir(log_folder)):
-        if not filename.endswith(".log"):
-            continue
+    df_ping = df_ping.copy()
+    df_ping["date"] = pd.to_datetime(df_ping["date"], unit="ms").dt.tz_localize('UTC').dt.tz_convert(local_tz)
 
-        # Extract date from filename
-        date_match = re.match(r"(\d{4})-(\d{2})-(\d{2})-\d+\.log", filename)
-        if not date_match:
-            continue
+    # FIXED: Handle merge_asof with proper data type consistency
+    if not df_ping.empty:
+        # Ensure consistent data types before merge
+        df_ping['avg_ping'] = pd.to_numeric(df_ping['avg_ping'], errors='coerce')
+        
+        # Merge ping data with TPS data based on nearest previous timestamp
+        df = pd.merge_asof(
+            df.sort_values("date"),
+            df_ping.sort_values("date"),
+            on="date", 
+            direction="backward",
+            suffixes=('', '_ping')  # Avoid column name conflicts
+        )
+    else:
+        # No ping data available, add empty avg_ping column with consistent dtype
+        df['avg_ping'] = pd.Series(dtype='float64')
 
-        log_date = datetime.strptime("-".join(date_match.groups()), "%Y-%m-%d")
+    # Ensure all numeric columns have consistent dtypes
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
 
-        file_path = os.path.join(log_folder, filename)
-        with open(file_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
+def build_iteration_segments(df, iteration, treatment_number, max_minutes_without_players):
+    """
+    Trims inactivity from one iteration and labels its active segments.
 
-        current_start = None
-        for line in lines:
-            match_start = pattern_start.search(line)
-            match_end = pattern_end.search(line)
+    Returns:
+        Tuple: (List with the labelled active rows as one DataFrame with OUTPUT_COLUMNS,
+                empty when nothing is left after trimming; iteration statistics dict)
+    """
+    # Check for presence of players
+    if df["players_online"].fillna(0).sum() == 0:
+        print(f"Warning: No players online during Iteration {iteration} (T{treatment_number})")
 
-            if match_start and current_start is None:
-                time_part = match_start.group(1)
-                current_start = datetime.combine(log_date.date(), datetime.strptime(time_part, "%H:%M:%S").time())
+    # Trim periods of inactivity longer than specified minutes
+    labelled, iteration_stats = label_active_segments(df, max_minutes_without_players)
+    if labelled.empty:
+        return [], iteration_stats
 
-            elif match_end and current_start is not None:
-                time_part = match_end.group(1)
-                end_time = datetime.combine(log_date.date(), datetime.strptime(time_part, "%H:%M:%S").time())
-                intervals.append((current_start, end_time))
-                current_start = None  # Reset for next possible interval
+    # Active periods are labelled "<iteration>_<segment>" when the iteration was split
+    if labelled["segment"].iloc[-1] > 1:
+        label = f"{iteration}_" + labelled["segment"].astype(str)
+    else:
+        label = iteration
+    return [format_segment(labelled, treatment_number, label)], iteration_stats
 
-    return intervals
+def format_segment(active_df, treatment_number, iteration_label):
+    """Adds treatment/iteration labels and returns the segment with OUTPUT_COLUMNS in order."""
+    # Add treatment and iteration columns with consistent dtypes
+    active_df = active_df.copy()
+    active_df["treatment"] = f"T{treatment_number}"
+    if isinstance(iteration_label, pd.Series):
+        active_df["iteration"] = iteration_label.astype(str)
+    else:
+        active_df["iteration"] = str(iteration_label)
+    
+    # Ensure all DataFrames have the same column order and types
+    for col in OUTPUT_COLUMNS:
+        if col not in active_df.columns:
+            if col in NUMERIC_COLUMNS:
+                active_df[col] = pd.Series(dtype='float64')
+            else:
+                active_df[col] = pd.Series(dtype='object')
+    
+    # Reorder columns to ensure consistency
+    return active_df[OUTPUT_COLUMNS]
 
-def  extract_response_variables(filename, iterations, treatment_number, max_minutes_without_players=20):
+def  extract_response_variables(filename, iterations, treatment_number, max_minutes_without_players=20, exclusions=None, prefetched=None, processed=None):
     """
     Extracts response variables from the database for specified iterations.
     Each iteration is defined by a start and end time.
@@ -216,6 +281,11 @@ def  extract_response_variables(filename, iterations, treatment_number, max_minu
         iterations: List of iteration tuples with time ranges
         treatment_number: Treatment number
         max_minutes_without_players: Maximum minutes allowed without players before terminating iteration (default: 20)
+        exclusions: IntervalSet of windows to drop (default: built from logs and configured windows)
+        prefetched: Dict from plan_db.query_windows_batched keyed by (treatment_number, iteration);
+            when given, no queries are issued for this treatment
+        processed: Dict of (segments, iteration_stats) keyed by (treatment_number, iteration),
+            as returned by extract_iterations_parallel; when given, iterations are only merged
     """
     if verbose:
         print(f"\n--- PROCESSING TREATMENT T{treatment_number} ---")
@@ -237,83 +307,34 @@ def  extract_response_variables(filename, iterations, treatment_number, max_minu
         "total_discarded_segments": 0
     }
 
-    chunky_intervals_naive  = extract_chunky_intervals()
-    chunky_intervals = [(local_tz.localize(start), local_tz.localize(end)) for start, end in chunky_intervals_naive]
-    
-    # Remove timestamps that fall into any Chunky processing interval
-    def is_in_chunky_interval(ts):
-        return any(start <= ts <= end for start, end in chunky_intervals)
+    # Chunky, backup, restart and manual windows whose samples are discarded
+    if exclusions is None and processed is None:
+        exclusions = build_exclusion_set()
 
-        # Process each iteration
+    # Process each iteration
     for iteration, sy, sM, sd, sh, sm, ey, eM, ed, eh, em in iterations:
         local_start = local_tz.localize(datetime(sy, sM, sd, sh, sm, 0))
         local_end = local_tz.localize(datetime(ey, eM, ed, eh, em, 0))
-        start_time = int(local_start.astimezone(pytz.utc).timestamp() * 1000)
-        end_time = int(local_end.astimezone(pytz.utc).timestamp() * 1000)
+        start_time, end_time = window_to_epoch_ms(sy, sM, sd, sh, sm, ey, eM, ed, eh, em)
 
         if verbose:
             print(f"Processing Iteration {iteration}: {local_start.strftime('%H:%M')} - {local_end.strftime('%H:%M')}")
 
-        conn = sqlite3.connect(db_path)
-
-        # Query TPS, CPU, RAM, and players online
-        query = """
-        SELECT
-            tps.date,
-            tps.tps,
-            tps.cpu_usage,
-            tps.ram_usage,
-            tps.players_online
-        FROM plan_tps tps
-        WHERE tps.date BETWEEN ? AND ?
-        ORDER BY tps.date ASC
-        """
-        df = pd.read_sql_query(query, conn, params=(start_time, end_time))
-        df["date"] = pd.to_datetime(df["date"], unit="ms").dt.tz_localize('UTC').dt.tz_convert(local_tz)
-
-        # Query average ping
-        query_ping = """
-        SELECT date, avg(avg_ping) as avg_ping
-        FROM plan_ping
-        WHERE date BETWEEN ? AND ?
-        GROUP BY date
-        ORDER BY date ASC
-        """
-        df_ping = pd.read_sql_query(query_ping, conn, params=(start_time, end_time))
-        df_ping["date"] = pd.to_datetime(df_ping["date"], unit="ms").dt.tz_localize('UTC').dt.tz_convert(local_tz)
-
-        # FIXED: Handle merge_asof with proper data type consistency
-        if not df_ping.empty:
-            # Ensure consistent data types before merge
-            df_ping['avg_ping'] = pd.to_numeric(df_ping['avg_ping'], errors='coerce')
-            
-            # Merge ping data with TPS data based on nearest previous timestamp
-            df = pd.merge_asof(
-                df.sort_values("date"),
-                df_ping.sort_values("date"),
-                on="date", 
-                direction="backward",
-                suffixes=('', '_ping')  # Avoid column name conflicts
-            )
-
-            df["in_chunky"] = df["date"].apply(is_in_chunky_interval)
-            df = df[~df["in_chunky"]].drop(columns=["in_chunky"])
+        if processed is not None:
+            segments, iteration_stats = processed[(treatment_number, iteration)]
         else:
-            # No ping data available, add empty avg_ping column with consistent dtype
-            df['avg_ping'] = pd.Series(dtype='float64')
-
-        # Ensure all numeric columns have consistent dtypes
-        numeric_columns = ['tps', 'cpu_usage', 'ram_usage', 'players_online', 'avg_ping']
-        for col in numeric_columns:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-
-        # Check for presence of players
-        if df["players_online"].fillna(0).sum() == 0:
-            print(f"Warning: No players online during Iteration {iteration} (T{treatment_number})")
+            # Query TPS, CPU, RAM, players online and average ping
+            if prefetched is not None:
+                df, df_ping = prefetched[(treatment_number, iteration)]
+            else:
+                conn = plan_db.connect(db_path, read_only=db_read_only)
+                try:
+                    df, df_ping = plan_db.query_window(conn, start_time, end_time)
+                finally:
+                    conn.close()
 
-        # Trim periods of inactivity longer than specified minutes
-        active_periods, iteration_stats = trim_inactive_periods(df, max_minutes_without_players)
+            df = prepare_iteration_data(df, df_ping, exclusions)
+            segments, iteration_stats = build_iteration_segments(df, iteration, treatment_number, max_minutes_without_players)
         
         # Update treatment statistics
         treatment_stats["total_minutes"] += iteration_stats["total_minutes"]
@@ -321,31 +342,11 @@ def  extract_response_variables(filename, iterations, treatment_number, max_minu
         treatment_stats["rejected_minutes"] += iteration_stats["rejected_minutes"]
         treatment_stats["total_discarded_segments"] += len(iteration_stats["discarded_segments"])
         
-        if not active_periods:
+        if not segments:
             print(f"WARNING: Iteration {iteration} (T{treatment_number}) has no active periods after trimming")
             continue  # Skip this iteration
         
-        # Process each active period as a separate segment
-        for segment_idx, active_df in enumerate(active_periods):
-            # Add treatment and iteration columns with consistent dtypes
-            active_df = active_df.copy()
-            active_df["treatment"] = f"T{treatment_number}"
-            active_df["iteration"] = str(f"{iteration}_{segment_idx + 1}" if len(active_periods) > 1 else iteration)
-            
-            # Ensure all DataFrames have the same column order and types
-            expected_columns = ['date', 'tps', 'cpu_usage', 'ram_usage', 'players_online', 'avg_ping', 'treatment', 'iteration']
-            for col in expected_columns:
-                if col not in active_df.columns:
-                    if col in numeric_columns:
-                        active_df[col] = pd.Series(dtype='float64')
-                    else:
-                        active_df[col] = pd.Series(dtype='object')
-            
-            # Reorder columns to ensure consistency
-            active_df = active_df[expected_columns]
-            
-            all_data.append(active_df)
-        conn.close()
+        all_data.extend(segments)
 
     # Check if we have valid data to export
     if not all_data:
@@ -368,9 +369,11 @@ def  extract_response_variables(filename, iterations, treatment_number, max_minu
     output_path = os.path.join(output_folder, f"T{treatment_number}_response_variables_"+ filename + ".csv")
     final_df.to_csv(output_path, index=False)
     print(f"\nFinal CSV exported: {output_path}")
+    if write_store:
+        response_store.write_treatment([final_df], f"T{treatment_number}")
 
     if verbose:
-        print(f"Total active segments processed: {len(all_data)}")
+        print(f"Total active segments processed: {final_df['iteration'].nunique()}")
         print(f"Total data points: {len(final_df)}")
         # Show treatment summary statistics
         print("\n--- TREATMENT SUMMARY ---")
@@ -381,6 +384,577 @@ def  extract_response_variables(filename, iterations, treatment_number, max_minu
         print("-" * 60)
     return treatment_stats
 
+def _extract_iteration_job(job):
+    """Process-pool worker: extracts one iteration over a read-only connection."""
+    treatment_number, iteration, start_ms, end_ms, max_minutes_without_players, exclusions, source_db = job
+    conn = plan_db.connect(source_db, read_only=True)
+    try:
+        df, df_ping = plan_db.query_window(conn, start_ms, end_ms)
+    finally:
+        conn.close()
+    df = prepare_iteration_data(df, df_ping, exclusions)
+    segments, iteration_stats = build_iteration_segments(df, iteration, treatment_number, max_minutes_without_players)
+    return (treatment_number, iteration), (segments, iteration_stats)
+
+def extract_iterations_parallel(treatments, exclusions, jobs, max_minutes_without_players=20):
+    """
+    Extracts every treatment/iteration window on a process pool.
+
+    Each worker opens its own read-only SQLite connection and returns the labelled
+    segments and statistics of one iteration; merging them in treatment/iteration
+    order (see extract_response_variables' processed argument) gives the same CSVs
+    and summary as the serial run.
+
+    Args:
+        treatments: List of (filename, iterations, treatment_number) tuples
+        exclusions: IntervalSet of windows to drop
+        jobs: Number of worker processes
+        max_minutes_without_players: Trim parameter, or a dict of it keyed by treatment number
+
+    Returns:
+        Dict of (segments, iteration_stats) keyed by (treatment_number, iteration)
+    """
+    work = []
+    for _, iterations, treatment_number in treatments:
+        max_minutes = max_minutes_without_players
+        if isinstance(max_minutes, dict):
+            max_minutes = max_minutes[treatment_number]
+        for iteration, *bounds in iterations:
+            start_ms, end_ms = window_to_epoch_ms(*bounds)
+            work.append((treatment_number, iteration, start_ms, end_ms, max_minutes, exclusions, db_path))
+
+    # Longest windows first so a 138 h iteration doesn't start last and dominate the wall time
+    work.sort(key=lambda job: job[3] - job[2], reverse=True)
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return dict(executor.map(_extract_iteration_job, work))
+
+def stream_chunk_rows(memory_budget_mb):
+    """plan_tps rows per chunk so the streaming buffers stay within memory_budget_mb."""
+    return max(1000, int(memory_budget_mb * 1024 * 1024 // STREAM_ROW_BYTES))
+
+def extract_response_variables_streaming(filename, iterations, treatment_number, max_minutes_without_players=20,
+                                         exclusions=None, chunk_rows=100_000):
+    """
+    Bounded-memory variant of extract_response_variables for multi-month windows.
+
+    plan_tps is read chunk_rows rows at a time (see plan_db.stream_window); exclusions,
+    the ping merge and inactivity trimming (StreamingInactivityTrimmer) carry their
+    state across chunk boundaries. Trimmed rows are spooled to a temporary file with
+    their segment number, because segment labels and the final column dtypes are only
+    known once an iteration (or the whole treatment) is done; a last pass then writes
+    them to the CSV. The output is identical to extract_response_variables.
+
+    Args:
+        filename, iterations, treatment_number, max_minutes_without_players, exclusions:
+            Same as extract_response_variables
+        chunk_rows: plan_tps rows held in memory at once
+
+    Returns:
+        Treatment statistics dict, or None when no data was exported
+    """
+    if exclusions is None:
+        exclusions = build_exclusion_set()
+
+    output_folder = "data/processed/response_variables"
+    os.makedirs(output_folder, exist_ok=True)
+    output_path = os.path.join(output_folder, f"T{treatment_number}_response_variables_" + filename + ".csv")
+
+    treatment_stats = {
+        "total_minutes": 0,
+        "accepted_minutes": 0,
+        "rejected_minutes": 0,
+        "total_discarded_segments": 0
+    }
+    segment_counts = {}
+    column_dtypes = {}
+
+    with tempfile.TemporaryFile() as spool:
+        conn = plan_db.connect(db_path, read_only=True)
+        try:
+            for iteration, *bounds in iterations:
+                start_ms, end_ms = window_to_epoch_ms(*bounds)
+                trimmer = StreamingInactivityTrimmer(max_minutes_without_players)
+
+                def spool_pieces(pieces):
+                    for piece, segment_number in pieces:
+                        for col in NUMERIC_COLUMNS:
+                            dtype = piece[col].dtype
+                            column_dtypes[col] = np.result_type(column_dtypes[col], dtype) if col in column_dtypes else dtype
+                        pickle.dump((iteration, segment_number, piece), spool, protocol=pickle.HIGHEST_PROTOCOL)
+
+                for df, df_ping in plan_db.stream_window(conn, start_ms, end_ms, chunk_rows):
+                    spool_pieces(trimmer.push(prepare_iteration_data(df, df_ping, exclusions)))
+
+                # Check for presence of players
+                if trimmer.players_total == 0:
+                    print(f"Warning: No players online during Iteration {iteration} (T{treatment_number})")
+                pieces, iteration_stats = trimmer.finish()
+                spool_pieces(pieces)
+                segment_counts[iteration] = trimmer.segment
+
+                treatment_stats["total_minutes"] += iteration_stats["total_minutes"]
+                treatment_stats["accepted_minutes"] += iteration_stats["accepted_minutes"]
+                treatment_stats["rejected_minutes"] += iteration_stats["rejected_minutes"]
+                treatment_stats["total_discarded_segments"] += len(iteration_stats["discarded_segments"])
+
+                if trimmer.segment == 0:
+                    print(f"WARNING: Iteration {iteration} (T{treatment_number}) has no active periods after trimming")
+        finally:
+            conn.close()
+
+        if not any(segment_counts.values()):
+            print(f"ERROR: No valid data found for Treatment T{treatment_number}. No CSV file will be created.")
+            print("-" * 60)
+            return
+
+        # Second pass: label segments and cast to the dtypes a single concat would produce
+        spool.seek(0)
+        with open(output_path, "w", newline="", encoding="utf-8") as f:
+            pd.DataFrame(columns=OUTPUT_COLUMNS).to_csv(f, index=False)
+            while True:
+                try:
+                    iteration, segment_number, piece = pickle.load(spool)
+                except EOFError:
+                    break
+                label = f"{iteration}_{segment_number}" if segment_counts[iteration] > 1 else iteration
+                segment = format_segment(piece, treatment_number, label).astype(column_dtypes)
+                segment.to_csv(f, index=False, header=False)
+
+    print(f"\nFinal CSV exported: {output_path}")
+    if write_store:
+        response_store.write_treatment_csv(output_path, f"T{treatment_number}")
+    return treatment_stats
+
+def extract_response_aggregates(filename, iterations, treatment_number, bucket_seconds=60,
+                                max_minutes_without_players=20, exclusions=None):
+    """
+    Aggregated variant of extract_response_variables: plan_tps is bucketed inside
+    SQLite (see plan_db.query_window_aggregates), so one row per bucket is
+    transferred instead of every sample.
+
+    Inactivity trimming runs on the buckets: a bucket counts as idle when no sample
+    in it had players online, and idle runs longer than max_minutes_without_players
+    are dropped with the same rules as label_active_segments. This is an
+    approximation of the row-level trimming at bucket resolution: runs are measured
+    between bucket starts and a bucket mixing idle and active samples is kept whole.
+    Ping is not aggregated.
+
+    Args:
+        filename, iterations, treatment_number, max_minutes_without_players, exclusions:
+            Same as extract_response_variables
+        bucket_seconds: Bucket width in seconds
+
+    Returns:
+        Treatment statistics dict (at bucket resolution), or None when no data was exported
+    """
+    if exclusions is None:
+        exclusions = build_exclusion_set()
+
+    output_folder = "data/processed/aggregates"
+    os.makedirs(output_folder, exist_ok=True)
+
+    treatment_stats = {
+        "total_minutes": 0,
+        "accepted_minutes": 0,
+        "rejected_minutes": 0,
+        "total_discarded_segments": 0
+    }
+    all_data = []
+
+    conn = plan_db.connect(db_path, read_only=db_read_only)
+    try:
+        for iteration, *bounds in iterations:
+            start_ms, end_ms = window_to_epoch_ms(*bounds)
+            buckets = plan_db.query_window_aggregates(conn, start_ms, end_ms, bucket_seconds * 1000, exclusions)
+            if buckets.empty:
+                print(f"WARNING: Iteration {iteration} (T{treatment_number}) has no active periods after trimming")
+                continue
+
+            buckets.insert(0, "date", pd.to_datetime(buckets["bucket_ms"], unit="ms").dt.tz_localize('UTC').dt.tz_convert(local_tz))
+            players = buckets["players_online_max"].fillna(0).to_numpy()
+            if players.sum() == 0:
+                print(f"Warning: No players online during Iteration {iteration} (T{treatment_number})")
+
+            segment, _, _, excess = inactivity_runs(buckets["date"], players, max_minutes_without_players)
+            total_minutes = (buckets["date"].iloc[-1] - buckets["date"].iloc[0]).total_seconds() / 60
+            rejected_minutes = sum(excess.tolist())
+            treatment_stats["total_minutes"] += round(total_minutes, 2)
+            treatment_stats["accepted_minutes"] += round(total_minutes - rejected_minutes, 2)
+            treatment_stats["rejected_minutes"] += round(rejected_minutes, 2)
+            treatment_stats["total_discarded_segments"] += len(excess)
+
+            kept = buckets[segment > 0].copy()
+            if kept.empty:
+                print(f"WARNING: Iteration {iteration} (T{treatment_number}) has no active periods after trimming")
+                continue
+            kept_segments = segment[segment > 0]
+            kept["treatment"] = f"T{treatment_number}"
+            if kept_segments[-1] > 1:
+                kept["iteration"] = [f"{iteration}_{number}" for number in kept_segments]
+            else:
+                kept["iteration"] = str(iteration)
+            all_data.append(kept)
+    finally:
+        conn.close()
+
+    if not all_data:
+        print(f"ERROR: No valid data found for Treatment T{treatment_number}. No CSV file will be created.")
+        print("-" * 60)
+        return
+
+    final_df = pd.concat(all_data, ignore_index=True)
+    output_path = os.path.join(output_folder, f"T{treatment_number}_aggregates_{bucket_seconds}s_" + filename + ".csv")
+    final_df.to_csv(output_path, index=False)
+    print(f"\nFinal CSV exported: {output_path}")
+    return treatment_stats
+
+def load_extraction_state(path=STATE_PATH):
+    """Load the per-treatment incremental extraction state (empty dict if missing)."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_extraction_state(state, path=STATE_PATH):
+    """Persist the incremental extraction state atomically."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+def extraction_fingerprint(iterations, max_minutes_without_players, exclusions, until_ms):
+    """
+    Hash of everything that determines the already-written output: iteration windows,
+    trim parameter, output columns and the exclusion windows before until_ms.
+    Exclusions after until_ms only affect the tail that is re-processed anyway.
+    """
+    settled = IntervalSet.from_pairs(window_to_epoch_ms(*it[1:]) for it in iterations[:-1])
+    last_start, _ = window_to_epoch_ms(*iterations[-1][1:])
+    if until_ms > last_start:
+        settled = settled.union(IntervalSet([last_start], [until_ms - 1]))
+    relevant = exclusions.intersection(settled)
+    payload = json.dumps({
+        "iterations": [list(it) for it in iterations],
+        "max_minutes_without_players": max_minutes_without_players,
+        "exclusions": list(relevant),
+        "columns": OUTPUT_COLUMNS,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def treatment_source_fingerprint(conn, iterations, exclusions):
+    """
+    Fingerprint of the data a treatment is extracted from: the plan_tps/plan_ping
+    contents of each iteration window (see plan_db.window_fingerprint), the excluded
+    intervals that fall inside them and the output columns.
+    """
+    windows = [window_to_epoch_ms(*it[1:]) for it in iterations]
+    return {
+        "windows": [plan_db.window_fingerprint(conn, start_ms, end_ms) for start_ms, end_ms in windows],
+        "exclusions": list(exclusions.intersection(IntervalSet.from_pairs(windows))),
+        "columns": OUTPUT_COLUMNS,
+    }
+
+def select_changed_treatments(experiment, exclusions, state, force=False):
+    """
+    Hash every treatment of the manifest (entry + source data) and compare the hash
+    with the one recorded by the last extraction.
+
+    A treatment is unchanged when its hash matches and its CSV (and, when the store
+    is written, its store partition) still exists.
+
+    Args:
+        experiment: Manifest as returned by manifest.load_manifest
+        exclusions: IntervalSet of windows to drop
+        state: Dict {treatment name: {"hash", "stats"}} from MANIFEST_STATE_PATH
+        force: Treat every treatment as changed
+
+    Returns:
+        (digests, unchanged): dict of hashes by treatment name and the set of unchanged names
+    """
+    digests = {}
+    unchanged = set()
+    conn = plan_db.connect(db_path, read_only=db_read_only)
+    try:
+        for treatment in experiment["treatments"]:
+            name = treatment["name"]
+            digests[name] = manifest.treatment_digest(
+                treatment, treatment_source_fingerprint(conn, treatment["iterations"], exclusions)
+            )
+            output_path = os.path.join("data/processed/response_variables",
+                                       f"{name}_response_variables_{treatment['filename']}.csv")
+            store_partition = os.path.join(response_store.STORE_PATH, f"treatment={name}")
+            if (not force and state.get(name, {}).get("hash") == digests[name] and os.path.exists(output_path)
+                    and (not write_store or os.path.isdir(store_partition) or not response_store.pyarrow_available())):
+                unchanged.add(name)
+    finally:
+        conn.close()
+    return digests, unchanged
+
+def _refresh_iteration_tail(conn, f, tail, window, treatment_number, max_minutes_without_players, exclusions):
+    """
+    Re-trims the open tail of an iteration together with every new plan_tps row and
+    rewrites the output from the tail byte offset.
+
+    The tail starts at the last run whose trimming decision can still change: the
+    trailing zero-player run, or the last row when players are online. Everything
+    before it is final, so its statistics are carried in the state instead of
+    being recomputed.
+
+    Returns:
+        Tuple: (new tail state, iteration statistics), or None when the rows already
+        written would need relabelling and a full extraction is required
+    """
+    iteration, start_ms, end_ms = window
+    raw_df, df_ping = plan_db.query_window(conn, start_ms, end_ms, since_ms=tail["tail_start_ms"])
+    df = prepare_iteration_data(raw_df, df_ping, exclusions)
+    watermark_ms = int(raw_df["date"].max()) if not raw_df.empty else tail["watermark_ms"]
+    prefix_segments = tail["segments"]
+
+    if df.empty:
+        if tail["first_ms"] is not None:
+            # Rows already written vanished (new exclusion inside the tail)
+            return None
+        f.seek(tail["csv_offset"])
+        f.truncate()
+        iteration_stats = {"total_minutes": 0, "accepted_minutes": 0, "rejected_minutes": 0, "discarded_segments": 0}
+        return dict(tail, watermark_ms=watermark_ms), iteration_stats
+
+    if tail["first_ms"] is None and df["players_online"].fillna(0).sum() == 0:
+        print(f"Warning: No players online during Iteration {iteration} (T{treatment_number})")
+
+    active_periods, tail_stats = trim_inactive_periods(df, max_minutes_without_players)
+    dates = df["date"]
+
+    # The first active period continues the last written segment unless a long
+    # inactivity run was dropped in between
+    continues = (prefix_segments > 0 and not tail["break_pending"] and bool(active_periods)
+                 and active_periods[0]["date"].iloc[0] == dates.iloc[0])
+    first_segment = prefix_segments if continues else prefix_segments + 1
+    total_segments = first_segment + len(active_periods) - 1 if active_periods else prefix_segments
+    if prefix_segments == 1 and total_segments > 1:
+        return None  # Earlier rows were written without a segment suffix
+
+    labelled = []
+    for segment_idx, active_df in enumerate(active_periods):
+        segment_number = first_segment + segment_idx
+        label = f"{iteration}_{segment_number}" if total_segments > 1 else iteration
+        segment = format_segment(active_df, treatment_number, label)
+        segment["_segment"] = segment_number
+        labelled.append(segment)
+    output = pd.concat(labelled, ignore_index=True) if labelled else None
+
+    # Locate the new tail: start of the trailing zero-player run, else the last row
+    players = df["players_online"].fillna(0).to_numpy()
+    active_idx = players.nonzero()[0]
+    if players[-1] == 0:
+        tail_idx = active_idx[-1] + 1 if len(active_idx) else 0
+    else:
+        tail_idx = len(players) - 1
+    new_tail_start = dates.iloc[tail_idx]
+
+    emitted = set(output["date"]) if output is not None else set()
+    last_run_dropped = players[-1] == 0 and dates.iloc[-1] not in emitted
+    settled_discards = tail_stats["discarded_segments"][:-1] if last_run_dropped else tail_stats["discarded_segments"]
+
+    rejected_minutes = tail["rejected_minutes"]
+    for segment in tail_stats["discarded_segments"]:
+        rejected_minutes += segment["duration"]
+    settled_rejected = tail["rejected_minutes"]
+    for segment in settled_discards:
+        settled_rejected += segment["duration"]
+
+    if tail_idx > 0:
+        break_pending = dates.iloc[tail_idx - 1] not in emitted
+    else:
+        break_pending = tail["break_pending"]
+
+    # Rewrite the output from the old tail offset, remembering where the new tail begins
+    f.seek(tail["csv_offset"])
+    f.truncate()
+    settled_segments = prefix_segments
+    if output is not None:
+        before = output[output["date"] < new_tail_start]
+        after = output[output["date"] >= new_tail_start]
+        if not before.empty:
+            settled_segments = int(before["_segment"].max())
+        before.drop(columns="_segment").to_csv(f, index=False, header=False)
+        csv_offset = f.tell()
+        after.drop(columns="_segment").to_csv(f, index=False, header=False)
+    else:
+        csv_offset = f.tell()
+
+    first_ms = tail["first_ms"] if tail["first_ms"] is not None else int(to_epoch_ms(dates.iloc[0]))
+    total_duration = (dates.iloc[-1] - pd.Timestamp(first_ms, unit="ms", tz="UTC")).total_seconds() / 60
+    iteration_stats = {
+        "total_minutes": round(total_duration, 2),
+        "accepted_minutes": round(total_duration - rejected_minutes, 2),
+        "rejected_minutes": round(rejected_minutes, 2),
+        "discarded_segments": tail["discarded_segments"] + len(tail_stats["discarded_segments"]),
+    }
+    new_tail = {
+        "iteration": iteration,
+        "first_ms": first_ms,
+        "tail_start_ms": int(to_epoch_ms(new_tail_start)),
+        "watermark_ms": watermark_ms,
+        "csv_offset": csv_offset,
+        "segments": settled_segments,
+        "break_pending": bool(break_pending),
+        "rejected_minutes": settled_rejected,
+        "discarded_segments": tail["discarded_segments"] + len(settled_discards),
+    }
+    return new_tail, iteration_stats
+
+def _full_incremental_extraction(output_path, iterations, treatment_number, max_minutes_without_players, exclusions):
+    """
+    Extracts a whole treatment like extract_response_variables while recording the
+    state the incremental refresh needs: settled iterations, then the last iteration
+    processed as a tail that starts at its window start.
+    """
+    iteration_stats = {}
+    conn = plan_db.connect(db_path, read_only=db_read_only)
+    try:
+        with open(output_path, "w", newline="", encoding="utf-8") as f:
+            pd.DataFrame(columns=OUTPUT_COLUMNS).to_csv(f, index=False)
+            header_offset = f.tell()
+            for iteration, *bounds in iterations[:-1]:
+                start_ms, end_ms = window_to_epoch_ms(*bounds)
+                df, df_ping = plan_db.query_window(conn, start_ms, end_ms)
+                df = prepare_iteration_data(df, df_ping, exclusions)
+                segments, stats = build_iteration_segments(df, iteration, treatment_number, max_minutes_without_players)
+                if not segments:
+                    print(f"WARNING: Iteration {iteration} (T{treatment_number}) has no active periods after trimming")
+                for segment in segments:
+                    segment.to_csv(f, index=False, header=False)
+                iteration_stats[iteration] = {
+                    "total_minutes": stats["total_minutes"],
+                    "accepted_minutes": stats["accepted_minutes"],
+                    "rejected_minutes": stats["rejected_minutes"],
+                    "discarded_segments": len(stats["discarded_segments"]),
+                }
+
+            iteration, *bounds = iterations[-1]
+            start_ms, end_ms = window_to_epoch_ms(*bounds)
+            empty_tail = {
+                "iteration": iteration, "first_ms": None, "tail_start_ms": start_ms,
+                "watermark_ms": start_ms - 1, "csv_offset": f.tell(), "segments": 0,
+                "break_pending": False, "rejected_minutes": 0, "discarded_segments": 0,
+            }
+            tail, tail_stats = _refresh_iteration_tail(conn, f, empty_tail, (iteration, start_ms, end_ms),
+                                                       treatment_number, max_minutes_without_players, exclusions)
+            rows_written = f.tell() > header_offset
+    finally:
+        conn.close()
+
+    if not rows_written:
+        os.remove(output_path)
+        return None
+    return iteration_stats, tail, tail_stats
+
+def extract_response_variables_incremental(filename, iterations, treatment_number, max_minutes_without_players=20,
+                                           exclusions=None, state=None):
+    """
+    Incremental variant of extract_response_variables.
+
+    A per-treatment watermark (last plan_tps date processed) and a fingerprint of the
+    extraction parameters are kept in the state. When the fingerprint still matches,
+    only rows newer than the watermark are pulled, inactivity trimming is re-run on the
+    open tail of the last iteration and the CSV is rewritten from the tail's byte offset.
+    Otherwise the treatment is extracted in full and the state rebuilt.
+
+    Args:
+        filename, iterations, treatment_number, max_minutes_without_players, exclusions:
+            Same as extract_response_variables
+        state: Dict loaded with load_extraction_state; updated in place
+
+    Returns:
+        Treatment statistics dict, or None when no data was exported
+    """
+    if exclusions is None:
+        exclusions = build_exclusion_set()
+    if state is None:
+        state = {}
+
+    output_folder = "data/processed/response_variables"
+    os.makedirs(output_folder, exist_ok=True)
+    output_path = os.path.join(output_folder, f"T{treatment_number}_response_variables_" + filename + ".csv")
+
+    key = f"T{treatment_number}"
+    entry = state.get(key)
+    last_iteration, *last_bounds = iterations[-1]
+    last_window = (last_iteration, *window_to_epoch_ms(*last_bounds))
+
+    tail = None
+    changed = True
+    if entry is not None and os.path.exists(output_path):
+        tail = entry["tail"]
+        settled_end = max((window_to_epoch_ms(*it[1:])[1] for it in iterations[:-1]), default=None)
+        reusable = (
+            entry["fingerprint"] == extraction_fingerprint(iterations, max_minutes_without_players, exclusions, tail["tail_start_ms"])
+            and tail["iteration"] == last_iteration
+            and (settled_end is None or settled_end <= tail["watermark_ms"])
+        )
+        if not reusable:
+            tail = None
+
+    if tail is not None:
+        conn = plan_db.connect(db_path, read_only=db_read_only)
+        try:
+            newest = plan_db.latest_date(conn, last_window[1], last_window[2])
+            if newest is None or newest <= tail["watermark_ms"]:
+                print(f"T{treatment_number}: up to date (watermark {tail['watermark_ms']})")
+                iteration_stats = entry["iteration_stats"]
+                tail_stats = entry["tail_stats"]
+                changed = False
+            else:
+                with open(output_path, "r+", newline="", encoding="utf-8") as f:
+                    refreshed = _refresh_iteration_tail(conn, f, tail, last_window, treatment_number,
+                                                        max_minutes_without_players, exclusions)
+                if refreshed is None:
+                    tail = None
+                else:
+                    tail, tail_stats = refreshed
+                    iteration_stats = entry["iteration_stats"]
+                    print(f"T{treatment_number}: appended rows up to {tail['watermark_ms']}")
+        finally:
+            conn.close()
+
+    if tail is None:
+        print(f"T{treatment_number}: full extraction (no reusable watermark)")
+        extracted = _full_incremental_extraction(output_path, iterations, treatment_number,
+                                                 max_minutes_without_players, exclusions)
+        if extracted is None:
+            state.pop(key, None)
+            print(f"ERROR: No valid data found for Treatment T{treatment_number}. No CSV file will be created.")
+            print("-" * 60)
+            return
+        iteration_stats, tail, tail_stats = extracted
+
+    state[key] = {
+        "fingerprint": extraction_fingerprint(iterations, max_minutes_without_players, exclusions, tail["tail_start_ms"]),
+        "iteration_stats": iteration_stats,
+        "tail": tail,
+        "tail_stats": tail_stats,
+    }
+
+    treatment_stats = {
+        "total_minutes": 0,
+        "accepted_minutes": 0,
+        "rejected_minutes": 0,
+        "total_discarded_segments": 0
+    }
+    for stats in list(iteration_stats.values()) + [tail_stats]:
+        treatment_stats["total_minutes"] += stats["total_minutes"]
+        treatment_stats["accepted_minutes"] += stats["accepted_minutes"]
+        treatment_stats["rejected_minutes"] += stats["rejected_minutes"]
+        treatment_stats["total_discarded_segments"] += stats["discarded_segments"]
+    print(f"\nFinal CSV exported: {output_path}")
+    store_partition = os.path.join(response_store.STORE_PATH, f"treatment=T{treatment_number}")
+    if write_store and (changed or not os.path.isdir(store_partition)):
+        response_store.write_treatment_csv(output_path, f"T{treatment_number}")
+    return treatment_stats
+
 def display_treatment_summary_table(all_treatment_stats):
     """Display treatment statistics in a clean table format"""
     import pandas as pd
@@ -477,30 +1051,156 @@ def display_rich_table(all_treatment_stats):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract response variables for every treatment.")
+    parser.add_argument("--batched", action="store_true",
+                        help="Query every iteration window in one pass over a single connection")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only pull plan_tps rows newer than each treatment's watermark")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Extract iteration windows on N worker processes (default: 1, serial)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Read plan_tps in chunks so memory stays bounded for multi-month windows")
+    parser.add_argument("--memory-budget", type=float, default=256,
+                        help="Approximate memory for --stream chunk buffers, in MB (default: 256)")
+    parser.add_argument("--snapshot", choices=["ro", "backup"],
+                        help="Live database access: 'ro' opens it read-only (non-blocking under WAL), "
+                             "'backup' first copies it in small online-backup steps and reads the copy")
+    parser.add_argument("--snapshot-pages", type=int, default=plan_db.SNAPSHOT_PAGES,
+                        help=f"Pages copied per --snapshot backup step (default: {plan_db.SNAPSHOT_PAGES})")
+    parser.add_argument("--snapshot-sleep", type=float, default=plan_db.SNAPSHOT_SLEEP,
+                        help=f"Seconds slept between --snapshot backup steps (default: {plan_db.SNAPSHOT_SLEEP})")
+    parser.add_argument("--aggregate", type=int, metavar="SECONDS",
+                        help="Aggregate plan_tps into buckets of SECONDS inside SQLite and write "
+                             "data/processed/aggregates instead of the raw response variables")
+    parser.add_argument("--no-store", action="store_true",
+                        help="Only write the CSV files, not the Parquet response store")
+    parser.add_argument("--manifest", default=manifest.MANIFEST_PATH,
+                        help=f"Experiment manifest with the treatments and windows (default: {manifest.MANIFEST_PATH})")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-extract every treatment, even those whose manifest entry and source data are unchanged")
+    args = parser.parse_args()
+    if args.batched and args.incremental:
+        parser.error("--incremental cannot be combined with --batched")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.jobs > 1 and (args.batched or args.incremental):
+        parser.error("--jobs cannot be combined with --batched or --incremental")
+    if args.stream and (args.batched or args.incremental or args.jobs > 1):
+        parser.error("--stream cannot be combined with --batched, --incremental or --jobs")
+    if args.aggregate is not None and (args.aggregate < 1 or args.batched or args.incremental or args.jobs > 1 or args.stream):
+        parser.error("--aggregate takes a positive bucket width and cannot be combined with "
+                     "--batched, --incremental, --jobs or --stream")
+
     print("=" * 60)
     print("STARTING RESPONSE VARIABLES EXTRACTION")
     print(f"Execution time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("=" * 60)
     
+    write_store = not args.no_store
+
+    if args.snapshot == "backup":
+        print(f"Copying {db_path} to {SNAPSHOT_DB_PATH} ({args.snapshot_pages} pages per step)...")
+        plan_db.snapshot(db_path, SNAPSHOT_DB_PATH, pages=args.snapshot_pages, sleep=args.snapshot_sleep)
+        db_path = SNAPSHOT_DB_PATH
+    elif args.snapshot == "ro":
+        db_read_only = True
+        conn = plan_db.connect(db_path, read_only=True)
+        try:
+            if plan_db.journal_mode(conn) != "wal":
+                print("Warning: database is not in WAL mode; read-only queries still block Plan's writes while they run. "
+                      "Consider --snapshot backup.")
+        finally:
+            conn.close()
+
+    if args.aggregate is not None:
+        conn = plan_db.connect(db_path, read_only=db_read_only)
+        try:
+            index_status, index_plan = plan_db.check_date_index(conn)
+        finally:
+            conn.close()
+        if index_status == "scan":
+            print(f"Warning: plan_tps(date) is not indexed ({index_plan}); every window scans the whole table. "
+                  "Create one with: CREATE INDEX plan_tps_date ON plan_tps(date)")
+        elif verbose:
+            print(f"plan_tps date lookups: {index_plan}")
+
     # Dictionary to store all treatment statistics
     all_treatment_stats = {}
     
-    # Process each treatment and collect stats
-    treatments = [
-        ("treatment1", iterations1, 1),
-        ("treatment2", iterations2, 2),
-        ("treatment3", iterations3, 3),
-        ("treatment4", iterations4, 4),
-        ("treatment5", iterations5, 5),
-        ("treatment6", iterations6, 6),
-        ("treatment7", iterations7, 7)
-    ]
+    # Treatments, windows and trim parameters come from the manifest
+    experiment = manifest.load_manifest(args.manifest)
+    treatments = [(t["filename"], t["iterations"], t["number"]) for t in experiment["treatments"]]
+    max_minutes = {t["number"]: t["max_minutes_without_players"] for t in experiment["treatments"]}
+
+    check_iteration_overlaps(treatments)
+
+    # Logs are parsed once and the exclusion windows shared by every treatment
+    manual_windows = [window for kind in manifest.EXCLUSION_KINDS for window in experiment["exclusions"][kind]]
+    exclusions = build_exclusion_set(manual_windows=manual_windows)
+
+    # Selective re-extraction: skip treatments whose manifest entry and source data did not change
+    # (--incremental keeps its own watermarks and --aggregate writes other files)
+    selective = not args.incremental and args.aggregate is None
+    manifest_state = load_extraction_state(MANIFEST_STATE_PATH) if selective else {}
+    if selective:
+        digests, unchanged = select_changed_treatments(experiment, exclusions, manifest_state, force=args.force)
+        for filename, iterations, treatment_num in treatments:
+            if f"T{treatment_num}" in unchanged:
+                print(f"T{treatment_num}: unchanged since the last extraction, skipped")
+                all_treatment_stats[treatment_num] = manifest_state[f"T{treatment_num}"]["stats"]
+        treatments = [t for t in treatments if f"T{t[2]}" not in unchanged]
+
+    # Batched mode: one connection and one join for all treatments and iterations
+    prefetched = None
+    if args.batched and treatments:
+        windows = [(treatment_num, iteration, *window_to_epoch_ms(*bounds))
+                   for _, iterations, treatment_num in treatments
+                   for iteration, *bounds in iterations]
+        conn = plan_db.connect(db_path, read_only=db_read_only)
+        try:
+            prefetched = plan_db.query_windows_batched(conn, windows)
+        finally:
+            conn.close()
+    
+    # Parallel mode: iteration windows fanned out to a process pool, merged below in order
+    processed = None
+    if args.jobs > 1 and treatments:
+        processed = extract_iterations_parallel(treatments, exclusions, args.jobs, max_minutes)
+
+    state = load_extraction_state() if args.incremental else None
     
     for filename, iterations, treatment_num in treatments:
-        # You'd need to modify extract_response_variables to return stats
-        stats = extract_response_variables(filename, iterations, treatment_num)
+        if args.incremental:
+            stats = extract_response_variables_incremental(filename, iterations, treatment_num,
+                                                           max_minutes[treatment_num],
+                                                           exclusions=exclusions, state=state)
+        elif args.aggregate is not None:
+            stats = extract_response_aggregates(filename, iterations, treatment_num, bucket_seconds=args.aggregate,
+                                                max_minutes_without_players=max_minutes[treatment_num],
+                                                exclusions=exclusions)
+        elif args.stream:
+            stats = extract_response_variables_streaming(filename, iterations, treatment_num, max_minutes[treatment_num],
+                                                         exclusions=exclusions,
+                                                         chunk_rows=stream_chunk_rows(args.memory_budget))
+        else:
+            stats = extract_response_variables(filename, iterations, treatment_num, max_minutes[treatment_num],
+                                               exclusions=exclusions, prefetched=prefetched, processed=processed)
         if stats:  # Only add if processing was successful
             all_treatment_stats[treatment_num] = stats
+        if selective:
+            if stats:
+                manifest_state[f"T{treatment_num}"] = {"hash": digests[f"T{treatment_num}"], "stats": stats}
+            else:
+                manifest_state.pop(f"T{treatment_num}", None)
+            save_extraction_state(manifest_state, MANIFEST_STATE_PATH)
+
+    if args.incremental:
+        save_extraction_state(state)
+    if args.aggregate is None:
+        # Moments and quantile sketches per treatment x iteration, refreshed for the rewritten files only
+        dataset.load_accumulators(SUMMARY_STATE_PATH, root=response_store.STORE_PATH,
+                                  csv_folder=response_store.CSV_FOLDER)
+    all_treatment_stats = dict(sorted(all_treatment_stats.items()))
     
     # Display results in a beautiful format
     print("\n" + "="*60)
@@ -0,0 +1,221 @@
+import numpy as np
+import pandas as pd
+
+
+def run_bounds(mask):
+    """
+    Run-length encode a boolean array.
+
+    Returns:
+        Tuple: (start indices, end indices) of the runs of equal values, ends exclusive
+    """
+    mask = np.asarray(mask, dtype=bool)
+    if len(mask) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    starts = np.flatnonzero(np.concatenate([[True], mask[1:] != mask[:-1]]))
+    ends = np.concatenate([starts[1:], [len(mask)]])
+    return starts, ends
+
+
+def inactivity_runs(dates, players, max_minutes_without_players):
+    """
+    Vectorized inactivity trimming over one sorted iteration.
+
+    A zero-player run lasts from its first to its last row, or until the next row when
+    it is a single row (0 at the end of the data). Runs longer than
+    max_minutes_without_players are dropped and split the remaining rows into
+    segments; every other run, active or idle, is kept.
+
+    Args:
+        dates: Sorted datetimes (Series or DatetimeIndex)
+        players: Players online per row, NaN already filled
+        max_minutes_without_players: Longest inactivity kept, in minutes
+
+    Returns:
+        Tuple: (segment number per row, 1-based and 0 for dropped rows,
+                first row index of each dropped run, last row index of each dropped run,
+                excess minutes removed per dropped run)
+    """
+    dates = pd.DatetimeIndex(dates)
+    zero = np.asarray(players) == 0
+    starts, ends = run_bounds(zero)
+    if len(starts) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, np.empty(0, dtype=np.float64)
+
+    is_zero = zero[starts]
+    zero_first = starts[is_zero]
+    zero_last = ends[is_zero] - 1
+
+    # A single-row run lasts until the next row (the row itself at the end: 0 minutes)
+    duration_end = np.where(zero_first == zero_last, np.minimum(zero_first + 1, len(zero) - 1), zero_last)
+    duration = (dates[duration_end] - dates[zero_first]).total_seconds().to_numpy() / 60
+    dropped = duration > max_minutes_without_players
+
+    run_dropped = np.zeros(len(starts), dtype=bool)
+    run_dropped[is_zero] = dropped
+
+    # Runs alternate idle/active and active runs are always kept, so kept runs are
+    # separated by exactly one dropped run: count dropped runs seen so far
+    dropped_before = np.cumsum(run_dropped) - run_dropped
+    kept = ~run_dropped
+    run_segment = np.zeros(len(starts), dtype=np.int64)
+    if kept.any():
+        run_segment[kept] = dropped_before[kept] - dropped_before[kept][0] + 1
+    segment = np.repeat(run_segment, ends - starts)
+
+    return (segment, zero_first[dropped], zero_last[dropped],
+            duration[dropped] - max_minutes_without_players)
+
+
+class StreamingInactivityTrimmer:
+    """
+    Chunk-at-a-time equivalent of trim_inactive_periods for one iteration.
+
+    Rows are pushed in date order. Active rows are emitted as soon as they arrive;
+    rows of a zero-player run are held back only until the run is known to be kept
+    (it ended within max_minutes_without_players) or dropped (it grew longer than
+    that, after which its rows are no longer buffered). Memory is therefore bounded
+    by the chunk size plus max_minutes_without_players worth of rows, regardless of
+    the window length.
+
+    push() and finish() return lists of (DataFrame, segment_number) pieces; a new
+    segment starts after every dropped inactivity run, like the list of DataFrames
+    returned by trim_inactive_periods. finish() also returns the same statistics dict.
+    """
+
+    def __init__(self, max_minutes_without_players=1, verbose=True):
+        self.max_minutes = max_minutes_without_players
+        self.verbose = verbose
+
+        self.first_date = None
+        self.last_date = None
+        self.saw_inactivity = False
+        self.players_total = 0
+
+        self.segment = 0
+        self.break_pending = False
+
+        # Open zero-player run carried across chunks
+        self.run_buffer = []
+        self.run_first = None
+        self.run_last = None
+        self.run_length = 0
+        self.run_dropped = False
+
+        self.rejected_minutes = 0
+        self.discarded_segments = []
+
+    def _emit(self, frame, pieces):
+        if self.segment == 0:
+            self.segment = 1
+        elif self.break_pending:
+            self.segment += 1
+            self.break_pending = False
+        pieces.append((frame, self.segment))
+
+    def _close_run(self, next_date, pieces):
+        """Decide the open zero-player run once the row after it (or the end) is known."""
+        if self.run_length == 1:
+            duration = (next_date - self.run_first).total_seconds() / 60 if next_date is not None else 0
+        else:
+            duration = (self.run_last - self.run_first).total_seconds() / 60
+
+        if duration > self.max_minutes:
+            if self.segment > 0:
+                self.break_pending = True
+
+            excess_time = duration - self.max_minutes
+            self.rejected_minutes += excess_time
+            self.discarded_segments.append({
+                "start": (self.run_first + pd.Timedelta(minutes=self.max_minutes)).strftime('%H:%M'),
+                "end": self.run_last.strftime('%H:%M'),
+                "duration": excess_time
+            })
+            if self.verbose:
+                print(f"Trimmed {excess_time:.2f} min inactivity: "
+                      f"{self.run_first.strftime('%H:%M')} - "
+                      f"{self.run_last.strftime('%H:%M')}")
+        else:
+            # Short inactivity remains in active data
+            for frame in self.run_buffer:
+                self._emit(frame, pieces)
+
+        self.run_buffer = []
+        self.run_first = None
+        self.run_last = None
+        self.run_length = 0
+        self.run_dropped = False
+
+    def push(self, chunk):
+        """
+        Feed the next rows (sorted by date, after every row already pushed).
+
+        Returns:
+            List of (DataFrame, segment_number) pieces that are final
+        """
+        pieces = []
+        if chunk.empty:
+            return pieces
+
+        chunk = chunk.copy()
+        chunk["players_online"] = chunk["players_online"].fillna(0)
+        dates = chunk["date"]
+        if self.first_date is None:
+            self.first_date = dates.iloc[0]
+        self.last_date = dates.iloc[-1]
+        self.players_total += chunk["players_online"].sum()
+
+        zero = (chunk["players_online"] == 0).to_numpy()
+        for start, end in zip(*run_bounds(zero)):
+            if zero[start]:
+                self.saw_inactivity = True
+                if self.run_first is None:
+                    self.run_first = dates.iloc[start]
+                self.run_last = dates.iloc[end - 1]
+                self.run_length += end - start
+                if not self.run_dropped:
+                    self.run_buffer.append(chunk.iloc[start:end])
+                    span = (self.run_last - self.run_first).total_seconds() / 60
+                    if self.run_length > 1 and span > self.max_minutes:
+                        # Already too long: it will be dropped whatever comes next
+                        self.run_dropped = True
+                        self.run_buffer = []
+            else:
+                if self.run_first is not None:
+                    self._close_run(dates.iloc[start], pieces)
+                self._emit(chunk.iloc[start:end], pieces)
+        return pieces
+
+    def finish(self):
+        """
+        Close the iteration.
+
+        Returns:
+            Tuple: (List of (DataFrame, segment_number) pieces, statistics dict)
+        """
+        pieces = []
+        if self.first_date is None:
+            return pieces, {"total_minutes": 0, "accepted_minutes": 0, "rejected_minutes": 0, "discarded_segments": []}
+
+        if self.run_first is not None:
+            self._close_run(None, pieces)
+
+        total_duration = (self.last_date - self.first_date).total_seconds() / 60
+        if not self.saw_inactivity:
+            stats = {
+                "total_minutes": total_duration,
+                "accepted_minutes": total_duration,
+                "rejected_minutes": 0,
+                "discarded_segments": []
+            }
+            return pieces, stats
+
+        accepted_minutes = total_duration - self.rejected_minutes
+        stats = {
+            "total_minutes": round(total_duration, 2),
+            "accepted_minutes": round(accepted_minutes, 2),
+            "rejected_minutes": round(self.rejected_minutes, 2),
+            "discarded_segments": self.discarded_segments
+        }
+        return pieces, stats
@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+
+
+def to_epoch_ms(values):
+    """
+    Convert datetimes (Series, DatetimeIndex or scalar) to int64 epoch milliseconds.
+    Timezone-aware values are converted to UTC first; naive values are taken as UTC.
+    """
+    if isinstance(values, pd.Series):
+        values = pd.DatetimeIndex(values)
+    if isinstance(values, pd.DatetimeIndex):
+        if values.tz is not None:
+            values = values.tz_convert("UTC").tz_localize(None)
+        return np.asarray((values - pd.Timestamp(0)) // pd.Timedelta(milliseconds=1), dtype=np.int64)
+
+    ts = pd.Timestamp(values)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return int((ts - pd.Timestamp(0)) // pd.Timedelta(milliseconds=1))
+
+
+class IntervalSet:
+    """
+    Set of closed intervals [start, end] over int64 epoch milliseconds.
+
+    Intervals are kept sorted and merged (overlapping or adjacent intervals are
+    collapsed), so membership of N timestamps is answered with a single
+    searchsorted call in O(N log M) instead of testing every interval per row.
+    """
+
+    def __init__(self, starts=(), ends=()):
+        starts = np.asarray(starts, dtype=np.int64).ravel()
+        ends = np.asarray(ends, dtype=np.int64).ravel()
+        if starts.shape != ends.shape:
+            raise ValueError("starts and ends must have the same length")
+        if np.any(ends < starts):
+            raise ValueError("Every interval must satisfy start <= end")
+        self.starts, self.ends = self._normalize(starts, ends)
+
+    @staticmethod
+    def _normalize(starts, ends):
+        """Sort intervals and merge the ones that overlap or touch."""
+        if len(starts) == 0:
+            return starts, ends
+
+        order = np.argsort(starts, kind="stable")
+        starts = starts[order]
+        ends = ends[order]
+
+        # A new run begins where the start lies past every previous end (+1 ms, closed ints)
+        running_end = np.maximum.accumulate(ends)
+        new_run = np.empty(len(starts), dtype=bool)
+        new_run[0] = True
+        new_run[1:] = starts[1:] > running_end[:-1] + 1
+
+        return starts[new_run], np.maximum.reduceat(ends, np.flatnonzero(new_run))
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """Build a set from (start, end) pairs of epoch-ms ints or datetimes."""
+        def as_ms(value):
+            return int(value) if isinstance(value, (int, np.integer)) else to_epoch_ms(value)
+
+        pairs = list(pairs)
+        return cls([as_ms(start) for start, _ in pairs], [as_ms(end) for _, end in pairs])
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return iter(zip(self.starts.tolist(), self.ends.tolist()))
+
+    def __eq__(self, other):
+        if not isinstance(other, IntervalSet):
+            return NotImplemented
+        return np.array_equal(self.starts, other.starts) and np.array_equal(self.ends, other.ends)
+
+    def __repr__(self):
+        return f"IntervalSet({list(self)})"
+
+    def is_empty(self):
+        return len(self.starts) == 0
+
+    def total_duration(self):
+        """Total covered time in milliseconds."""
+        return int(np.sum(self.ends - self.starts))
+
+    def contains(self, values):
+        """
+        Vectorized membership test.
+
+        Args:
+            values: Array-like of epoch-ms ints, or a datetime Series/DatetimeIndex
+
+        Returns:
+            Boolean NumPy array, True where the value falls inside any interval
+        """
+        if isinstance(values, (pd.Series, pd.DatetimeIndex)) and pd.api.types.is_datetime64_any_dtype(values):
+            values = to_epoch_ms(values)
+        values = np.asarray(values, dtype=np.int64)
+        if self.is_empty():
+            return np.zeros(values.shape, dtype=bool)
+
+        idx = np.searchsorted(self.starts, values, side="right") - 1
+        inside = idx >= 0
+        inside[inside] = values[inside] <= self.ends[idx[inside]]
+        return inside
+
+    def union(self, other):
+        return IntervalSet(np.concatenate([self.starts, other.starts]),
+                           np.concatenate([self.ends, other.ends]))
+
+    def intersection(self, other):
+        if self.is_empty() or other.is_empty():
+            return IntervalSet()
+
+        # For every interval in self, the intervals of other that can overlap it
+        # form a contiguous range [lo, hi) because other is sorted and disjoint.
+        lo = np.searchsorted(other.ends, self.starts, side="left")
+        hi = np.searchsorted(other.starts, self.ends, side="right")
+        counts = np.maximum(hi - lo, 0)
+        if counts.sum() == 0:
+            return IntervalSet()
+
+        self_idx = np.repeat(np.arange(len(self.starts)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        other_idx = np.repeat(lo, counts) + offsets
+
+        starts = np.maximum(self.starts[self_idx], other.starts[other_idx])
+        ends = np.minimum(self.ends[self_idx], other.ends[other_idx])
+        return IntervalSet(starts, ends)
+
+    def complement(self, lower, upper):
+        """Gaps of this set inside the closed range [lower, upper]."""
+        bounded = self.intersection(IntervalSet([lower], [upper]))
+        gap_starts = np.concatenate([[lower], bounded.ends + 1])
+        gap_ends = np.concatenate([bounded.starts - 1, [upper]])
+        keep = gap_starts <= gap_ends
+        return IntervalSet(gap_starts[keep], gap_ends[keep])
+
+    def difference(self, other):
+        if self.is_empty() or other.is_empty():
+            return IntervalSet(self.starts, self.ends)
+        return self.intersection(other.complement(self.starts[0], self.ends[-1]))
+
+
+def find_overlapping_windows(windows):
+    """
+    Detect overlaps between labelled closed windows.
+
+    Args:
+        windows: List of (label, start_ms, end_ms) tuples
+
+    Returns:
+        List of (label_a, label_b, overlap_start_ms, overlap_end_ms) tuples. Windows that
+        only share a boundary instant (one ends exactly when the next starts) are reported
+        too, since BETWEEN queries include both ends and the sample would be counted twice.
+    """
+    if len(windows) < 2:
+        return []
+
+    labels = [label for label, _, _ in windows]
+    starts = np.array([start for _, start, _ in windows], dtype=np.int64)
+    ends = np.array([end for _, _, end in windows], dtype=np.int64)
+
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+
+    # Window i can only overlap the windows that start before it ends
+    last_candidate = np.searchsorted(starts, ends, side="right")
+    overlaps = []
+    for i in np.flatnonzero(last_candidate - np.arange(len(starts)) > 1):
+        for j in range(i + 1, last_candidate[i]):
+            overlaps.append((labels[order[i]], labels[order[j]],
+                             int(starts[j]), int(min(ends[i], ends[j]))))
+    return overlaps
@@ -0,0 +1,379 @@
+import os
+import re
+import json
+import time
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+import plan_db
+import manifest
+import server_logs
+import response_store
+import extract_response_vars_iterations as extractor
+from inactivity import StreamingInactivityTrimmer
+from interval_set import IntervalSet
+from online_stats import RunningMoments
+
+# === CONFIGURATION ===
+LATEST_LOG = "data/raw/logs/latest.log"  # Log the running server is writing
+LIVE_STATE_PATH = "data/processed/live_tail_state.json"  # Resume point of every followed window
+POLL_SECONDS = 15  # Pause between polls of the database and the log
+REPORT_SECONDS = 60  # Rolling summaries are printed at least this often
+FLUSH_ROWS = 2000  # Accepted rows buffered before they are appended to the store...
+FLUSH_SECONDS = 300  # ...or after this many seconds, whichever comes first
+CATCHUP_MS = 6 * 3600 * 1000  # Largest slice of plan_tps read per query while catching up
+
+SUMMARY_METRICS = ["tps", "cpu_usage", "ram_usage", "players_online", "avg_ping"]
+LINE_STAMP = re.compile(rb"\[(\d{2}):(\d{2}):(\d{2})\]")
+
+
+class RunningSummary:
+    """Rolling per-metric moments (online_stats.RunningMoments) of the rows accepted for one treatment."""
+
+    def __init__(self, metrics=SUMMARY_METRICS):
+        self.moments = {metric: RunningMoments() for metric in metrics}
+        self.rows = 0
+
+    def update(self, frame):
+        self.rows += len(frame)
+        for metric, moments in self.moments.items():
+            moments.update(frame[metric])
+
+    def mean(self, metric):
+        moments = self.moments[metric]
+        return moments.mean if moments.count else np.nan
+
+    def std(self, metric):
+        return self.moments[metric].std()
+
+    def min(self, metric):
+        moments = self.moments[metric]
+        return moments.min if moments.count else np.nan
+
+
+class LogFollower:
+    """
+    Follows the server's latest.log like `tail -F`: every poll reads the complete
+    lines appended since the last one and returns its Chunky, startup and overload
+    events. A truncated or replaced file (rotation) is read again from the start.
+
+    latest.log lines only carry local [HH:MM:SS]; the first line is dated today, or
+    yesterday when its time is later than the current time, and every backwards
+    jump of the prefix advances the day, as in server_logs.parse_log_events.
+    """
+
+    def __init__(self, path=LATEST_LOG):
+        self.path = path
+        self.inode = None
+        self.offset = 0
+        self.day = None
+        self.previous_seconds = -1
+
+    def _event(self, line, now):
+        stamp = LINE_STAMP.match(line)
+        if not stamp:
+            return None
+        hour, minute, second = (int(part) for part in stamp.groups())
+        seconds = hour * 3600 + minute * 60 + second
+        if self.day is None:
+            now_seconds = now.hour * 3600 + now.minute * 60 + now.second
+            self.day = now.date() if seconds <= now_seconds else now.date() - timedelta(days=1)
+        elif seconds < self.previous_seconds:
+            self.day += timedelta(days=1)
+        self.previous_seconds = seconds
+        timestamp = datetime(self.day.year, self.day.month, self.day.day, hour, minute, second)
+
+        if server_logs.CHUNKY_MARKER in line or server_logs.STARTUP_MARKER in line:
+            match = server_logs.EVENT_PATTERN.search(line)
+            if match:
+                task_state, startup = match.groups()[3:]
+                return timestamp, "startup" if startup else task_state.decode(), None
+        if server_logs.OVERLOAD_MARKER in line:
+            match = server_logs.OVERLOAD_PATTERN.search(line)
+            if match:
+                return timestamp, "overload", int(match.group(4))
+        return None
+
+    def poll(self, now=None):
+        """
+        Returns:
+            List of (naive local datetime, kind, ms_behind) tuples; kind is "running",
+            "finished", "startup" or "overload" (ms_behind is None except for overloads)
+        """
+        now = now or datetime.now(extractor.local_tz).replace(tzinfo=None)
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            self.inode = stat.st_ino
+            self.offset = 0
+            self.day = None
+            self.previous_seconds = -1
+
+        events = []
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            while True:
+                data = f.read(server_logs.BLOCK_SIZE)
+                cut = data.rfind(b"\n") + 1
+                if not cut:
+                    break  # Only a partial line left: read it once it is complete
+                for line in data[:cut].splitlines():
+                    event = self._event(line, now)
+                    if event is not None:
+                        events.append(event)
+                self.offset += cut
+                f.seek(self.offset)
+        return events
+
+
+class LiveWindow:
+    """One followed iteration window: its trimmer, pending rows and rolling counters."""
+
+    def __init__(self, treatment, iteration, resume_ms, segment_offset=0):
+        self.treatment = treatment
+        self.iteration = iteration[0]
+        self.start_ms, self.end_ms = extractor.window_to_epoch_ms(*iteration[1:])
+        self.key = f"{treatment['name']}-{self.iteration}"
+        self.resume_ms = max(resume_ms, self.start_ms)
+        self.watermark_ms = self.resume_ms - 1
+        self.segment_offset = segment_offset
+        # Segments continue after the ones already stored, so a resumed window never reuses a label
+        self.trimmer = StreamingInactivityTrimmer(treatment["max_minutes_without_players"], verbose=True)
+        self.pending = []
+        self.pending_rows = 0
+        self.finished = False
+
+    def label(self, pieces):
+        frames = []
+        for frame, segment in pieces:
+            label = f"{self.iteration}_{self.segment_offset + segment}"
+            frames.append(extractor.format_segment(frame, self.treatment["number"], label))
+        return frames
+
+    def resume_point(self):
+        """First date that is not yet stored: the start of the open zero-player run, if any."""
+        if self.trimmer.run_first is not None:
+            return int(self.trimmer.run_first.timestamp() * 1000)
+        return self.watermark_ms + 1
+
+    def segments_used(self):
+        return self.segment_offset + self.trimmer.segment
+
+
+def load_live_state(path=LIVE_STATE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_live_state(windows, path=LIVE_STATE_PATH):
+    state = load_live_state(path)
+    for window in windows:
+        state[window.key] = {"resume_ms": window.resume_point(), "segments": window.segments_used(),
+                             "finished": window.finished}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def stored_resume_point(treatment, iteration_label, start_ms, end_ms):
+    """
+    Where a window without live state continues: after the last stored row of the
+    iteration (written by the extractor), with segment numbers after its last one.
+
+    Returns:
+        Tuple: (resume_ms, segments already used)
+    """
+    stored = response_store.load_response_variables(columns=["date"], treatments=[treatment["name"]], parse_dates=False)
+    if stored is None:
+        return start_ms, 0
+    labels = stored["iteration"].astype(str)
+    base = labels.str.split("_").str[0]
+    in_window = (base == iteration_label) & stored["date"].between(start_ms, end_ms)
+    if not in_window.any():
+        return start_ms, 0
+    suffixes = labels[in_window].str.split("_").str[1].fillna("1").astype(int)
+    return int(stored.loc[in_window, "date"].max()) + 1, int(suffixes.max())
+
+
+def followed_windows(experiment, now_ms, state):
+    """Iteration windows that are still open (end in the future) or were not finished by a previous tail."""
+    windows = []
+    for treatment in experiment["treatments"]:
+        for iteration in treatment["iterations"]:
+            start_ms, end_ms = extractor.window_to_epoch_ms(*iteration[1:])
+            key = f"{treatment['name']}-{iteration[0]}"
+            saved = state.get(key)
+            if saved is not None:
+                if saved["finished"]:
+                    continue
+                windows.append(LiveWindow(treatment, iteration, saved["resume_ms"], saved["segments"]))
+            elif end_ms >= now_ms:
+                resume_ms, segments = stored_resume_point(treatment, iteration[0], start_ms, end_ms)
+                windows.append(LiveWindow(treatment, iteration, resume_ms, segments))
+    return windows
+
+
+class LiveTail:
+    """Polls the Plan database and latest.log and feeds every followed window."""
+
+    def __init__(self, experiment, db_path, log_path=LATEST_LOG, write_store=True):
+        self.db_path = db_path
+        self.write_store = write_store and response_store.pyarrow_available()
+        if write_store and not self.write_store:
+            print("pyarrow is not installed: keeping the rolling summaries only. Install with: pip install pyarrow")
+        self.follower = LogFollower(log_path)
+
+        manual_windows = [window for kind in manifest.EXCLUSION_KINDS for window in experiment["exclusions"][kind]]
+        self.exclusions = extractor.build_exclusion_set(manual_windows=manual_windows)
+        self.open_task_ms = None
+
+        self.windows = followed_windows(experiment, int(time.time() * 1000), load_live_state())
+        self.summaries = {}
+        self.counters = {}
+        for window in self.windows:
+            name = window.treatment["name"]
+            self.summaries.setdefault(name, RunningSummary())
+            self.counters.setdefault(name, {"excluded_rows": 0, "overloads": 0, "ms_behind": 0})
+        self.last_flush = time.monotonic()
+
+    def _window_at(self, timestamp_ms):
+        for window in self.windows:
+            if window.start_ms <= timestamp_ms <= window.end_ms:
+                return window
+        return None
+
+    def apply_log_events(self):
+        """Chunky tasks become exclusions (an open task excludes everything after its start)."""
+        for timestamp, kind, ms_behind in self.follower.poll():
+            timestamp_ms = int(extractor.local_tz.localize(timestamp).timestamp() * 1000)
+            if kind == "running" and self.open_task_ms is None:
+                self.open_task_ms = timestamp_ms
+            elif kind == "finished" and self.open_task_ms is not None:
+                self.exclusions = self.exclusions.union(IntervalSet([self.open_task_ms], [timestamp_ms]))
+                self.open_task_ms = None
+            elif kind == "startup":
+                self.open_task_ms = None
+            elif kind == "overload":
+                window = self._window_at(timestamp_ms)
+                if window is not None:
+                    counters = self.counters[window.treatment["name"]]
+                    counters["overloads"] += 1
+                    counters["ms_behind"] += ms_behind
+
+    def current_exclusions(self, end_ms):
+        if self.open_task_ms is None:
+            return self.exclusions
+        return self.exclusions.union(IntervalSet([self.open_task_ms], [max(end_ms, self.open_task_ms)]))
+
+    def poll_window(self, conn, window, now_ms):
+        """Read the rows after the window's watermark, in slices of at most CATCHUP_MS."""
+        while True:
+            since_ms = window.watermark_ms + 1
+            until_ms = min(window.end_ms, since_ms + CATCHUP_MS)
+            raw_df, df_ping = plan_db.query_window(conn, window.start_ms, until_ms, since_ms=since_ms)
+            if not raw_df.empty:
+                df = extractor.prepare_iteration_data(raw_df, df_ping, self.current_exclusions(until_ms))
+                name = window.treatment["name"]
+                self.counters[name]["excluded_rows"] += len(raw_df) - len(df)
+                self.accept(window, window.trimmer.push(df))
+                window.watermark_ms = int(raw_df["date"].max())
+            if until_ms >= window.end_ms or raw_df.empty and until_ms >= now_ms:
+                break
+            if until_ms < now_ms:
+                # A finished catch-up slice: nothing newer than until_ms can still arrive in it.
+                # A slice reaching past now keeps the last returned date, so rows written later are read
+                window.watermark_ms = max(window.watermark_ms, until_ms)
+
+        if now_ms > window.end_ms and not window.finished:
+            pieces, _ = window.trimmer.finish()
+            self.accept(window, pieces)
+            window.finished = True
+            print(f"{window.key}: window closed")
+
+    def accept(self, window, pieces):
+        frames = window.label(pieces)
+        for frame in frames:
+            self.summaries[window.treatment["name"]].update(frame)
+        window.pending.extend(frames)
+        window.pending_rows += sum(len(frame) for frame in frames)
+
+    def flush(self, force=False):
+        pending = sum(window.pending_rows for window in self.windows)
+        if not force and pending < FLUSH_ROWS and time.monotonic() - self.last_flush < FLUSH_SECONDS:
+            return
+        for window in self.windows:
+            if window.pending and self.write_store:
+                response_store.append_treatment(window.pending, window.treatment["name"])
+            window.pending = []
+            window.pending_rows = 0
+        save_live_state(self.windows)
+        self.last_flush = time.monotonic()
+
+    def poll(self):
+        self.apply_log_events()
+        now_ms = int(time.time() * 1000)
+        conn = plan_db.connect(self.db_path, read_only=True)
+        try:
+            for window in self.windows:
+                if not window.finished and window.start_ms <= now_ms:
+                    self.poll_window(conn, window, now_ms)
+        finally:
+            conn.close()
+        self.flush()
+
+    def report(self):
+        print(f"\n=== LIVE SUMMARY {datetime.now(extractor.local_tz).strftime('%Y-%m-%d %H:%M:%S')} ===")
+        print(f"{'Treatment':<10}{'Rows':>8}{'TPS mean':>10}{'TPS sd':>8}{'TPS min':>9}{'CPU mean':>10}"
+              f"{'RAM mean':>10}{'Players':>9}{'Ping':>8}{'Excluded':>10}{'Overloads':>11}{'Trimmed min':>13}")
+        trimmed = {}
+        for window in self.windows:
+            name = window.treatment["name"]
+            trimmed[name] = trimmed.get(name, 0) + window.trimmer.rejected_minutes
+        for name, summary in sorted(self.summaries.items()):
+            counters = self.counters[name]
+            print(f"{name:<10}{summary.rows:>8}{summary.mean('tps'):>10.2f}{summary.std('tps'):>8.2f}"
+                  f"{summary.min('tps'):>9.2f}{summary.mean('cpu_usage'):>10.2f}{summary.mean('ram_usage'):>10.0f}"
+                  f"{summary.mean('players_online'):>9.2f}{summary.mean('avg_ping'):>8.1f}"
+                  f"{counters['excluded_rows']:>10}{counters['overloads']:>11}{trimmed.get(name, 0):>13.1f}")
+        if self.open_task_ms is not None:
+            print("Chunky task running: new samples are excluded until it finishes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Follow the running server and keep rolling treatment statistics.")
+    parser.add_argument("--manifest", default=manifest.MANIFEST_PATH,
+                        help=f"Experiment manifest (default: {manifest.MANIFEST_PATH})")
+    parser.add_argument("--db", default=extractor.db_path, help=f"Plan database (default: {extractor.db_path})")
+    parser.add_argument("--log", default=LATEST_LOG, help=f"Server log being written (default: {LATEST_LOG})")
+    parser.add_argument("--poll", type=float, default=POLL_SECONDS,
+                        help=f"Seconds between polls (default: {POLL_SECONDS})")
+    parser.add_argument("--report", type=float, default=REPORT_SECONDS,
+                        help=f"Seconds between summaries (default: {REPORT_SECONDS})")
+    parser.add_argument("--once", action="store_true", help="Poll once, store what is final and exit")
+    parser.add_argument("--no-store", action="store_true", help="Keep the summaries only, append nothing to the store")
+    args = parser.parse_args()
+
+    tail = LiveTail(manifest.load_manifest(args.manifest), args.db, args.log, write_store=not args.no_store)
+    if not tail.windows:
+        print("No open iteration windows in the manifest; nothing to follow.")
+    else:
+        print(f"Following {', '.join(window.key for window in tail.windows)} (Ctrl+C to stop)")
+        last_report = 0
+        try:
+            while True:
+                tail.poll()
+                if args.once or time.monotonic() - last_report >= args.report:
+                    tail.report()
+                    last_report = time.monotonic()
+                if args.once or all(window.finished for window in tail.windows):
+                    break
+                time.sleep(args.poll)
+        except KeyboardInterrupt:
+            print("\nStopping...")
+        tail.flush(force=True)
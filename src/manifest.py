@@ -0,0 +1,110 @@
+import re
+import json
+import hashlib
+from datetime import datetime
+
+try:
+    import tomllib  # Python 3.11+
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+MANIFEST_PATH = "experiment.toml"
+TIME_FORMAT = "%Y-%m-%d %H:%M"  # Local (America/Costa_Rica) window bounds
+
+# Factor levels described in the README ("Factores estudiados")
+FACTOR_LEVELS = {
+    "mods": ["M1", "M2", "M3"],
+    "jvm": ["P1", "P2", "P3"],
+    "config": ["C1", "C2", "C3"],
+}
+EXCLUSION_KINDS = ["backup", "restart", "excluded"]
+TREATMENT_NAME = re.compile(r"T(\d+)$")
+
+
+def parse_local_time(value, where):
+    """'2025-06-11 18:00' -> (2025, 6, 11, 18, 0)"""
+    try:
+        moment = datetime.strptime(value, TIME_FORMAT)
+    except (TypeError, ValueError):
+        raise ValueError(f"{where}: expected a local time like '2025-06-11 18:00', got {value!r}")
+    return moment.year, moment.month, moment.day, moment.hour, moment.minute
+
+
+def _window(entry, where):
+    """Manifest window table -> (label, start_year, ..., end_minute) tuple used by the extractor."""
+    if "label" not in entry or "start" not in entry or "end" not in entry:
+        raise ValueError(f"{where}: every window needs label, start and end")
+    start = parse_local_time(entry["start"], where)
+    end = parse_local_time(entry["end"], where)
+    if end < start:
+        raise ValueError(f"{where}: end {entry['end']} is before start {entry['start']}")
+    return (str(entry["label"]), *start, *end)
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """
+    Read and validate the experiment manifest.
+
+    Args:
+        path: TOML manifest (see experiment.toml)
+
+    Returns:
+        Dict with:
+            treatments: List of dicts (name, number, filename, factors, max_minutes_without_players,
+                        iterations as 11-field tuples) ordered by number
+            exclusions: Dict {backup|restart|excluded: list of 11-field window tuples}
+    """
+    if tomllib is None:
+        raise ImportError("Reading the manifest needs tomllib (Python 3.11+) or tomli. Install with: pip install tomli")
+    with open(path, "rb") as f:
+        raw = tomllib.load(f)
+
+    defaults = raw.get("defaults", {})
+    treatments = []
+    for name, entry in raw.get("treatments", {}).items():
+        match = TREATMENT_NAME.match(name)
+        if not match:
+            raise ValueError(f"{path}: treatment names look like T1, T2, ...; got {name!r}")
+        factors = {}
+        for factor, levels in FACTOR_LEVELS.items():
+            if entry.get(factor) not in levels:
+                raise ValueError(f"{path}: {name}.{factor} must be one of {levels}, got {entry.get(factor)!r}")
+            factors[factor] = entry[factor]
+
+        iterations = [_window(window, f"{path}: {name} iteration {i + 1}")
+                      for i, window in enumerate(entry.get("iterations", []))
+                      if window.get("enabled", True)]
+        number = int(match.group(1))
+        treatments.append({
+            "name": name,
+            "number": number,
+            "filename": f"treatment{number}",
+            "factors": factors,
+            "max_minutes_without_players": entry.get("max_minutes_without_players",
+                                                     defaults.get("max_minutes_without_players", 20)),
+            "iterations": iterations,
+        })
+    treatments.sort(key=lambda treatment: treatment["number"])
+
+    exclusions = {}
+    for kind in EXCLUSION_KINDS:
+        exclusions[kind] = [_window(window, f"{path}: exclusions.{kind} {i + 1}")
+                            for i, window in enumerate(raw.get("exclusions", {}).get(kind, []))]
+    return {"treatments": treatments, "exclusions": exclusions}
+
+
+def treatment_digest(treatment, source_fingerprint):
+    """
+    SHA-256 of a treatment's manifest entry (factors, enabled windows, trim parameter)
+    and a fingerprint of the source data it is extracted from.
+    """
+    payload = json.dumps({
+        "factors": treatment["factors"],
+        "iterations": [list(iteration) for iteration in treatment["iterations"]],
+        "max_minutes_without_players": treatment["max_minutes_without_players"],
+        "source": source_fingerprint,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
@@ -0,0 +1,150 @@
+import os
+import numpy as np
+import scipy.stats as stats
+from concurrent.futures import ProcessPoolExecutor
+from online_stats import RunningMoments
+from dataset import treatment_groups
+
+SHAPIRO_MAX_N = 5000  # Above this SciPy's Shapiro-Wilk p-values are not accurate
+SUBSAMPLE_REPEATS = 20  # Shapiro-Wilk subsamples of SHAPIRO_MAX_N values taken from larger series
+QQ_POINTS = 500  # Points drawn per Q-Q plot
+NORMALITY_SEED = 20250613
+ALPHA = 0.05
+
+
+def anderson_darling(sorted_values):
+    """
+    Anderson-Darling statistic against a normal with estimated mean and standard
+    deviation, with the p-value of Stephens' (1986) case 3 approximation.
+
+    Args:
+        sorted_values: Sorted 1-D array (at least 8 values)
+
+    Returns:
+        (A², p-value)
+    """
+    n = len(sorted_values)
+    z = (sorted_values - sorted_values.mean()) / sorted_values.std(ddof=1)
+    i = np.arange(1, n + 1)
+    a2 = -n - np.sum((2 * i - 1) * (stats.norm.logcdf(z) + stats.norm.logsf(z[::-1]))) / n
+    adjusted = a2 * (1 + 0.75 / n + 2.25 / n ** 2)
+    if adjusted >= 0.6:
+        p_value = np.exp(1.2937 - 5.709 * adjusted + 0.0186 * adjusted ** 2)
+    elif adjusted >= 0.34:
+        p_value = np.exp(0.9177 - 4.279 * adjusted - 1.38 * adjusted ** 2)
+    elif adjusted > 0.2:
+        p_value = 1 - np.exp(-8.318 + 42.796 * adjusted - 59.938 * adjusted ** 2)
+    else:
+        p_value = 1 - np.exp(-13.436 + 101.14 * adjusted - 223.73 * adjusted ** 2)
+    return a2, float(min(max(p_value, 0.0), 1.0))
+
+
+def qq_points(sorted_values, points=QQ_POINTS):
+    """
+    Q-Q plot coordinates from at most points of the sorted values.
+
+    The points are evenly spaced in rank (always including both extremes) and use
+    the same Filliben plotting positions as scipy.stats.probplot on the whole series,
+    so the drawn points are a subset of probplot's; the reference line is the least
+    squares fit through them.
+
+    Returns:
+        Dict with 'theoretical' and 'ordered' arrays, 'slope', 'intercept' and 'r'
+    """
+    n = len(sorted_values)
+    ranks = np.unique(np.round(np.linspace(0, n - 1, min(points, n))).astype("int64"))
+    positions = (ranks + 1 - 0.3175) / (n + 0.365)
+    positions[ranks == n - 1] = 0.5 ** (1 / n)
+    positions[ranks == 0] = 1 - 0.5 ** (1 / n)
+    theoretical = stats.norm.ppf(positions)
+    ordered = sorted_values[ranks]
+    slope, intercept, r, _, _ = stats.linregress(theoretical, ordered)
+    return {"theoretical": theoretical, "ordered": ordered, "slope": slope, "intercept": intercept, "r": r}
+
+
+def series_normality(values, seed=NORMALITY_SEED):
+    """
+    Descriptive statistics, normality tests and Q-Q points of one series, from one sort.
+
+    Up to SHAPIRO_MAX_N values the decision uses Shapiro-Wilk on the whole series.
+    Above it, the decision uses Anderson-Darling and D'Agostino's K² is reported
+    next to it; both are valid at any n. The reported Shapiro-Wilk statistic and
+    p-value are then the medians over SUBSAMPLE_REPEATS random subsamples of
+    SHAPIRO_MAX_N values.
+
+    Returns:
+        Dict of results; 'qq' holds qq_points output
+    """
+    values = np.asarray(values, dtype="float64")
+    n = len(values)
+    sorted_values = np.sort(values)
+    moments = RunningMoments().update(values)
+    result = {
+        "sample_size": n,
+        "mean": moments.mean,
+        "std": moments.std(),
+        "skewness": moments.skewness(),
+        "kurtosis": moments.kurtosis(),
+    }
+
+    if n <= SHAPIRO_MAX_N:
+        shapiro_stat, shapiro_p = stats.shapiro(values)
+        result.update(test="shapiro", shapiro_subsampled=False)
+    else:
+        rng = np.random.default_rng(seed)
+        subsamples = [stats.shapiro(rng.choice(values, SHAPIRO_MAX_N, replace=False))
+                      for _ in range(SUBSAMPLE_REPEATS)]
+        shapiro_stat = float(np.median([subsample[0] for subsample in subsamples]))
+        shapiro_p = float(np.median([subsample[1] for subsample in subsamples]))
+        result.update(test="anderson_darling", shapiro_subsampled=True)
+    result.update(shapiro_statistic=shapiro_stat, shapiro_p_value=shapiro_p)
+
+    if n >= 8:
+        result["anderson_statistic"], result["anderson_p_value"] = anderson_darling(sorted_values)
+        k2, k2_p = stats.normaltest(values)
+        result.update(dagostino_statistic=k2, dagostino_p_value=k2_p)
+    else:
+        result.update(anderson_statistic=np.nan, anderson_p_value=np.nan,
+                      dagostino_statistic=np.nan, dagostino_p_value=np.nan)
+
+    result["p_value"] = shapiro_p if result["test"] == "shapiro" else result["anderson_p_value"]
+    result["is_normal"] = result["p_value"] > ALPHA
+    result["qq"] = qq_points(sorted_values)
+    return result
+
+
+def normality_analysis(df, metrics, jobs=None, seed=NORMALITY_SEED):
+    """
+    series_normality of every treatment and metric, in parallel on a process pool.
+
+    Each series gets its own seed spawned from seed, so the results do not depend on jobs.
+
+    Args:
+        df: Combined data
+        metrics: Metrics to analyze
+        jobs: Worker processes (default: CPU count; 1 runs in this process)
+
+    Returns:
+        List of result dicts with 'metric' and 'treatment' added, in metric then
+        treatment order (series with fewer than 3 values are skipped)
+    """
+    tasks = []
+    for metric in metrics:
+        for treatment, values in treatment_groups(df, metric).items():
+            if len(values) >= 3:
+                tasks.append((metric, treatment, values.to_numpy()))
+            else:
+                print(f"Warning: Not enough data for {treatment} in {metric}")
+
+    seeds = np.random.SeedSequence(seed).spawn(len(tasks))
+    jobs = min(jobs or os.cpu_count() or 1, len(tasks)) if tasks else 1
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            outputs = list(pool.map(series_normality, [task[2] for task in tasks], seeds))
+    else:
+        outputs = [series_normality(task[2], task_seed) for task, task_seed in zip(tasks, seeds)]
+
+    results = []
+    for (metric, treatment, _), output in zip(tasks, outputs):
+        results.append({"metric": metric, "treatment": treatment, **output})
+    return results
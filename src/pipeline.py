@@ -0,0 +1,346 @@
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from server_logs import file_sha256
+
+# Every path below is relative to the repository root
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+PIPELINE_STATE_PATH = "data/processed/pipeline_state.json"  # Input hashes and stage fingerprints of the last run
+PIPELINE_LOG_FOLDER = "data/processed/pipeline_logs"  # Output of every stage run, one file per stage
+
+RESPONSE_DATA = [
+    "data/processed/response_variables/T*_response_variables_*.csv",
+    "data/processed/response_store/treatment=*/**/*.parquet",
+]
+DATASET_CODE = ["src/dataset.py", "src/response_store.py", "src/online_stats.py", "src/server_logs.py",
+                "src/interval_set.py"]
+# Helpers the analysis and plot scripts import
+SHARED_CODE = ["src/rendering.py", "src/downsampling.py", "src/analysis/rank_tests.py",
+               "src/analysis/permutation_tests.py", "src/analysis/autocorrelation.py", "src/normality.py"]
+
+# Stages in run order. A stage runs `python <script>` from <cwd>, so every script
+# writes its outputs where it does when run by hand; it is skipped while its
+# inputs (data and code) hash as in its last successful run and its outputs are
+# still on disk, or when a file it "requires" is missing (e.g. a checkout without
+# the raw Plan database keeps using the committed response variables). Stages
+# listed in "after" must finish first (their outputs are usually among the
+# inputs); everything else may run at the same time.
+STAGES = [
+    {
+        "name": "extract",
+        "script": "src/extract_response_vars_iterations.py",
+        "cwd": ".",
+        "inputs": ["data/raw/database.db", "data/raw/logs/*.log*", "experiment.toml",
+                   "src/extract_response_vars_iterations.py", "src/plan_db.py", "src/manifest.py",
+                   "src/inactivity.py"] + DATASET_CODE,
+        "outputs": RESPONSE_DATA,
+        "requires": ["data/raw/database.db"],
+        "after": [],
+    },
+    {
+        "name": "summary_table",
+        "script": "src/statistic_table.py",
+        "cwd": ".",
+        "inputs": RESPONSE_DATA + ["src/statistic_table.py"] + DATASET_CODE,
+        "outputs": ["treatment_summary_table.md"],
+        "after": ["extract"],
+    },
+    {
+        "name": "qq_plots",
+        "script": "src/visualizations/qq_plots.py",
+        "cwd": "src/analysis",
+        "inputs": RESPONSE_DATA + ["src/visualizations/qq_plots.py"] + DATASET_CODE + SHARED_CODE,
+        "outputs": ["src/analysis/qq_plots/*"],
+        "after": ["extract"],
+    },
+    {
+        "name": "kruskal_wallis",
+        "script": "src/analysis/kruskal_wallis.py",
+        "cwd": "src/analysis",
+        "inputs": RESPONSE_DATA + ["src/analysis/kruskal_wallis.py"] + DATASET_CODE + SHARED_CODE,
+        "outputs": ["src/analysis/kruskal_analysis/*"],
+        "after": ["extract"],
+    },
+    {
+        "name": "post_hoc",
+        "script": "src/analysis/post_hoc_analysis.py",
+        "cwd": "src/analysis",
+        "inputs": RESPONSE_DATA + ["src/analysis/kruskal_analysis/kruskal_wallis_results.csv",
+                                   "src/analysis/kruskal_analysis/permutation_pairwise.csv",
+                                   "src/analysis/post_hoc_analysis.py"] + DATASET_CODE + SHARED_CODE,
+        "outputs": ["src/analysis/post_hoc_analysis/*"],
+        "after": ["extract", "kruskal_wallis"],
+    },
+    {
+        "name": "autocorrelation",
+        "script": "src/analysis/autocorrelation.py",
+        "cwd": "src/analysis",
+        "inputs": RESPONSE_DATA + ["src/analysis/autocorrelation.py"] + DATASET_CODE,
+        "outputs": ["src/analysis/autocorrelation_analysis/*"],
+        "after": ["extract"],
+    },
+    {
+        "name": "bootstrap",
+        "script": "src/analysis/bootstrap.py",
+        "cwd": "src/analysis",
+        "inputs": RESPONSE_DATA + ["src/analysis/bootstrap.py"] + DATASET_CODE,
+        "outputs": ["src/analysis/bootstrap_analysis/*"],
+        "after": ["extract"],
+    },
+    {
+        "name": "box_plots",
+        "script": "src/visualizations/box_plots.py",
+        "cwd": "src/visualizations",
+        "inputs": RESPONSE_DATA + ["src/visualizations/box_plots.py"] + DATASET_CODE + SHARED_CODE,
+        "outputs": ["src/visualizations/box_plots/*"],
+        "after": ["extract"],
+    },
+    {
+        "name": "bar_charts",
+        "script": "src/visualizations/bar_charts.py",
+        "cwd": "src/visualizations",
+        "inputs": RESPONSE_DATA + ["src/visualizations/bar_charts.py"] + DATASET_CODE + SHARED_CODE,
+        "outputs": ["src/visualizations/bar_charts/*"],
+        "after": ["extract"],
+    },
+    {
+        "name": "heatmaps",
+        "script": "src/visualizations/heatmaps.py",
+        "cwd": "src/visualizations",
+        "inputs": RESPONSE_DATA + ["src/visualizations/heatmaps.py"] + DATASET_CODE + SHARED_CODE,
+        "outputs": ["src/visualizations/heatmaps/*"],
+        "after": ["extract"],
+    },
+    {
+        "name": "matplotlib_dashboard",
+        "script": "src/visualizations/matplotlib_dashboard.py",
+        "cwd": "src/visualizations",
+        "inputs": RESPONSE_DATA + ["src/visualizations/matplotlib_dashboard.py"] + DATASET_CODE + SHARED_CODE,
+        "outputs": ["src/visualizations/dashboard/*"],
+        "after": ["extract"],
+    },
+    {
+        "name": "interactive_dashboard",
+        "script": "src/visualizations/interactive_dashboard.py",
+        "cwd": "src/visualizations",
+        "inputs": RESPONSE_DATA + ["src/visualizations/interactive_dashboard.py"] + DATASET_CODE + SHARED_CODE,
+        "outputs": ["src/visualizations/interactive/*"],
+        "after": ["extract"],
+    },
+]
+
+
+def expand(patterns):
+    """Repository-relative files matching the glob patterns, sorted."""
+    files = set()
+    for pattern in patterns:
+        for path in glob.glob(os.path.join(ROOT, pattern), recursive=True):
+            if os.path.isfile(path):
+                files.add(os.path.relpath(path, ROOT).replace(os.sep, "/"))
+    return sorted(files)
+
+
+class FileHashes:
+    """
+    SHA-256 of repository files, reused while a file keeps its size and mtime,
+    so only new or modified files (e.g. a database that Plan wrote to) are read.
+    """
+
+    def __init__(self, cached=None):
+        self.entries = dict(cached or {})
+
+    def digest(self, path):
+        stat = os.stat(os.path.join(ROOT, path))
+        entry = self.entries.get(path)
+        if entry is None or entry[:2] != [stat.st_size, stat.st_mtime_ns]:
+            entry = [stat.st_size, stat.st_mtime_ns, file_sha256(os.path.join(ROOT, path))]
+            self.entries[path] = entry
+        return entry[2]
+
+
+def stage_fingerprint(stage, hashes):
+    """Hash of a stage's command and the content of every file matching its inputs."""
+    payload = {
+        "script": stage["script"],
+        "cwd": stage["cwd"],
+        "inputs": {path: hashes.digest(path) for path in expand(stage["inputs"])},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def outputs_current(stage, record, hashes):
+    """True when every output recorded after the stage's last run is still there, unchanged."""
+    outputs = record.get("outputs", {})
+    if not outputs:
+        return False
+    for path, digest in outputs.items():
+        if not os.path.exists(os.path.join(ROOT, path)) or hashes.digest(path) != digest:
+            return False
+    return True
+
+
+def load_pipeline_state(path=PIPELINE_STATE_PATH):
+    try:
+        with open(os.path.join(ROOT, path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"files": {}, "stages": {}}
+
+
+def save_pipeline_state(state, path=PIPELINE_STATE_PATH):
+    full_path = os.path.join(ROOT, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(full_path), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, full_path)
+
+
+def run_stage(stage):
+    """
+    Run one stage as a subprocess with a non-interactive matplotlib backend, so
+    plt.show() never blocks, and its output written to PIPELINE_LOG_FOLDER.
+
+    Returns:
+        Tuple: (return code, seconds)
+    """
+    log_folder = os.path.join(ROOT, PIPELINE_LOG_FOLDER)
+    os.makedirs(log_folder, exist_ok=True)
+    env = dict(os.environ, MPLBACKEND="Agg", PYTHONIOENCODING="utf-8")
+    start = time.perf_counter()
+    with open(os.path.join(log_folder, f"{stage['name']}.log"), "w", encoding="utf-8") as log:
+        result = subprocess.run([sys.executable, os.path.join(ROOT, stage["script"])],
+                                cwd=os.path.join(ROOT, stage["cwd"]), env=env,
+                                stdout=log, stderr=subprocess.STDOUT)
+    return result.returncode, time.perf_counter() - start
+
+
+def run_pipeline(stages=STAGES, jobs=None, force=False, only=None, dry_run=False, state_path=PIPELINE_STATE_PATH):
+    """
+    Run the stages whose inputs changed since their last successful run (or whose
+    outputs are missing), as many at a time as jobs allows.
+
+    A stage is fingerprinted when it is about to start, after the stages it runs
+    after have finished, so a re-run upstream stage that produced the same files
+    does not trigger the stages below it.
+
+    Args:
+        stages: Stage definitions (see STAGES)
+        jobs: Stages run at the same time (default: CPU count)
+        force: Run every selected stage
+        only: Stage names to consider; the others are neither run nor waited for
+        dry_run: Only report which stages are out of date (stages after one of them are reported as pending)
+
+    Returns:
+        Dict {stage name: "ran" | "skipped" | "failed" | "blocked" | "stale" | "pending"}
+    """
+    jobs = jobs or os.cpu_count() or 1
+    state = load_pipeline_state(state_path)
+    hashes = FileHashes(state.get("files"))
+    selected = [stage for stage in stages if only is None or stage["name"] in only]
+    names = {stage["name"] for stage in selected}
+    status = {}
+    fingerprints = {}
+
+    def ready(stage):
+        return all(status.get(name) in ("ran", "skipped") for name in stage["after"] if name in names)
+
+    def blocked(stage):
+        return any(status.get(name) in ("failed", "blocked") for name in stage["after"] if name in names)
+
+    def missing_requirement(stage):
+        for path in stage.get("requires", []):
+            if not os.path.exists(os.path.join(ROOT, path)):
+                return path
+        return None
+
+    def up_to_date(stage):
+        record = state["stages"].get(stage["name"], {})
+        fingerprints[stage["name"]] = stage_fingerprint(stage, hashes)
+        return (not force and record.get("fingerprint") == fingerprints[stage["name"]]
+                and outputs_current(stage, record, hashes))
+
+    if dry_run:
+        for stage in selected:
+            if any(status.get(name) in ("stale", "pending") for name in stage["after"] if name in names):
+                status[stage["name"]] = "pending"
+            else:
+                status[stage["name"]] = "skipped" if missing_requirement(stage) or up_to_date(stage) else "stale"
+            print(f"{stage['name']:<24}{status[stage['name']]}")
+        return status
+
+    pending = list(selected)
+    running = {}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            for stage in list(pending):
+                if blocked(stage):
+                    pending.remove(stage)
+                    status[stage["name"]] = "blocked"
+                    print(f"[{stage['name']}] not run: an earlier stage failed")
+                elif ready(stage) and len(running) < jobs:
+                    pending.remove(stage)
+                    if missing_requirement(stage):
+                        status[stage["name"]] = "skipped"
+                        print(f"[{stage['name']}] {missing_requirement(stage)} not found, using the existing outputs")
+                    elif up_to_date(stage):
+                        status[stage["name"]] = "skipped"
+                        print(f"[{stage['name']}] up to date, skipped")
+                    else:
+                        print(f"[{stage['name']}] running {stage['script']}")
+                        running[pool.submit(run_stage, stage)] = stage
+            if not running:
+                if pending and not any(ready(stage) or blocked(stage) for stage in pending):
+                    raise ValueError(f"Stages wait for each other: {[stage['name'] for stage in pending]}")
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                returncode, seconds = future.result()
+                log_path = f"{PIPELINE_LOG_FOLDER}/{stage['name']}.log"
+                if returncode != 0:
+                    status[stage["name"]] = "failed"
+                    state["stages"].pop(stage["name"], None)
+                    print(f"[{stage['name']}] FAILED after {seconds:.1f}s (exit {returncode}), see {log_path}")
+                    continue
+                status[stage["name"]] = "ran"
+                # Inputs are hashed again: the stage may have changed them (the extractor rewrites the data)
+                state["stages"][stage["name"]] = {
+                    "fingerprint": stage_fingerprint(stage, hashes),
+                    "outputs": {path: hashes.digest(path) for path in expand(stage["outputs"])},
+                    "seconds": round(seconds, 2),
+                }
+                print(f"[{stage['name']}] done in {seconds:.1f}s, log in {log_path}")
+            state["files"] = hashes.entries
+            save_pipeline_state(state, state_path)
+
+    state["files"] = hashes.entries
+    save_pipeline_state(state, state_path)
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the extraction, summary, test and plot scripts, "
+                                                 "skipping the ones whose inputs did not change.")
+    parser.add_argument("--jobs", type=int, default=None, help="Stages run at the same time (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Run every stage")
+    parser.add_argument("--only", nargs="+", choices=[stage["name"] for stage in STAGES],
+                        help="Only consider these stages")
+    parser.add_argument("--dry-run", action="store_true", help="Show which stages are out of date and exit")
+    args = parser.parse_args()
+
+    status = run_pipeline(jobs=args.jobs, force=args.force, only=args.only, dry_run=args.dry_run)
+    if not args.dry_run:
+        counts = {outcome: list(status.values()).count(outcome) for outcome in ["ran", "skipped", "failed", "blocked"]}
+        print(f"\nPipeline: {counts['ran']} ran, {counts['skipped']} skipped, "
+              f"{counts['failed']} failed, {counts['blocked']} not run")
+        if counts["failed"]:
+            sys.exit(1)
@@ -0,0 +1,352 @@
+import os
+import sqlite3
+from pathlib import Path
+import pandas as pd
+from interval_set import IntervalSet
+
+# Columns pulled from plan_tps for every window
+TPS_COLUMNS = ["date", "tps", "cpu_usage", "ram_usage", "players_online"]
+
+# Metrics aggregated per bucket by query_window_aggregates
+AGGREGATE_METRICS = ["tps", "cpu_usage", "ram_usage", "players_online"]
+
+# Online backup steps used by snapshot(): pages copied per step and pause between steps
+SNAPSHOT_PAGES = 256
+SNAPSHOT_SLEEP = 0.05
+
+
+def connect(db_path, read_only=False):
+    """
+    Open a connection to the Plan database.
+
+    Args:
+        db_path: Path to the SQLite file
+        read_only: Open through a mode=ro URI, so the connection can never take a write lock
+    """
+    if read_only:
+        return sqlite3.connect(Path(db_path).resolve().as_uri() + "?mode=ro", uri=True)
+    return sqlite3.connect(db_path)
+
+
+def journal_mode(conn):
+    """Journal mode of the main database ('wal', 'delete', ...)."""
+    return conn.execute("PRAGMA journal_mode").fetchone()[0].lower()
+
+
+def snapshot(db_path, snapshot_path, pages=SNAPSHOT_PAGES, sleep=SNAPSHOT_SLEEP, progress=None):
+    """
+    Copy a live Plan database with the SQLite online backup API, a few pages at a time.
+
+    The source is opened read-only. Under WAL a read transaction is held for the whole
+    copy, so the snapshot is consistent and Plan keeps committing to the WAL while it
+    runs. With a rollback journal no lock is held between steps, so Plan's writes only
+    wait for the step in progress; SQLite restarts the copy whenever the source
+    changes, so steps should be large enough to finish between Plan's writes.
+
+    Args:
+        db_path: Live database
+        snapshot_path: Destination, replaced atomically once the copy is complete
+        pages: Pages copied per step
+        sleep: Seconds slept between steps
+        progress: Optional callback(status, remaining, total) called after every step
+    """
+    tmp_path = snapshot_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    os.makedirs(os.path.dirname(snapshot_path) or ".", exist_ok=True)
+
+    source = connect(db_path, read_only=True)
+    target = sqlite3.connect(tmp_path)
+    try:
+        if journal_mode(source) == "wal":
+            # Pin one WAL snapshot: readers never block the writer in WAL mode
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        source.backup(target, pages=pages, sleep=sleep, progress=progress)
+    finally:
+        target.close()
+        source.close()
+    os.replace(tmp_path, snapshot_path)
+
+
+def query_window(conn, start_ms, end_ms, since_ms=None):
+    """
+    Query TPS/CPU/RAM/players and average ping for a single time window.
+
+    Args:
+        conn: Open sqlite3 connection
+        start_ms: Window start in UTC epoch milliseconds (inclusive)
+        end_ms: Window end in UTC epoch milliseconds (inclusive)
+        since_ms: Only return plan_tps rows from this date on. The ping rows start at the
+            last ping recorded at or before since_ms, so a backward as-of merge of the
+            returned rows matches the one done over the whole window.
+
+    Returns:
+        Tuple: (plan_tps DataFrame, plan_ping DataFrame), dates as raw epoch milliseconds
+    """
+    tps_start = start_ms
+    ping_start = start_ms
+    if since_ms is not None and since_ms > start_ms:
+        tps_start = since_ms
+        last_ping = conn.execute(
+            "SELECT MAX(date) FROM plan_ping WHERE date BETWEEN ? AND ?", (start_ms, since_ms)
+        ).fetchone()[0]
+        ping_start = last_ping if last_ping is not None else since_ms
+
+    query = """
+    SELECT
+        tps.date,
+        tps.tps,
+        tps.cpu_usage,
+        tps.ram_usage,
+        tps.players_online
+    FROM plan_tps tps
+    WHERE tps.date BETWEEN ? AND ?
+    ORDER BY tps.date ASC
+    """
+    df = pd.read_sql_query(query, conn, params=(tps_start, end_ms))
+
+    query_ping = """
+    SELECT date, avg(avg_ping) as avg_ping
+    FROM plan_ping
+    WHERE date BETWEEN ? AND ?
+    GROUP BY date
+    ORDER BY date ASC
+    """
+    df_ping = pd.read_sql_query(query_ping, conn, params=(ping_start, end_ms))
+    return df, df_ping
+
+
+def stream_window(conn, start_ms, end_ms, chunk_rows):
+    """
+    Query a window like query_window, chunk_rows plan_tps rows at a time.
+
+    Both statements are read lazily through fetchmany, so only one chunk of plan_tps
+    and the plan_ping rows up to that chunk's last date are in memory at once. Every
+    ping chunk starts with the last ping of the previous one, so a backward as-of
+    merge of each pair matches the merge done over the whole window.
+
+    Args:
+        conn: Open sqlite3 connection
+        start_ms: Window start in UTC epoch milliseconds (inclusive)
+        end_ms: Window end in UTC epoch milliseconds (inclusive)
+        chunk_rows: Maximum plan_tps rows per chunk
+
+    Yields:
+        Tuple: (plan_tps DataFrame, plan_ping DataFrame), dates as raw epoch milliseconds
+    """
+    query = """
+    SELECT
+        tps.date,
+        tps.tps,
+        tps.cpu_usage,
+        tps.ram_usage,
+        tps.players_online
+    FROM plan_tps tps
+    WHERE tps.date BETWEEN ? AND ?
+    ORDER BY tps.date ASC
+    """
+    query_ping = """
+    SELECT date, avg(avg_ping) as avg_ping
+    FROM plan_ping
+    WHERE date BETWEEN ? AND ?
+    GROUP BY date
+    ORDER BY date ASC
+    """
+    tps_chunks = pd.read_sql_query(query, conn, params=(start_ms, end_ms), chunksize=chunk_rows)
+    ping_chunks = pd.read_sql_query(query_ping, conn, params=(start_ms, end_ms), chunksize=chunk_rows)
+
+    ping = None
+    ping_exhausted = False
+    for df in tps_chunks:
+        if df.empty:
+            continue
+        chunk_end = df["date"].iloc[-1]
+
+        # Pull ping rows until one lies past this chunk (or there are none left)
+        while not ping_exhausted and (ping is None or ping.empty or ping["date"].iloc[-1] <= chunk_end):
+            fetched = next(ping_chunks, None)
+            if fetched is None:
+                ping_exhausted = True
+            else:
+                ping = fetched if ping is None else pd.concat([ping, fetched], ignore_index=True)
+
+        if ping is None:
+            yield df, pd.DataFrame(columns=["date", "avg_ping"])
+            continue
+
+        split = int(ping["date"].searchsorted(chunk_end, side="right"))
+        yield df, ping.iloc[:split].reset_index(drop=True)
+
+        # Keep the last ping at or before chunk_end for the next chunk's merge
+        ping = ping.iloc[max(split - 1, 0):].reset_index(drop=True)
+
+
+def check_date_index(conn):
+    """
+    Ask EXPLAIN QUERY PLAN how a date-range query on plan_tps is executed.
+
+    Returns:
+        Tuple: (status, plan detail). status is "covering" when an index answers the
+        extraction columns without touching the table, "index" when plan_tps(date) is
+        indexed and "scan" when every query reads the whole table.
+    """
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT date, tps, cpu_usage, ram_usage, players_online "
+        "FROM plan_tps WHERE date BETWEEN ? AND ?", (0, 0)
+    ).fetchall()
+    detail = "; ".join(row[-1] for row in plan)
+    if "COVERING INDEX" in detail:
+        return "covering", detail
+    if "USING INDEX" in detail:
+        return "index", detail
+    return "scan", detail
+
+
+def query_window_aggregates(conn, start_ms, end_ms, bucket_ms, exclusions=()):
+    """
+    Aggregate plan_tps into fixed time buckets inside SQLite.
+
+    Only one row per bucket leaves the database: for every metric its sample count,
+    mean, minimum, maximum and sum of squares (so variance and standard deviation can
+    be derived and buckets merged), plus the number of plan_tps rows. Samples inside
+    the exclusion windows are dropped in the same statement: the windows that overlap
+    the range are merged into disjoint intervals keyed by their start, so each row
+    only checks the one interval starting at or before it (an index lookup, as in
+    IntervalSet.contains) instead of every exclusion.
+
+    Args:
+        conn: Open sqlite3 connection
+        start_ms: Window start in UTC epoch milliseconds (inclusive)
+        end_ms: Window end in UTC epoch milliseconds (inclusive)
+        bucket_ms: Bucket width in milliseconds; buckets are aligned to the epoch
+        exclusions: Iterable of (start_ms, end_ms) closed windows to drop
+
+    Returns:
+        DataFrame with bucket_ms (bucket start, raw epoch milliseconds), samples and
+        <metric>_count/_mean/_min/_max/_sumsq columns, ordered by bucket
+    """
+    conn.execute("DROP TABLE IF EXISTS temp.extraction_exclusions")
+    conn.execute("CREATE TEMP TABLE extraction_exclusions (start_ms INTEGER PRIMARY KEY, end_ms INTEGER NOT NULL)")
+    overlapping = [(int(start), int(end)) for start, end in exclusions if end >= start_ms and start <= end_ms]
+    merged = IntervalSet([start for start, _ in overlapping], [end for _, end in overlapping])
+    conn.executemany("INSERT INTO temp.extraction_exclusions (start_ms, end_ms) VALUES (?, ?)", list(merged))
+
+    metric_columns = ",\n".join(
+        f"        COUNT({m}) AS {m}_count, AVG({m}) AS {m}_mean, MIN({m}) AS {m}_min, "
+        f"MAX({m}) AS {m}_max, SUM({m} * {m}) AS {m}_sumsq"
+        for m in AGGREGATE_METRICS
+    )
+    query = f"""
+    SELECT
+        (tps.date / :bucket_ms) * :bucket_ms AS bucket_ms,
+        COUNT(*) AS samples,
+{metric_columns}
+    FROM plan_tps tps
+    WHERE tps.date BETWEEN :start_ms AND :end_ms
+      AND COALESCE((
+        SELECT e.end_ms FROM temp.extraction_exclusions e
+        WHERE e.start_ms <= tps.date
+        ORDER BY e.start_ms DESC LIMIT 1
+      ), tps.date - 1) < tps.date
+    GROUP BY bucket_ms
+    ORDER BY bucket_ms ASC
+    """
+    df = pd.read_sql_query(query, conn, params={"bucket_ms": int(bucket_ms), "start_ms": start_ms, "end_ms": end_ms})
+    conn.execute("DROP TABLE temp.extraction_exclusions")
+    return df
+
+
+def latest_date(conn, start_ms, end_ms):
+    """Latest plan_tps date inside the window, or None when the window is empty."""
+    return conn.execute(
+        "SELECT MAX(date) FROM plan_tps WHERE date BETWEEN ? AND ?", (start_ms, end_ms)
+    ).fetchone()[0]
+
+
+def window_fingerprint(conn, start_ms, end_ms):
+    """
+    Content summary of the plan_tps and plan_ping rows a window is extracted from:
+    row counts, date range and column totals, computed inside SQLite over the date
+    index. It changes when rows are added, removed or edited (short of edits that
+    cancel out in every total) without reading the rows into Python.
+
+    Returns:
+        List of numbers
+    """
+    tps = conn.execute(
+        "SELECT COUNT(*), MIN(date), MAX(date), TOTAL(tps), TOTAL(cpu_usage), TOTAL(ram_usage), "
+        "TOTAL(players_online) FROM plan_tps WHERE date BETWEEN ? AND ?", (start_ms, end_ms)
+    ).fetchone()
+    ping = conn.execute(
+        "SELECT COUNT(*), MIN(date), MAX(date), TOTAL(avg_ping) FROM plan_ping WHERE date BETWEEN ? AND ?",
+        (start_ms, end_ms)
+    ).fetchone()
+    return list(tps) + list(ping)
+
+
+def query_windows_batched(conn, windows):
+    """
+    Query every window at once over a single connection.
+
+    The windows are loaded into a temporary table and joined against plan_tps and
+    plan_ping, so the whole extraction costs two statements instead of two per
+    iteration, each with its own connection setup.
+
+    Args:
+        conn: Open sqlite3 connection
+        windows: List of (treatment, iteration, start_ms, end_ms) tuples
+
+    Returns:
+        Dict mapping (treatment, iteration) to (plan_tps DataFrame, plan_ping DataFrame),
+        with the same columns and ordering query_window returns
+    """
+    conn.execute("DROP TABLE IF EXISTS temp.extraction_windows")
+    conn.execute("""
+    CREATE TEMP TABLE extraction_windows (
+        window_id INTEGER PRIMARY KEY,
+        start_ms INTEGER NOT NULL,
+        end_ms INTEGER NOT NULL
+    )
+    """)
+    conn.executemany(
+        "INSERT INTO temp.extraction_windows (window_id, start_ms, end_ms) VALUES (?, ?, ?)",
+        [(window_id, start_ms, end_ms) for window_id, (_, _, start_ms, end_ms) in enumerate(windows)]
+    )
+
+    query = """
+    SELECT
+        w.window_id,
+        tps.date,
+        tps.tps,
+        tps.cpu_usage,
+        tps.ram_usage,
+        tps.players_online
+    FROM temp.extraction_windows w
+    JOIN plan_tps tps ON tps.date BETWEEN w.start_ms AND w.end_ms
+    ORDER BY w.window_id, tps.date ASC
+    """
+    df_all = pd.read_sql_query(query, conn)
+
+    query_ping = """
+    SELECT w.window_id, ping.date, avg(ping.avg_ping) as avg_ping
+    FROM temp.extraction_windows w
+    JOIN plan_ping ping ON ping.date BETWEEN w.start_ms AND w.end_ms
+    GROUP BY w.window_id, ping.date
+    ORDER BY w.window_id, ping.date ASC
+    """
+    df_ping_all = pd.read_sql_query(query_ping, conn)
+    conn.execute("DROP TABLE temp.extraction_windows")
+
+    tps_groups = {window_id: group for window_id, group in df_all.groupby("window_id", sort=False)}
+    ping_groups = {window_id: group for window_id, group in df_ping_all.groupby("window_id", sort=False)}
+
+    results = {}
+    for window_id, (treatment, iteration, _, _) in enumerate(windows):
+        df = tps_groups.get(window_id, df_all.iloc[0:0])
+        df_ping = ping_groups.get(window_id, df_ping_all.iloc[0:0])
+        results[(treatment, iteration)] = (
+            df.drop(columns="window_id").reset_index(drop=True),
+            df_ping.drop(columns="window_id").reset_index(drop=True),
+        )
+    return results
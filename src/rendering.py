@@ -0,0 +1,204 @@
+import io
+import os
+import sys
+import time
+import argparse
+import importlib
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import matplotlib
+
+try:
+    import resource  # Unix
+except ImportError:
+    resource = None
+
+SRC_PATH = os.path.dirname(os.path.abspath(__file__))
+IMAGES_PATH = os.path.normpath(os.path.join(SRC_PATH, "..", "images"))
+FIGURE_DPI = 300
+NON_INTERACTIVE_BACKENDS = {"agg", "cairo", "pdf", "pgf", "ps", "svg", "template"}
+
+# Independent figure families rendered by render_figures: name -> (module, function, data it takes)
+# Data: "raw" = load_all_treatment_data(), "summary" = load_summary_data(), "both" = (summary, raw), "none"
+FIGURE_TASKS = {
+    "box_plots": ("box_plots", "create_box_plots", "raw"),
+    "box_comparison": ("box_plots", "create_comparative_box_plot", "raw"),
+    "mean_bars": ("bar_charts", "create_mean_comparison_bars", "summary"),
+    "range_bars": ("bar_charts", "create_range_comparison_bars", "summary"),
+    "grouped_bars": ("bar_charts", "create_grouped_bar_chart", "summary"),
+    "performance_scores": ("bar_charts", "create_performance_score_bars", "summary"),
+    "performance_heatmaps": ("heatmaps", "create_performance_heatmap", "summary"),
+    "range_heatmap": ("heatmaps", "create_range_heatmap", "summary"),
+    "correlation_heatmap": ("heatmaps", "create_correlation_heatmap", "none"),
+    "dashboard": ("matplotlib_dashboard", "create_comprehensive_dashboard", "both"),
+    "time_series": ("matplotlib_dashboard", "create_time_series_plot", "raw"),
+    "qq_plots": ("rendering", "render_qq_plots", "raw"),
+    "kruskal_summary": ("rendering", "render_kruskal_summary", "raw"),
+    "post_hoc_matrices": ("rendering", "render_post_hoc", "raw"),
+}
+ANALYSIS_METRICS = ["tps", "cpu_usage", "ram_usage"]
+
+
+def interactive_backend():
+    """True when matplotlib can open windows (plt.show() would block until they are closed)."""
+    return matplotlib.get_backend().lower() not in NON_INTERACTIVE_BACKENDS
+
+
+def finish_figure(fig=None):
+    """
+    Show a saved figure when an interactive backend is in use, then close it.
+
+    Under Agg (MPLBACKEND=Agg, the pipeline, render_figures) nothing is shown, so
+    batch runs never wait on a GUI event loop, and every figure is closed, so
+    memory does not grow with the number of figures drawn.
+
+    Args:
+        fig: Figure to finish; the current figure when None
+    """
+    import matplotlib.pyplot as plt
+    fig = fig if fig is not None else plt.gcf()
+    if interactive_backend():
+        plt.show()
+    plt.close(fig)
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None when it cannot be measured."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024  # Bytes on macOS, KB on Linux
+    try:
+        import psutil
+    except ImportError:
+        return None
+    memory = psutil.Process().memory_info()
+    return getattr(memory, "peak_wset", memory.rss) / 1024 ** 2
+
+
+def render_kruskal_summary(df, save_path):
+    """Kruskal-Wallis summary figure, without rewriting the results CSV."""
+    from kruskal_wallis import perform_kruskal_wallis_test, create_kruskal_wallis_summary_plot
+    results = [perform_kruskal_wallis_test(df, metric) for metric in ANALYSIS_METRICS]
+    create_kruskal_wallis_summary_plot(results, save_path)
+
+
+def render_post_hoc(df, save_path):
+    """Post-hoc p-value/effect size matrices and effect size summary of every metric, without the CSV."""
+    from post_hoc_analysis import perform_dunn_post_hoc, create_post_hoc_visualization, create_effect_size_summary
+    all_comparisons = []
+    for metric in ANALYSIS_METRICS:
+        for comparison in perform_dunn_post_hoc(df, metric):
+            comparison["metric"] = metric
+            all_comparisons.append(comparison)
+    create_post_hoc_visualization(all_comparisons, save_path)
+    create_effect_size_summary(all_comparisons, save_path)
+
+
+def render_qq_plots(df, save_path):
+    """Q-Q plot figures; the normality test CSVs stay in the analysis folder's qq_plots."""
+    from qq_plots import create_qq_plots_by_treatment
+    create_qq_plots_by_treatment(df, save_path, results_path=os.path.join(SRC_PATH, "analysis", "qq_plots"))
+
+
+def _task_data(kind):
+    from dataset import load_all_treatment_data, load_summary_data
+    if kind == "raw":
+        return (load_all_treatment_data(),)
+    if kind == "summary":
+        return (load_summary_data(),)
+    if kind == "both":
+        return load_summary_data(), load_all_treatment_data()
+    return ()
+
+
+def render_task(name, save_path):
+    """
+    Render one figure family with the Agg backend (runs in a worker process).
+
+    Returns:
+        Dict with name, load and render seconds, peak RSS in MB, error (None when it
+        worked) and the task's captured output
+    """
+    matplotlib.use("Agg", force=True)
+    for folder in [SRC_PATH, os.path.join(SRC_PATH, "visualizations"), os.path.join(SRC_PATH, "analysis")]:
+        if folder not in sys.path:
+            sys.path.insert(0, folder)
+
+    module_name, function_name, data = FIGURE_TASKS[name]
+    output = io.StringIO()
+    result = {"name": name, "load_seconds": 0.0, "render_seconds": 0.0, "error": None}
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(output):
+            function = getattr(importlib.import_module(module_name), function_name)
+            args = _task_data(data)
+            result["load_seconds"] = time.perf_counter() - start
+            os.makedirs(save_path, exist_ok=True)
+            render_start = time.perf_counter()
+            function(*args, save_path=save_path)
+            result["render_seconds"] = time.perf_counter() - render_start
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["peak_rss_mb"] = peak_rss_mb()
+    result["output"] = output.getvalue()
+    return result
+
+
+def render_figures(names=None, save_path=IMAGES_PATH, jobs=None):
+    """
+    Render figure families concurrently on a process pool, headless, at FIGURE_DPI.
+
+    Every task runs in a fresh worker process (max_tasks_per_child=1, Python 3.11+),
+    so its peak RSS is its own and nothing it leaves behind reaches the next task.
+    The shared dataset cache is built once before the workers start.
+
+    Args:
+        names: FIGURE_TASKS keys to render; None for all
+        save_path: Output folder
+        jobs: Worker processes (default: CPU count)
+
+    Returns:
+        List of render_task results in completion order
+    """
+    from dataset import load_dataset, load_accumulators
+    names = list(FIGURE_TASKS) if names is None else list(names)
+    jobs = jobs or os.cpu_count() or 1
+    load_dataset()
+    load_accumulators()
+
+    try:
+        pool = ProcessPoolExecutor(max_workers=jobs, max_tasks_per_child=1)
+    except TypeError:  # Python < 3.11: workers are reused, RSS is the worker's peak so far
+        pool = ProcessPoolExecutor(max_workers=jobs)
+
+    results = []
+    start = time.perf_counter()
+    with pool:
+        futures = [pool.submit(render_task, name, save_path) for name in names]
+        print(f"{'Figure':<24}{'Load s':>8}{'Render s':>10}{'Peak RSS MB':>13}")
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            rss = f"{result['peak_rss_mb']:.0f}" if result["peak_rss_mb"] is not None else "n/a"
+            line = f"{result['name']:<24}{result['load_seconds']:>8.2f}{result['render_seconds']:>10.2f}{rss:>13}"
+            print(line + (f"  FAILED: {result['error']}" if result["error"] else ""))
+    failed = sum(1 for result in results if result["error"])
+    print(f"Rendered {len(results) - failed} of {len(results)} figure families into {save_path} "
+          f"in {time.perf_counter() - start:.1f}s with {jobs} worker(s)")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the figures headless and in parallel.")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--output", default=IMAGES_PATH, help=f"Output folder (default: {IMAGES_PATH})")
+    parser.add_argument("--only", nargs="+", choices=list(FIGURE_TASKS), help="Figure families to render")
+    parser.add_argument("--verbose", action="store_true", help="Print each task's own output")
+    args = parser.parse_args()
+
+    results = render_figures(args.only, args.output, args.jobs)
+    if args.verbose:
+        for result in results:
+            print(f"\n--- {result['name']} ---\n{result['output']}")
+    if any(result["error"] for result in results):
+        sys.exit(1)
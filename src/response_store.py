@@ -0,0 +1,237 @@
+import os
+import glob
+import time
+import shutil
+import numpy as np
+import pandas as pd
+from interval_set import to_epoch_ms
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    ds = None
+    pq = None
+
+# Parquet dataset: <root>/treatment=T1/iteration=1_2/part-0-0.parquet
+STORE_PATH = "data/processed/response_store"
+CSV_FOLDER = "data/processed/response_variables"
+LOCAL_TZ = "America/Costa_Rica"
+CSV_CHUNK_ROWS = 500_000  # Rows converted at a time by write_treatment_csv
+
+METRIC_COLUMNS = ["tps", "cpu_usage", "ram_usage", "players_online", "avg_ping"]
+# Integer metrics are stored in the smallest unsigned type that holds them (nullable)
+INTEGER_DTYPES = {"ram_usage": "UInt32", "players_online": "UInt16"}
+
+_missing_pyarrow_reported = False
+
+
+def pyarrow_available():
+    """True when pyarrow is installed; prints the install hint once otherwise."""
+    global _missing_pyarrow_reported
+    if pa is None and not _missing_pyarrow_reported:
+        print("pyarrow not installed, using the CSV files. Install with: pip install pyarrow")
+        _missing_pyarrow_reported = True
+    return pa is not None
+
+
+def _partitioning():
+    # Explicit string schema so iterations like "1" are not read back as integers
+    return ds.partitioning(pa.schema([("treatment", pa.string()), ("iteration", pa.string())]), flavor="hive")
+
+
+def _compact_integers(values, dtype):
+    """Nullable unsigned integer array for float64 values, or None when a value is not a non-negative integer."""
+    if not np.all(np.isnan(values) | ((values == np.round(values)) & (values >= 0))):
+        return None
+    return pd.array(values, dtype="Float64").astype(dtype)
+
+
+def to_store_frame(df):
+    """
+    Convert response variables (OUTPUT_COLUMNS, dates as datetimes or CSV strings) to
+    the stored schema: int64 UTC epoch-ms dates, float64 measurements and compact
+    nullable integers for RAM and players.
+    """
+    out = pd.DataFrame(index=range(len(df)))
+    dates = df["date"]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, format="ISO8601", utc=True)
+    out["date"] = to_epoch_ms(dates)
+
+    for col in METRIC_COLUMNS:
+        values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        compact = _compact_integers(values, INTEGER_DTYPES[col]) if col in INTEGER_DTYPES else None
+        out[col] = values if compact is None else compact
+
+    out["treatment"] = df["treatment"].astype(str).to_numpy()
+    out["iteration"] = df["iteration"].astype(str).to_numpy()
+    return out
+
+
+def write_treatment(frames, treatment, root=STORE_PATH):
+    """
+    Replace one treatment's partition with the given DataFrames.
+
+    Args:
+        frames: Iterable of DataFrames with the response variable columns
+        treatment: Treatment label, e.g. "T2"
+        root: Dataset folder
+
+    Returns:
+        True when the partition was written, False when pyarrow is not installed
+    """
+    if not pyarrow_available():
+        return False
+
+    shutil.rmtree(os.path.join(root, f"treatment={treatment}"), ignore_errors=True)
+    for part, df in enumerate(frames):
+        if df.empty:
+            continue
+        table = pa.Table.from_pandas(to_store_frame(df), preserve_index=False)
+        ds.write_dataset(table, root, format="parquet", partitioning=_partitioning(),
+                         basename_template=f"part-{part}-{{i}}.parquet",
+                         existing_data_behavior="overwrite_or_ignore")
+    return True
+
+
+def append_treatment(frames, treatment, root=STORE_PATH):
+    """
+    Add rows to one treatment's partition, keeping the files already there.
+    Used by the live tail; the next extraction of the treatment rewrites the partition.
+
+    Returns:
+        True when the rows were written, False when pyarrow is not installed
+    """
+    if not pyarrow_available():
+        return False
+
+    tag = time.time_ns()
+    for part, df in enumerate(frames):
+        if df.empty:
+            continue
+        table = pa.Table.from_pandas(to_store_frame(df), preserve_index=False)
+        ds.write_dataset(table, root, format="parquet", partitioning=_partitioning(),
+                         basename_template=f"live-{tag}-{part}-{{i}}.parquet",
+                         existing_data_behavior="overwrite_or_ignore")
+    return True
+
+
+def write_treatment_csv(csv_path, treatment, root=STORE_PATH, chunk_rows=CSV_CHUNK_ROWS):
+    """Load an exported response variables CSV into the store, chunk_rows rows at a time."""
+    chunks = pd.read_csv(csv_path, chunksize=chunk_rows, dtype={"treatment": str, "iteration": str})
+    return write_treatment(chunks, treatment, root)
+
+
+def iter_file_chunks(path, columns, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    Read one store file or exported CSV in chunks of at most chunk_rows rows.
+
+    Args:
+        path: A .parquet file inside the store (treatment and iteration come from its
+              partition folders) or a T*_response_variables_*.csv file
+        columns: Measurement columns to read
+
+    Yields:
+        DataFrames with the requested columns plus treatment and iteration
+    """
+    if path.endswith(".parquet"):
+        partitions = dict(part.split("=", 1) for part in os.path.normpath(path).split(os.sep) if "=" in part)
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=list(columns)):
+            df = batch.to_pandas()
+            df["treatment"] = partitions["treatment"]
+            df["iteration"] = partitions["iteration"]
+            yield df
+    else:
+        wanted = set(columns) | {"treatment", "iteration"}
+        yield from pd.read_csv(path, usecols=lambda col: col in wanted, chunksize=chunk_rows,
+                               dtype={"treatment": str, "iteration": str})
+
+
+def store_is_current(root=STORE_PATH, csv_folder=CSV_FOLDER):
+    """
+    True when the store has data that is not older than the CSV export, so a store
+    left behind by an earlier run (e.g. before an --no-store extraction) is not used.
+    """
+    parts = glob.glob(os.path.join(root, "treatment=*", "**", "*.parquet"), recursive=True)
+    if not parts:
+        return False
+    csvs = glob.glob(os.path.join(csv_folder, "T*_response_variables_*.csv"))
+    if csvs and max(map(os.path.getmtime, csvs)) > max(map(os.path.getmtime, parts)):
+        print(f"Response store in {root} is older than the CSV files, using the CSV files")
+        return False
+    return True
+
+
+def _finish(df, columns, parse_dates):
+    df = df.sort_values(["treatment", "date"], kind="stable").reset_index(drop=True)
+    for col, dtype in INTEGER_DTYPES.items():
+        if col in df.columns and not isinstance(df[col].dtype, pd.api.extensions.ExtensionDtype):
+            compact = _compact_integers(df[col].to_numpy(dtype="float64", na_value=np.nan), dtype)
+            if compact is not None:
+                df[col] = compact
+    if parse_dates:
+        df["date"] = pd.to_datetime(df["date"], unit="ms", utc=True).dt.tz_convert(LOCAL_TZ)
+    df["treatment"] = df["treatment"].astype("category")
+    df["iteration"] = df["iteration"].astype("category")
+    if columns is not None:
+        df = df[list(dict.fromkeys(list(columns) + ["treatment", "iteration"]))]
+    return df
+
+
+def load_response_variables(columns=None, treatments=None, iterations=None, parse_dates=True,
+                            root=STORE_PATH, csv_folder=CSV_FOLDER):
+    """
+    Load response variables from the Parquet store, falling back to the CSV files
+    when pyarrow is not installed or the store is missing or stale (see store_is_current).
+
+    Only the requested columns are read and the treatment/iteration filters are
+    pushed down to the partition directories, e.g.
+    load_response_variables(columns=["tps"], treatments=["T2", "T5"]) reads the tps
+    column of two treatments and nothing else.
+
+    Args:
+        columns: Measurement columns to load (treatment and iteration are always included); None for all
+        treatments: Treatment labels to keep, e.g. ["T2", "T5"]; None for all
+        iterations: Iteration labels to keep, e.g. ["1", "2_1"]; None for all
+        parse_dates: Return 'date' as local datetimes instead of int64 UTC epoch milliseconds
+        root: Parquet dataset folder
+        csv_folder: Folder with the T*_response_variables_*.csv files
+
+    Returns:
+        DataFrame ordered by treatment and date, or None when no data was found
+    """
+    read_columns = None
+    if columns is not None:
+        read_columns = list(dict.fromkeys(["date"] + list(columns) + ["treatment", "iteration"]))
+
+    if store_is_current(root, csv_folder) and pyarrow_available():
+        dataset = ds.dataset(root, format="parquet", partitioning=_partitioning())
+        condition = None
+        if treatments is not None:
+            condition = ds.field("treatment").isin(list(treatments))
+        if iterations is not None:
+            iteration_condition = ds.field("iteration").isin([str(it) for it in iterations])
+            condition = iteration_condition if condition is None else condition & iteration_condition
+        table = dataset.to_table(columns=read_columns, filter=condition)
+        if table.num_rows == 0:
+            return None
+        df = table.to_pandas()
+        return _finish(df, columns, parse_dates)
+
+    frames = []
+    for file in sorted(glob.glob(os.path.join(csv_folder, "T*_response_variables_*.csv"))):
+        if treatments is not None and os.path.basename(file).split("_")[0] not in treatments:
+            continue
+        df = pd.read_csv(file, usecols=read_columns, dtype={"treatment": str, "iteration": str})
+        if iterations is not None:
+            df = df[df["iteration"].isin([str(it) for it in iterations])]
+        frames.append(df)
+    if not frames:
+        return None
+
+    df = pd.concat(frames, ignore_index=True)
+    df["date"] = to_epoch_ms(pd.to_datetime(df["date"], format="ISO8601", utc=True))
+    return _finish(df, columns, parse_dates)
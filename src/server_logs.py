@@ -0,0 +1,317 @@
+import os
+import re
+import gzip
+import sqlite3
+import hashlib
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Rotated Minecraft logs: 2025-06-11-1.log, or 2025-06-11-1.log.gz once compressed
+LOG_NAME_PATTERN = re.compile(r"(\d{4})-(\d{2})-(\d{2})-(\d+)\.log(?:\.gz)?$")
+
+BLOCK_SIZE = 16 * 1024 * 1024  # Bytes read per block while streaming a log
+
+# Parsed events per log file, so unchanged logs are never parsed twice
+EVENT_CACHE_PATH = "data/processed/log_events.sqlite"
+EVENT_CACHE_VERSION = "1"  # Bump when parse_log_events changes what it returns
+
+# Only lines containing one of these markers are run through EVENT_PATTERN
+CHUNKY_MARKER = b"[Chunky]"
+STARTUP_MARKER = b"Starting minecraft server"
+EVENT_PATTERN = re.compile(
+    rb"\[(\d{2}):(\d{2}):(\d{2})\].*?(?:\[Chunky\] Task (running|finished)|(Starting minecraft server))"
+)
+
+# Tick overload warnings ("Can't keep up! Is the server overloaded? Running 2010ms or 40 ticks behind")
+OVERLOAD_MARKER = b"Can't keep up!"
+OVERLOAD_PATTERN = re.compile(rb"\[(\d{2}):(\d{2}):(\d{2})\].*?Can't keep up!.*?Running (\d+)ms or (\d+) ticks behind")
+
+
+def list_log_files(log_folder):
+    """
+    Dated log files in the folder, plain or gzip, in chronological order
+    (by date, then by the rotation index, so -10 sorts after -9).
+
+    Returns:
+        List of (path, date) tuples
+    """
+    logs = []
+    for filename in os.listdir(log_folder):
+        match = LOG_NAME_PATTERN.match(filename)
+        if not match:
+            continue
+        year, month, day, index = (int(part) for part in match.groups())
+        logs.append(((year, month, day, index), os.path.join(log_folder, filename), datetime(year, month, day)))
+    logs.sort()
+    return [(path, log_date) for _, path, log_date in logs]
+
+
+def open_log(path):
+    """Open a plain or gzip-compressed log for binary reading."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def iter_line_blocks(f, block_size=BLOCK_SIZE):
+    """Read a binary file in blocks of roughly block_size bytes that end on a line boundary."""
+    remainder = b""
+    while True:
+        data = f.read(block_size)
+        if not data:
+            if remainder:
+                yield remainder
+            return
+        data = remainder + data
+        cut = data.rfind(b"\n") + 1
+        remainder = data[cut:]
+        if cut:
+            yield data[:cut]
+
+
+def _stamped_lines(block):
+    """
+    Start offsets and seconds of day of every line in the block that begins with a
+    [HH:MM:SS] prefix, computed as arrays over the raw bytes.
+    """
+    buf = np.frombuffer(block, dtype=np.uint8)
+    starts = np.concatenate([[0], np.flatnonzero(buf[:-1] == ord("\n")) + 1])
+    starts = starts[starts + 9 < len(buf)]
+    stamped = ((buf[starts] == ord("[")) & (buf[starts + 9] == ord("]"))
+               & (buf[starts + 3] == ord(":")) & (buf[starts + 6] == ord(":")))
+    starts = starts[stamped]
+
+    def digits(offset):
+        return buf[starts + offset].astype(np.int64) - ord("0")
+
+    seconds = ((digits(1) * 10 + digits(2)) * 3600 + (digits(4) * 10 + digits(5)) * 60
+               + digits(7) * 10 + digits(8))
+    return starts, seconds
+
+
+def _marker_lines(block):
+    """Start and end offsets of the lines containing a marker, in file order."""
+    lines = {}
+    for marker in (CHUNKY_MARKER, STARTUP_MARKER):
+        position = block.find(marker)
+        while position != -1:
+            start = block.rfind(b"\n", 0, position) + 1
+            end = block.find(b"\n", position)
+            end = len(block) if end == -1 else end
+            lines[start] = end
+            position = block.find(marker, end)
+    return sorted(lines.items())
+
+
+def parse_log_events(path, log_date):
+    """
+    Stream one log file and return its Chunky task and server startup events.
+
+    The file is read in large blocks. Line boundaries and [HH:MM:SS] prefixes are
+    decoded with NumPy over the raw bytes, and only the lines containing a marker
+    are matched against the regex. The file name gives the date of the first line;
+    every time the prefix goes backwards the log has crossed midnight and the day is
+    advanced.
+
+    Args:
+        path: Log file, plain or .gz
+        log_date: Date taken from the file name
+
+    Returns:
+        List of (datetime, kind) tuples, kind being "running", "finished" or "startup"
+    """
+    events = []
+    days_elapsed = 0
+    previous_seconds = -1
+    with open_log(path) as f:
+        for block in iter_line_blocks(f):
+            starts, seconds = _stamped_lines(block)
+            rollover = seconds < np.concatenate([[previous_seconds], seconds[:-1]])
+            line_days = days_elapsed + np.cumsum(rollover)
+
+            for start, end in _marker_lines(block):
+                match = EVENT_PATTERN.search(block, start, end)
+                if not match:
+                    continue
+                # Day of the last stamped line at or before this one
+                idx = np.searchsorted(starts, start, side="right") - 1
+                day = log_date + timedelta(days=int(line_days[idx]) if idx >= 0 else days_elapsed)
+                hour, minute, second, task_state, startup = match.groups()
+                timestamp = day.replace(hour=int(hour), minute=int(minute), second=int(second))
+                events.append((timestamp, "startup" if startup else task_state.decode()))
+
+            if len(seconds):
+                days_elapsed = int(line_days[-1])
+                previous_seconds = int(seconds[-1])
+    return events
+
+
+def _parse_log_job(job):
+    return parse_log_events(*job)
+
+
+def pair_chunky_events(events):
+    """
+    Pair Chunky task events into (start, end) intervals.
+
+    The first "running" event opens an interval (later progress lines are ignored)
+    and the next "finished" event closes it, also across files, since a task running
+    past midnight is split over two rotated logs. A server startup discards an open
+    interval: the task died with the previous process.
+    """
+    intervals = []
+    current_start = None
+    for timestamp, kind in events:
+        if kind == "running" and current_start is None:
+            current_start = timestamp
+        elif kind == "finished" and current_start is not None:
+            intervals.append((current_start, timestamp))
+            current_start = None
+        elif kind == "startup":
+            current_start = None
+    return intervals
+
+
+def file_sha256(path):
+    """SHA-256 of the file's bytes as stored on disk."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def open_event_cache(cache_path=EVENT_CACHE_PATH):
+    """
+    Open (creating it if needed) the SQLite cache of parsed log events.
+    A cache written by another EVENT_CACHE_VERSION is emptied.
+    """
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(cache_path)
+    conn.executescript("""
+    CREATE TABLE IF NOT EXISTS cache_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+    CREATE TABLE IF NOT EXISTS log_files (
+        path TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        sha256 TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS log_events (
+        path TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        timestamp TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        PRIMARY KEY (path, seq)
+    ) WITHOUT ROWID;
+    """)
+    row = conn.execute("SELECT value FROM cache_meta WHERE key = 'version'").fetchone()
+    if row is None or row[0] != EVENT_CACHE_VERSION:
+        with conn:
+            conn.execute("DELETE FROM log_events")
+            conn.execute("DELETE FROM log_files")
+            conn.execute("INSERT OR REPLACE INTO cache_meta (key, value) VALUES ('version', ?)", (EVENT_CACHE_VERSION,))
+    return conn
+
+
+def cached_log_events(logs, cache_path=EVENT_CACHE_PATH, jobs=None, log_folder=None):
+    """
+    Events of every log file, parsing only the files the cache does not know.
+
+    A file is a hit when its size and mtime match the cached entry. Otherwise its
+    SHA-256 is compared, so a touched or copied but unchanged log is not parsed
+    again; a new or modified file is parsed and its events replace the cached ones.
+
+    Args:
+        logs: List of (path, date) tuples as returned by list_log_files
+        cache_path: SQLite cache file
+        jobs: Worker processes for the files that must be parsed
+        log_folder: When given, cache entries for files no longer in this folder are removed
+
+    Returns:
+        List with the list of (datetime, kind) events of each log, in the order of logs
+    """
+    conn = open_event_cache(cache_path)
+    try:
+        known = {path: (size, mtime_ns, sha256) for path, size, mtime_ns, sha256
+                 in conn.execute("SELECT path, size, mtime_ns, sha256 FROM log_files")}
+
+        keys = []
+        stale = []
+        refreshed = []
+        for path, log_date in logs:
+            key = os.path.abspath(path)
+            keys.append(key)
+            stat = os.stat(path)
+            entry = known.get(key)
+            if entry is not None and entry[:2] == (stat.st_size, stat.st_mtime_ns):
+                continue
+            digest = file_sha256(path)
+            if entry is not None and entry[2] == digest:
+                refreshed.append((stat.st_size, stat.st_mtime_ns, key))
+            else:
+                stale.append((path, log_date, key, stat, digest))
+
+        parsed = parse_logs([(path, log_date) for path, log_date, _, _, _ in stale], jobs)
+
+        with conn:
+            conn.executemany("UPDATE log_files SET size = ?, mtime_ns = ? WHERE path = ?", refreshed)
+            for (_, _, key, stat, digest), events in zip(stale, parsed):
+                conn.execute("DELETE FROM log_events WHERE path = ?", (key,))
+                conn.executemany(
+                    "INSERT INTO log_events (path, seq, timestamp, kind) VALUES (?, ?, ?, ?)",
+                    [(key, seq, timestamp.isoformat(), kind) for seq, (timestamp, kind) in enumerate(events)]
+                )
+                conn.execute("INSERT OR REPLACE INTO log_files (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                             (key, stat.st_size, stat.st_mtime_ns, digest))
+
+            if log_folder is not None:
+                prefix = os.path.join(os.path.abspath(log_folder), "")
+                current = set(keys)
+                gone = [(path,) for path in known if path.startswith(prefix) and path not in current]
+                conn.executemany("DELETE FROM log_events WHERE path = ?", gone)
+                conn.executemany("DELETE FROM log_files WHERE path = ?", gone)
+
+        events_by_key = {key: [] for key in keys}
+        for path, timestamp, kind in conn.execute("SELECT path, timestamp, kind FROM log_events ORDER BY path, seq"):
+            if path in events_by_key:
+                events_by_key[path].append((datetime.fromisoformat(timestamp), kind))
+    finally:
+        conn.close()
+
+    return [events_by_key[key] for key in keys]
+
+
+def parse_logs(logs, jobs=None):
+    """
+    Parse log files on a process pool (serially for a single file or worker).
+
+    Returns:
+        List with the list of (datetime, kind) events of each log, in the order of logs
+    """
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1 and len(logs) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(logs))) as executor:
+            return list(executor.map(_parse_log_job, logs, chunksize=max(1, len(logs) // (jobs * 4))))
+    return [parse_log_events(path, log_date) for path, log_date in logs]
+
+
+def chunky_intervals(log_folder="data/raw/logs", jobs=None, cache_path=EVENT_CACHE_PATH):
+    """
+    Scans every plain or gzip log in the folder for Chunky processing intervals.
+
+    Args:
+        log_folder: Folder with the rotated server logs
+        jobs: Worker processes used to parse the files (default: one per CPU)
+        cache_path: SQLite cache of parsed events (see cached_log_events); None parses every file
+
+    Returns:
+        List of (start_datetime, end_datetime) naive local tuples representing when Chunky was running.
+    """
+    logs = list_log_files(log_folder)
+    if cache_path is None:
+        per_file = parse_logs(logs, jobs)
+    else:
+        per_file = cached_log_events(logs, cache_path, jobs, log_folder=log_folder)
+
+    return pair_chunky_events(event for events in per_file for event in events)
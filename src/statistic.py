@@ -1,15 +1,18 @@
 import pandas as pd
+from online_stats import accumulate
+
+CHUNK_ROWS = 200_000  # Rows read at a time; memory does not grow with the file
 
 def analyze_response_variables(filename):
     """
     Analyze response variables from a CSV file and print summary statistics.
-    This function reads a CSV file containing various response variables and prints
-    summary statistics for each specified variable.
+    This function streams a CSV file containing various response variables in chunks
+    and prints the describe() statistics of each specified variable, computed with
+    online accumulators (quartiles are exact up to online_stats.SKETCH_K values and
+    approximate beyond).
     """
     print("-" * 50)
     print(f"Analyzing response variables from: {filename}\n")
-    # Load your CSV file with all response variables
-    df = pd.read_csv(filename)
 
     # List all columns you want summary stats for
     variables = [
@@ -19,10 +22,13 @@ def analyze_response_variables(filename):
         'players_online', # Number of players online
     ]
 
+    chunks = pd.read_csv(filename, usecols=lambda col: col in variables, chunksize=CHUNK_ROWS)
+    accumulators = accumulate(chunks, variables).get(None, {})
+
     for var in variables:
-        if var in df.columns:
+        if var in accumulators:
             print(f"--- {var} ---")
-            print(df[var].describe())
+            print(accumulators[var].describe(var))
             print()
         else:
             print(f"Column '{var}' not found in CSV.\n")
@@ -1,28 +1,31 @@
 import pandas as pd
-import os
 from datetime import datetime
+from online_stats import accumulate
+from dataset import load_accumulators, treatment_accumulators, summary_from_accumulators
+
+CHUNK_ROWS = 200_000  # Rows read at a time by analyze_treatment_stats
 
 def analyze_treatment_stats(filename):
     """
-    Calculate comprehensive statistics for a treatment file
+    Calculate comprehensive statistics for a treatment file, streaming it in chunks
     """
     try:
-        df = pd.read_csv(filename)
-        if df.empty:
+        metrics = ['tps', 'cpu_usage', 'ram_usage']
+        treatment = 'Unknown'
+        accumulators = {}
+        for chunk in pd.read_csv(filename, chunksize=CHUNK_ROWS):
+            if treatment == 'Unknown' and 'treatment' in chunk.columns and not chunk.empty:
+                treatment = chunk['treatment'].iloc[0]
+            accumulate([chunk], metrics, accumulators=accumulators)
+        if not accumulators or accumulators[None]['tps'].moments.count == 0:
             return None
+        moments = {metric: accumulator.moments for metric, accumulator in accumulators[None].items()}
         
-        stats = {
-            'treatment': df['treatment'].iloc[0] if 'treatment' in df.columns else 'Unknown',
-            'tps_min': df['tps'].min(),
-            'tps_max': df['tps'].max(),
-            'tps_mean': df['tps'].mean(),
-            'cpu_min': df['cpu_usage'].min(),
-            'cpu_max': df['cpu_usage'].max(),
-            'cpu_mean': df['cpu_usage'].mean(),
-            'ram_min': df['ram_usage'].min(),
-            'ram_max': df['ram_usage'].max(),
-            'ram_mean': df['ram_usage'].mean(),
-        }
+        stats = {'treatment': treatment}
+        for prefix, metric in [('tps', 'tps'), ('cpu', 'cpu_usage'), ('ram', 'ram_usage')]:
+            stats[f'{prefix}_min'] = moments[metric].min
+            stats[f'{prefix}_max'] = moments[metric].max
+            stats[f'{prefix}_mean'] = moments[metric].mean
         
         return stats
     except Exception as e:
@@ -31,36 +34,18 @@ def analyze_treatment_stats(filename):
 
 def create_summary_table():
     """
-    Create a comprehensive summary table for all treatments
+    Create a comprehensive summary table for all treatments.
+    The statistics are merged from the stored per-iteration accumulators
+    (dataset.load_accumulators), so only new or changed data files are read.
     """
-    # Treatment files
-    treatment_files = [
-        "data/processed/response_variables/T1_response_variables_treatment1.csv",
-        "data/processed/response_variables/T2_response_variables_treatment2.csv", 
-        "data/processed/response_variables/T3_response_variables_treatment3.csv",
-        "data/processed/response_variables/T4_response_variables_treatment4.csv",
-        "data/processed/response_variables/T5_response_variables_treatment5.csv",
-        "data/processed/response_variables/T6_response_variables_treatment6.csv",
-        "data/processed/response_variables/T7_response_variables_treatment7.csv"
-    ]
-    
-    # Collect statistics for all treatments
-    all_stats = []
-    
-    for filename in treatment_files:
-        if os.path.exists(filename):
-            stats = analyze_treatment_stats(filename)
-            if stats:
-                all_stats.append(stats)
-        else:
-            print(f"Warning: File not found {filename}")
+    accumulators = load_accumulators()
     
-    if not all_stats:
+    if not accumulators:
         print("No valid data found!")
         return None
         
     # Create DataFrame
-    df_summary = pd.DataFrame(all_stats)
+    df_summary = summary_from_accumulators(treatment_accumulators(accumulators))
     
     # Round values for better presentation
     numeric_columns = ['tps_min', 'tps_max', 'tps_mean', 'cpu_min', 'cpu_max', 'cpu_mean', 
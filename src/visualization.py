@@ -1,6 +1,8 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
+from rendering import finish_figure
+from downsampling import pixel_budget, plot_downsampled
 
 # Plot the results from a csv
 def plot_response_variables(filename, t):
@@ -20,14 +22,17 @@ def plot_response_variables(filename, t):
 
     for var, label in variables:
         if var in df.columns:
-            plt.figure(figsize=(10, 4))
-            plt.plot(df['date'], df[var], marker='o', linestyle='-')
+            fig, ax = plt.subplots(figsize=(10, 4))
+            # Every sample gets a marker only while they fit the plot's width
+            max_points = pixel_budget(10, fig.dpi)
+            marker = 'o' if df[var].count() <= max_points else None
+            plot_downsampled(ax, df['date'], df[var], max_points, marker=marker, linestyle='-')
             plt.title(f'{label} - Tratamiento {t}')
             plt.xlabel('Time')
             plt.ylabel(label)
             plt.xticks(rotation=45)
             plt.tight_layout()
-            plt.show()
+            finish_figure()
         else:
             print(f"Column '{var}' not found in the CSV.")
 
@@ -3,73 +3,11 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 import os
-import glob
+import sys
 
-def load_summary_data():
-    """
-    Load and calculate summary statistics from the actual CSV data files
-    """
-    # Get all CSV files
-    data_files = glob.glob("../../data/processed/response_variables/T*_response_variables_*.csv")
-    
-    if not data_files:
-        print("No data files found. Make sure you're running from the visualizations folder.")
-        return None
-    
-    all_data = []
-    for file in data_files:
-        try:
-            df = pd.read_csv(file)
-            all_data.append(df)
-        except Exception as e:
-            print(f"Error loading {file}: {e}")
-    
-    if not all_data:
-        print("No valid data found.")
-        return None
-    
-    # Combine all data
-    combined_df = pd.concat(all_data, ignore_index=True)
-    
-    # Calculate summary statistics for each treatment
-    treatments = sorted(combined_df['treatment'].unique())
-    summary_data = []
-    
-    for treatment in treatments:
-        treatment_data = combined_df[combined_df['treatment'] == treatment]
-        
-        if len(treatment_data) > 0:
-            summary = {
-                'treatment': treatment,
-                'tps_min': treatment_data['tps'].min(),
-                'tps_max': treatment_data['tps'].max(),
-                'tps_mean': treatment_data['tps'].mean(),
-                'cpu_min': treatment_data['cpu_usage'].min(),
-                'cpu_max': treatment_data['cpu_usage'].max(),
-                'cpu_mean': treatment_data['cpu_usage'].mean(),
-                'ram_min': treatment_data['ram_usage'].min(),
-                'ram_max': treatment_data['ram_usage'].max(),
-                'ram_mean': treatment_data['ram_usage'].mean(),
-            }
-            summary_data.append(summary)
-    
-    if not summary_data:
-        print("No summary data could be calculated.")
-        return None
-    
-    df_summary = pd.DataFrame(summary_data)
-    
-    # Round values for better presentation
-    numeric_columns = ['tps_min', 'tps_max', 'tps_mean', 'cpu_min', 'cpu_max', 'cpu_mean', 
-                      'ram_min', 'ram_max', 'ram_mean']
-    for col in numeric_columns:
-        if col in df_summary.columns:
-            df_summary[col] = df_summary[col].round(2)
-    
-    print(f"Loaded and calculated summary for treatments: {treatments}")
-    print(f"Summary data shape: {df_summary.shape}")
-    
-    return df_summary
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from dataset import load_summary_data
+from rendering import finish_figure
 
 def create_mean_comparison_bars(df, save_path="bar_charts"):
     """
@@ -129,7 +67,7 @@ def create_mean_comparison_bars(df, save_path="bar_charts"):
     plt.savefig(filename, dpi=300, bbox_inches='tight')
     print(f"Saved: {filename}")
     
-    plt.show()
+    finish_figure()
 
 def create_range_comparison_bars(df, save_path="bar_charts"):
     """
@@ -184,7 +122,7 @@ def create_range_comparison_bars(df, save_path="bar_charts"):
     plt.savefig(filename, dpi=300, bbox_inches='tight')
     print(f"Saved: {filename}")
     
-    plt.show()
+    finish_figure()
 
 def create_grouped_bar_chart(df, save_path="bar_charts"):
     """
@@ -237,7 +175,7 @@ def create_grouped_bar_chart(df, save_path="bar_charts"):
     plt.savefig(filename, dpi=300, bbox_inches='tight')
     print(f"Saved: {filename}")
     
-    plt.show()
+    finish_figure()
 
 def create_performance_score_bars(df, save_path="bar_charts"):
     """
@@ -307,7 +245,7 @@ def create_performance_score_bars(df, save_path="bar_charts"):
     plt.savefig(filename, dpi=300, bbox_inches='tight')
     print(f"Saved: {filename}")
     
-    plt.show()
+    finish_figure()
     
     # Print ranking
     ranking = df['treatment'].iloc[composite_score.sort_values(ascending=False).index]
@@ -2,37 +2,11 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
-import glob
+import sys
 
-def load_all_treatment_data():
-    """
-    Load and combine all treatment data for visualization
-    """
-    # Get all CSV files
-    data_files = glob.glob("../../data/processed/response_variables/T*_response_variables_*.csv")
-    
-    if not data_files:
-        print("No data files found. Make sure you're running from the visualizations folder.")
-        return None
-    
-    all_data = []
-    for file in data_files:
-        try:
-            df = pd.read_csv(file)
-            all_data.append(df)
-        except Exception as e:
-            print(f"Error loading {file}: {e}")
-    
-    if not all_data:
-        print("No valid data found.")
-        return None
-    
-    # Combine all data
-    combined_df = pd.concat(all_data, ignore_index=True)
-    print(f"Loaded data for treatments: {sorted(combined_df['treatment'].unique())}")
-    print(f"Total records: {len(combined_df)}")
-    
-    return combined_df
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from dataset import load_all_treatment_data
+from rendering import finish_figure
 
 def create_box_plots(df, save_path="box_plots"):
     """
@@ -68,7 +42,7 @@ def create_box_plots(df, save_path="box_plots"):
                                       'markeredgecolor': 'black', 'markersize': 8})
         
         # Calculate and add horizontal line at lowest averages
-        averages = df.groupby('treatment')[metric].mean()
+        averages = df.groupby('treatment', observed=True)[metric].mean()
         lowest_average = averages.min()
         plt.axhline(y=lowest_average, color=LINE_COLOR, linestyle='--', linewidth=1.5,
                    label=f'Lowest Average: {lowest_average:.2f}')
@@ -81,9 +55,9 @@ def create_box_plots(df, save_path="box_plots"):
         plt.legend(loc='upper right')
         
         # Add sample size annotations
+        sample_sizes = df.groupby('treatment', observed=True)[metric].size()
         for i, treatment in enumerate(sorted(df['treatment'].unique())):
-            treatment_data = df[df['treatment'] == treatment][metric]
-            n = len(treatment_data)
+            n = sample_sizes[treatment]
             plt.text(i, plt.ylim()[1] * 1.02, 
                     f'n={n}', ha='center', va='center', 
                     fontsize=10, fontweight='bold')
@@ -95,7 +69,7 @@ def create_box_plots(df, save_path="box_plots"):
         plt.savefig(filename, dpi=300, bbox_inches='tight')
         print(f"Saved: {filename}")
         
-        plt.show()
+        finish_figure()
 
 def create_comparative_box_plot(df, save_path="box_plots"):
     """
@@ -144,7 +118,7 @@ def create_comparative_box_plot(df, save_path="box_plots"):
     plt.savefig(filename, dpi=300, bbox_inches='tight')
     print(f"Saved: {filename}")
     
-    plt.show()
+    finish_figure()
 
 def main():
     """
@@ -3,73 +3,11 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 import os
-import glob
+import sys
 
-def load_summary_data():
-    """
-    Load and calculate summary statistics from the actual CSV data files
-    """
-    # Get all CSV files
-    data_files = glob.glob("../../data/processed/response_variables/T*_response_variables_*.csv")
-    
-    if not data_files:
-        print("No data files found. Make sure you're running from the visualizations folder.")
-        return None
-    
-    all_data = []
-    for file in data_files:
-        try:
-            df = pd.read_csv(file)
-            all_data.append(df)
-        except Exception as e:
-            print(f"Error loading {file}: {e}")
-    
-    if not all_data:
-        print("No valid data found.")
-        return None
-    
-    # Combine all data
-    combined_df = pd.concat(all_data, ignore_index=True)
-    
-    # Calculate summary statistics for each treatment
-    treatments = sorted(combined_df['treatment'].unique())
-    summary_data = []
-    
-    for treatment in treatments:
-        treatment_data = combined_df[combined_df['treatment'] == treatment]
-        
-        if len(treatment_data) > 0:
-            summary = {
-                'treatment': treatment,
-                'tps_min': treatment_data['tps'].min(),
-                'tps_max': treatment_data['tps'].max(),
-                'tps_mean': treatment_data['tps'].mean(),
-                'cpu_min': treatment_data['cpu_usage'].min(),
-                'cpu_max': treatment_data['cpu_usage'].max(),
-                'cpu_mean': treatment_data['cpu_usage'].mean(),
-                'ram_min': treatment_data['ram_usage'].min(),
-                'ram_max': treatment_data['ram_usage'].max(),
-                'ram_mean': treatment_data['ram_usage'].mean(),
-            }
-            summary_data.append(summary)
-    
-    if not summary_data:
-        print("No summary data could be calculated.")
-        return None
-    
-    df_summary = pd.DataFrame(summary_data)
-    
-    # Round values for better presentation
-    numeric_columns = ['tps_min', 'tps_max', 'tps_mean', 'cpu_min', 'cpu_max', 'cpu_mean', 
-                      'ram_min', 'ram_max', 'ram_mean']
-    for col in numeric_columns:
-        if col in df_summary.columns:
-            df_summary[col] = df_summary[col].round(2)
-    
-    print(f"Loaded and calculated summary for treatments: {treatments}")
-    print(f"Summary data shape: {df_summary.shape}")
-    
-    return df_summary
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from dataset import load_all_treatment_data, load_summary_data
+from rendering import finish_figure
 
 def create_performance_heatmap(df, save_path="heatmaps"):
     """
@@ -124,7 +62,7 @@ def create_performance_heatmap(df, save_path="heatmaps"):
     plt.savefig(filename, dpi=300, bbox_inches='tight')
     print(f"Saved: {filename}")
     
-    plt.show()
+    finish_figure()
     
     # Create normalized heatmap (performance score)
     plt.figure(figsize=(10, 8))
@@ -148,7 +86,7 @@ def create_performance_heatmap(df, save_path="heatmaps"):
     plt.savefig(filename, dpi=300, bbox_inches='tight')
     print(f"Saved: {filename}")
     
-    plt.show()
+    finish_figure()
 
 def create_range_heatmap(df, save_path="heatmaps"):
     """
@@ -190,32 +128,23 @@ def create_range_heatmap(df, save_path="heatmaps"):
     plt.savefig(filename, dpi=300, bbox_inches='tight')
     print(f"Saved: {filename}")
     
-    plt.show()
+    finish_figure()
 
 def create_correlation_heatmap(save_path="heatmaps"):
     """
     Create a correlation heatmap between different metrics
     """
     try:
-        import glob
-        
         # Load raw data for correlation analysis
-        data_files = glob.glob("../data/processed/response_variables/T*_response_variables_*.csv")
+        metrics = ['tps', 'cpu_usage', 'ram_usage']
+        combined_df = load_all_treatment_data(columns=metrics)
         
-        if not data_files:
+        if combined_df is None:
             print("No raw data files found for correlation analysis")
             return
         
-        all_data = []
-        for file in data_files:
-            df = pd.read_csv(file)
-            all_data.append(df)
-        
-        combined_df = pd.concat(all_data, ignore_index=True)
-        
         # Calculate correlation matrix
-        metrics = ['tps', 'cpu_usage', 'ram_usage']
-        corr_matrix = combined_df[metrics].corr()
+        corr_matrix = combined_df[metrics].astype('float64').corr()
         
         # Rename for better display
         corr_matrix.index = ['TPS', 'CPU Usage (%)', 'RAM Usage (MB)']
@@ -237,7 +166,7 @@ def create_correlation_heatmap(save_path="heatmaps"):
         plt.savefig(filename, dpi=300, bbox_inches='tight')
         print(f"Saved: {filename}")
         
-        plt.show()
+        finish_figure()
         
     except Exception as e:
         print(f"Could not create correlation heatmap: {e}")
@@ -3,108 +3,30 @@ import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
 import os
-import glob
+import sys
 
-def load_summary_data():
-    """
-    Load and calculate summary statistics from the actual CSV data files
-    """
-    # Get all CSV files
-    data_files = glob.glob("../../data/processed/response_variables/T*_response_variables_*.csv")
-    
-    if not data_files:
-        print("No data files found. Make sure you're running from the visualizations folder.")
-        return None
-    
-    all_data = []
-    for file in data_files:
-        try:
-            df = pd.read_csv(file)
-            all_data.append(df)
-        except Exception as e:
-            print(f"Error loading {file}: {e}")
-    
-    if not all_data:
-        print("No valid data found.")
-        return None
-    
-    # Combine all data
-    combined_df = pd.concat(all_data, ignore_index=True)
-    
-    # Calculate summary statistics for each treatment
-    treatments = sorted(combined_df['treatment'].unique())
-    summary_data = []
-    
-    for treatment in treatments:
-        treatment_data = combined_df[combined_df['treatment'] == treatment]
-        
-        if len(treatment_data) > 0:
-            summary = {
-                'treatment': treatment,
-                'tps_min': treatment_data['tps'].min(),
-                'tps_max': treatment_data['tps'].max(),
-                'tps_mean': treatment_data['tps'].mean(),
-                'cpu_min': treatment_data['cpu_usage'].min(),
-                'cpu_max': treatment_data['cpu_usage'].max(),
-                'cpu_mean': treatment_data['cpu_usage'].mean(),
-                'ram_min': treatment_data['ram_usage'].min(),
-                'ram_max': treatment_data['ram_usage'].max(),
-                'ram_mean': treatment_data['ram_usage'].mean(),
-            }
-            summary_data.append(summary)
-    
-    if not summary_data:
-        print("No summary data could be calculated.")
-        return None
-    
-    df_summary = pd.DataFrame(summary_data)
-    
-    # Round values for better presentation
-    numeric_columns = ['tps_min', 'tps_max', 'tps_mean', 'cpu_min', 'cpu_max', 'cpu_mean', 
-                      'ram_min', 'ram_max', 'ram_mean']
-    for col in numeric_columns:
-        if col in df_summary.columns:
-            df_summary[col] = df_summary[col].round(2)
-    
-    print(f"Loaded and calculated summary for treatments: {treatments}")
-    print(f"Summary data shape: {df_summary.shape}")
-    
-    return df_summary
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from dataset import load_summary_data, load_raw_data
+from downsampling import INTERACTIVE_WIDTH_PX, WEBGL_THRESHOLD, downsample_trace
 
-def load_raw_data():
+def downsampled_traces(x, y, max_points, name, color, legendgroup, showlegend=True):
     """
-    Load raw data for detailed analysis from actual CSV files
+    Plotly traces of one time series: its LTTB line plus, when points were
+    dropped, the min/max envelope as a filled band. Traces with more than
+    WEBGL_THRESHOLD points are drawn with WebGL (go.Scattergl).
     """
-    # Get all CSV files
-    data_files = glob.glob("../../data/processed/response_variables/T*_response_variables_*.csv")
-    
-    if not data_files:
-        print("No data files found. Make sure you're running from the visualizations folder.")
-        return None
-    
-    all_data = []
-    for file in data_files:
-        try:
-            df = pd.read_csv(file)
-            all_data.append(df)
-        except Exception as e:
-            print(f"Error loading {file}: {e}")
-    
-    if not all_data:
-        print("No valid raw data found.")
-        return None
-    
-    # Combine all data
-    combined_df = pd.concat(all_data, ignore_index=True)
-    
-    # Convert date column to datetime if it exists
-    if 'date' in combined_df.columns:
-        combined_df['date'] = pd.to_datetime(combined_df['date'])
-    
-    print(f"Loaded raw data for treatments: {sorted(combined_df['treatment'].unique())}")
-    print(f"Total raw records: {len(combined_df)}")
-    
-    return combined_df
+    line_x, line_y, envelope = downsample_trace(x, y, max_points)
+    scatter = go.Scattergl if len(line_x) > WEBGL_THRESHOLD else go.Scatter
+    traces = []
+    if envelope is not None:
+        envelope_x, low, high = envelope
+        band = dict(x=envelope_x, mode='lines', line=dict(width=0, color=color), opacity=0.3,
+                    legendgroup=legendgroup, showlegend=False, hoverinfo='skip')
+        traces.append(scatter(y=high, **band))
+        traces.append(scatter(y=low, fill='tonexty', fillcolor=color, **band))
+    traces.append(scatter(x=line_x, y=line_y, mode='lines', name=name, line=dict(color=color),
+                          legendgroup=legendgroup, showlegend=showlegend))
+    return traces
 
 def create_interactive_dashboard(df_summary, df_raw=None, save_path="interactive"):
     """
@@ -274,9 +196,12 @@ def create_interactive_dashboard(df_summary, df_raw=None, save_path="interactive
     # Show the plot
     fig.show()
 
-def create_time_series_plot(df_raw, save_path="interactive"):
+def create_time_series_plot(df_raw, save_path="interactive", max_points=None):
     """
     Create an interactive time series plot if raw data is available
+
+    Each trace is downsampled to max_points (INTERACTIVE_WIDTH_PX by default, 0 keeps
+    every point), so the HTML size stays flat however long the runs are.
     """
     if df_raw is None or df_raw.empty:
         print("No raw data available for time series plot")
@@ -293,50 +218,17 @@ def create_time_series_plot(df_raw, save_path="interactive"):
     # Get unique treatments and colors
     treatments = sorted(df_raw['treatment'].unique())
     colors = px.colors.qualitative.Set3[:len(treatments)]
+    max_points = INTERACTIVE_WIDTH_PX if max_points is None else max_points
     
     for i, treatment in enumerate(treatments):
         treatment_data = df_raw[df_raw['treatment'] == treatment]
         
-        # TPS
-        fig.add_trace(
-            go.Scatter(
-                x=treatment_data['date'],
-                y=treatment_data['tps'],
-                mode='lines',
-                name=f'{treatment} TPS',
-                line=dict(color=colors[i]),
-                legendgroup=treatment
-            ),
-            row=1, col=1
-        )
-        
-        # CPU
-        fig.add_trace(
-            go.Scatter(
-                x=treatment_data['date'],
-                y=treatment_data['cpu_usage'],
-                mode='lines',
-                name=f'{treatment} CPU',
-                line=dict(color=colors[i]),
-                legendgroup=treatment,
-                showlegend=False
-            ),
-            row=2, col=1
-        )
-        
-        # RAM
-        fig.add_trace(
-            go.Scatter(
-                x=treatment_data['date'],
-                y=treatment_data['ram_usage'],
-                mode='lines',
-                name=f'{treatment} RAM',
-                line=dict(color=colors[i]),
-                legendgroup=treatment,
-                showlegend=False
-            ),
-            row=3, col=1
-        )
+        for row, (metric, label) in enumerate([('tps', 'TPS'), ('cpu_usage', 'CPU'), ('ram_usage', 'RAM')], start=1):
+            traces = downsampled_traces(treatment_data['date'], treatment_data[metric], max_points,
+                                        name=f'{treatment} {label}', color=colors[i],
+                                        legendgroup=treatment, showlegend=row == 1)
+            for trace in traces:
+                fig.add_trace(trace, row=row, col=1)
     
     # Update layout
     fig.update_layout(
@@ -3,109 +3,13 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 import os
-import glob
+import sys
 from mpl_toolkits.mplot3d import Axes3D
 
-def load_summary_data():
-    """
-    Load and calculate summary statistics from the actual CSV data files
-    """
-    # Get all CSV files
-    data_files = glob.glob("../../data/processed/response_variables/T*_response_variables_*.csv")
-    
-    if not data_files:
-        print("No data files found. Make sure you're running from the visualizations folder.")
-        return None
-    
-    all_data = []
-    for file in data_files:
-        try:
-            df = pd.read_csv(file)
-            all_data.append(df)
-        except Exception as e:
-            print(f"Error loading {file}: {e}")
-    
-    if not all_data:
-        print("No valid data found.")
-        return None
-    
-    # Combine all data
-    combined_df = pd.concat(all_data, ignore_index=True)
-    
-    # Calculate summary statistics for each treatment
-    treatments = sorted(combined_df['treatment'].unique())
-    summary_data = []
-    
-    for treatment in treatments:
-        treatment_data = combined_df[combined_df['treatment'] == treatment]
-        
-        if len(treatment_data) > 0:
-            summary = {
-                'treatment': treatment,
-                'tps_min': treatment_data['tps'].min(),
-                'tps_max': treatment_data['tps'].max(),
-                'tps_mean': treatment_data['tps'].mean(),
-                'cpu_min': treatment_data['cpu_usage'].min(),
-                'cpu_max': treatment_data['cpu_usage'].max(),
-                'cpu_mean': treatment_data['cpu_usage'].mean(),
-                'ram_min': treatment_data['ram_usage'].min(),
-                'ram_max': treatment_data['ram_usage'].max(),
-                'ram_mean': treatment_data['ram_usage'].mean(),
-            }
-            summary_data.append(summary)
-    
-    if not summary_data:
-        print("No summary data could be calculated.")
-        return None
-    
-    df_summary = pd.DataFrame(summary_data)
-    
-    # Round values for better presentation
-    numeric_columns = ['tps_min', 'tps_max', 'tps_mean', 'cpu_min', 'cpu_max', 'cpu_mean', 
-                      'ram_min', 'ram_max', 'ram_mean']
-    for col in numeric_columns:
-        if col in df_summary.columns:
-            df_summary[col] = df_summary[col].round(2)
-    
-    print(f"Loaded and calculated summary for treatments: {treatments}")
-    print(f"Summary data shape: {df_summary.shape}")
-    
-    return df_summary
-
-def load_raw_data():
-    """
-    Load raw data for detailed analysis from actual CSV files
-    """
-    # Get all CSV files
-    data_files = glob.glob("../../data/processed/response_variables/T*_response_variables_*.csv")
-    
-    if not data_files:
-        print("No data files found. Make sure you're running from the visualizations folder.")
-        return None
-    
-    all_data = []
-    for file in data_files:
-        try:
-            df = pd.read_csv(file)
-            all_data.append(df)
-        except Exception as e:
-            print(f"Error loading {file}: {e}")
-    
-    if not all_data:
-        print("No valid raw data found.")
-        return None
-    
-    # Combine all data
-    combined_df = pd.concat(all_data, ignore_index=True)
-    
-    # Convert date column to datetime if it exists
-    if 'date' in combined_df.columns:
-        combined_df['date'] = pd.to_datetime(combined_df['date'])
-    
-    print(f"Loaded raw data for treatments: {sorted(combined_df['treatment'].unique())}")
-    print(f"Total raw records: {len(combined_df)}")
-    
-    return combined_df
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from dataset import load_summary_data, load_raw_data
+from rendering import finish_figure
+from downsampling import pixel_budget, plot_downsampled
 
 def create_comprehensive_dashboard(df_summary, df_raw=None, save_path="dashboard"):
     """
@@ -296,7 +200,7 @@ Range: {tps_range.min():.2f}
     plt.savefig(filename, dpi=300, bbox_inches='tight')
     print(f"Saved dashboard: {filename}")
     
-    plt.show()
+    finish_figure()
 
 def create_time_series_plot(df_raw, save_path="dashboard"):
     """
@@ -312,21 +216,23 @@ def create_time_series_plot(df_raw, save_path="dashboard"):
     # Get unique treatments and colors
     treatments = sorted(df_raw['treatment'].unique())
     colors = plt.cm.Set3(np.linspace(0, 1, len(treatments)))
+    # Each trace is reduced to about one point per pixel column of the saved figure
+    max_points = pixel_budget(15, 300)
     
     for i, treatment in enumerate(treatments):
         treatment_data = df_raw[df_raw['treatment'] == treatment]
         
         # TPS
-        ax1.plot(treatment_data['date'], treatment_data['tps'], 
-                label=treatment, color=colors[i], linewidth=2)
+        plot_downsampled(ax1, treatment_data['date'], treatment_data['tps'], max_points,
+                         label=treatment, color=colors[i], linewidth=2)
         
         # CPU
-        ax2.plot(treatment_data['date'], treatment_data['cpu_usage'], 
-                label=treatment, color=colors[i], linewidth=2)
+        plot_downsampled(ax2, treatment_data['date'], treatment_data['cpu_usage'], max_points,
+                         label=treatment, color=colors[i], linewidth=2)
         
         # RAM
-        ax3.plot(treatment_data['date'], treatment_data['ram_usage'], 
-                label=treatment, color=colors[i], linewidth=2)
+        plot_downsampled(ax3, treatment_data['date'], treatment_data['ram_usage'], max_points,
+                         label=treatment, color=colors[i], linewidth=2)
     
     # Customize plots
     ax1.set_title('TPS Over Time', fontweight='bold')
@@ -351,7 +257,7 @@ def create_time_series_plot(df_raw, save_path="dashboard"):
     plt.savefig(filename, dpi=300, bbox_inches='tight')
     print(f"Saved time series plot: {filename}")
     
-    plt.show()
+    finish_figure()
 
 def main():
     """
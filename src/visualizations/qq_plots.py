@@ -1,54 +1,39 @@
 import pandas as pd
 import matplotlib.pyplot as plt
-import scipy.stats as stats
-import numpy as np
 import os
-import glob
-from scipy.stats import shapiro
+import sys
 
-def load_all_treatment_data():
-    """
-    Load and combine all treatment data for Q-Q plot analysis
-    """
-    # Get all CSV files
-    data_files = glob.glob("../../data/processed/response_variables/T*_response_variables_*.csv")
-    
-    if not data_files:
-        print("No data files found. Make sure you're running from the analysis folder.")
-        return None
-    
-    all_data = []
-    for file in data_files:
-        try:
-            df = pd.read_csv(file)
-            all_data.append(df)
-        except Exception as e:
-            print(f"Error loading {file}: {e}")
-    
-    if not all_data:
-        print("No valid data found.")
-        return None
-    
-    # Combine all data
-    combined_df = pd.concat(all_data, ignore_index=True)
-    print(f"Loaded data for treatments: {sorted(combined_df['treatment'].unique())}")
-    print(f"Total records: {len(combined_df)}")
-    
-    return combined_df
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from dataset import load_all_treatment_data
+from rendering import finish_figure
+from normality import normality_analysis, SHAPIRO_MAX_N
 
-def create_qq_plots_by_treatment(df, save_path="qq_plots"):
+METRICS = ['tps', 'cpu_usage', 'ram_usage']
+TEST_LABELS = {'shapiro': 'Shapiro', 'anderson_darling': 'Anderson-Darling'}
+# Columns of the per-metric normality CSVs; sample_size is last as before
+RESULT_COLUMNS = ['treatment', 'metric', 'test', 'p_value', 'is_normal', 'shapiro_statistic', 'shapiro_p_value',
+                  'shapiro_subsampled', 'anderson_statistic', 'anderson_p_value', 'dagostino_statistic',
+                  'dagostino_p_value', 'sample_size']
+
+def create_qq_plots_by_treatment(df, save_path="qq_plots", results_path=None, results=None):
     """
     Create Q-Q plots for each treatment and metric to test normality
+    (the normality test CSVs go to results_path, save_path by default)
+
+    The tests and the plotted quantiles (normality.QQ_POINTS) of every series come from
+    normality.normality_analysis; pass its output as results to reuse it.
     """
     if df is None or df.empty:
         print("No data to plot")
         return
     
     # Create output directory
+    results_path = results_path or save_path
     os.makedirs(save_path, exist_ok=True)
+    os.makedirs(results_path, exist_ok=True)
     
     # Metrics to analyze
-    metrics = ['tps', 'cpu_usage', 'ram_usage']
+    metrics = METRICS
     metric_titles = {
         'tps': 'TPS (Ticks Per Second)',
         'cpu_usage': 'CPU Usage (%)',
@@ -56,6 +41,7 @@ def create_qq_plots_by_treatment(df, save_path="qq_plots"):
     }
     
     treatments = sorted(df['treatment'].unique())
+    results = normality_analysis(df, metrics) if results is None else results
     
     for metric in metrics:
         # Create figure with subplots for each treatment
@@ -66,38 +52,28 @@ def create_qq_plots_by_treatment(df, save_path="qq_plots"):
         # Flatten axes for easier iteration
         axes = axes.flatten()
         
-        normality_results = []
+        normality_results = [result for result in results if result['metric'] == metric]
+        by_treatment = {result['treatment']: result for result in normality_results}
         
         for i, treatment in enumerate(treatments):
-            # Get data for this treatment
-            treatment_data = df[df['treatment'] == treatment][metric].dropna()
-            
-            if len(treatment_data) < 3:
-                print(f"Warning: Not enough data for {treatment} in {metric}")
+            result = by_treatment.get(treatment)
+            if result is None:
                 continue
             
-            # Create Q-Q plot
-            stats.probplot(treatment_data, dist="norm", plot=axes[i])
-            axes[i].set_title(f'{treatment}\n(n={len(treatment_data)})', fontweight='bold')
+            # Create Q-Q plot from the precomputed quantiles (as scipy.stats.probplot draws it)
+            qq = result['qq']
+            axes[i].plot(qq['theoretical'], qq['ordered'], 'bo')
+            axes[i].plot(qq['theoretical'], qq['slope'] * qq['theoretical'] + qq['intercept'], 'r-')
+            axes[i].set_xlabel('Theoretical quantiles')
+            axes[i].set_ylabel('Ordered Values')
+            axes[i].set_title(f'{treatment}\n(n={result["sample_size"]})', fontweight='bold')
             axes[i].grid(True, alpha=0.3)
             
-            # Perform Shapiro-Wilk test
-            if len(treatment_data) >= 3:
-                shapiro_stat, shapiro_p = shapiro(treatment_data)
-                normality_results.append({
-                    'treatment': treatment,
-                    'metric': metric,
-                    'shapiro_statistic': shapiro_stat,
-                    'shapiro_p_value': shapiro_p,
-                    'is_normal': shapiro_p > 0.05,
-                    'sample_size': len(treatment_data)
-                })
-                
-                # Add test result to plot
-                color = 'green' if shapiro_p > 0.05 else 'red'
-                axes[i].text(0.05, 0.95, f'Shapiro p={shapiro_p:.4f}', 
-                           transform=axes[i].transAxes, fontsize=9,
-                           bbox=dict(boxstyle='round', facecolor=color, alpha=0.3))
+            # Add test result to plot
+            color = 'green' if result['is_normal'] else 'red'
+            axes[i].text(0.05, 0.95, f'{TEST_LABELS[result["test"]]} p={result["p_value"]:.4f}', 
+                       transform=axes[i].transAxes, fontsize=9,
+                       bbox=dict(boxstyle='round', facecolor=color, alpha=0.3))
         
         # Hide unused subplots
         for j in range(len(treatments), len(axes)):
@@ -112,16 +88,18 @@ def create_qq_plots_by_treatment(df, save_path="qq_plots"):
         
         # Save normality test results
         if normality_results:
-            results_df = pd.DataFrame(normality_results)
-            results_filename = f"{save_path}/normality_test_{metric}.csv"
+            results_df = pd.DataFrame(normality_results)[RESULT_COLUMNS]
+            results_filename = f"{results_path}/normality_test_{metric}.csv"
             results_df.to_csv(results_filename, index=False)
             print(f"Normality test results saved: {results_filename}")
         
-        plt.show()
+        finish_figure()
 
-def create_comprehensive_qq_analysis(df, save_path="qq_plots"):
+def create_comprehensive_qq_analysis(df, save_path="qq_plots", results=None):
     """
     Create a comprehensive Q-Q analysis with summary statistics
+    (pass the normality_analysis output of create_qq_plots_by_treatment as results
+    to reuse it instead of testing again)
     """
     if df is None or df.empty:
         print("No data to analyze")
@@ -130,52 +108,51 @@ def create_comprehensive_qq_analysis(df, save_path="qq_plots"):
     # Create output directory
     os.makedirs(save_path, exist_ok=True)
     
-    metrics = ['tps', 'cpu_usage', 'ram_usage']
-    treatments = sorted(df['treatment'].unique())
+    metrics = METRICS
+    results = normality_analysis(df, metrics) if results is None else results
     
     all_normality_results = []
     
     print("\n" + "="*80)
     print("NORMALITY ANALYSIS SUMMARY")
     print("="*80)
+    print(f"Shapiro-Wilk up to n={SHAPIRO_MAX_N}; Anderson-Darling above it "
+          f"(D'Agostino K² and subsampled Shapiro-Wilk reported alongside)")
     
     for metric in metrics:
         print(f"\n{metric.upper()} ANALYSIS:")
         print("-" * 40)
         
-        for treatment in treatments:
-            treatment_data = df[df['treatment'] == treatment][metric].dropna()
+        for result in results:
+            if result['metric'] != metric:
+                continue
+            
+            # Store results
+            all_normality_results.append({
+                'metric': metric,
+                'treatment': result['treatment'],
+                'sample_size': result['sample_size'],
+                'mean': result['mean'],
+                'std': result['std'],
+                'skewness': result['skewness'],
+                'kurtosis': result['kurtosis'],
+                'shapiro_statistic': result['shapiro_statistic'],
+                'shapiro_p_value': result['shapiro_p_value'],
+                'is_normal_shapiro': result['shapiro_p_value'] > 0.05,
+                'shapiro_subsampled': result['shapiro_subsampled'],
+                'anderson_statistic': result['anderson_statistic'],
+                'anderson_p_value': result['anderson_p_value'],
+                'dagostino_statistic': result['dagostino_statistic'],
+                'dagostino_p_value': result['dagostino_p_value'],
+                'test': result['test'],
+                'p_value': result['p_value'],
+                'is_normal': result['is_normal']
+            })
             
-            if len(treatment_data) >= 3:
-                # Descriptive statistics
-                mean_val = treatment_data.mean()
-                std_val = treatment_data.std()
-                skewness = treatment_data.skew()
-                kurtosis = treatment_data.kurtosis()
-                
-                # Normality tests
-                shapiro_stat, shapiro_p = shapiro(treatment_data)
-                
-                # Store results
-                result = {
-                    'metric': metric,
-                    'treatment': treatment,
-                    'sample_size': len(treatment_data),
-                    'mean': mean_val,
-                    'std': std_val,
-                    'skewness': skewness,
-                    'kurtosis': kurtosis,
-                    'shapiro_statistic': shapiro_stat,
-                    'shapiro_p_value': shapiro_p,
-                    'is_normal_shapiro': shapiro_p > 0.05
-                }
-                
-                all_normality_results.append(result)
-                
-                # Print summary
-                normal_status = "NORMAL" if shapiro_p > 0.05 else "NOT NORMAL"
-                print(f"{treatment}: n={len(treatment_data)}, μ={mean_val:.2f}, "
-                      f"σ={std_val:.2f}, Shapiro p={shapiro_p:.4f} [{normal_status}]")
+            # Print summary
+            normal_status = "NORMAL" if result['is_normal'] else "NOT NORMAL"
+            print(f"{result['treatment']}: n={result['sample_size']}, μ={result['mean']:.2f}, "
+                  f"σ={result['std']:.2f}, {TEST_LABELS[result['test']]} p={result['p_value']:.4f} [{normal_status}]")
     
     # Save comprehensive results
     if all_normality_results:
@@ -191,7 +168,7 @@ def create_comprehensive_qq_analysis(df, save_path="qq_plots"):
         
         for metric in metrics:
             metric_data = results_df[results_df['metric'] == metric]
-            normal_count = metric_data['is_normal_shapiro'].sum()
+            normal_count = metric_data['is_normal'].sum()
             total_count = len(metric_data)
             
             print(f"\n{metric.upper()}:")
@@ -214,11 +191,14 @@ def main():
     df = load_all_treatment_data()
     
     if df is not None:
+        # Every series is tested once, in parallel, and both reports use the results
+        results = normality_analysis(df, METRICS)
+        
         print("\nGenerating Q-Q plots by treatment...")
-        create_qq_plots_by_treatment(df)
+        create_qq_plots_by_treatment(df, results=results)
         
         print("\nPerforming comprehensive normality analysis...")
-        create_comprehensive_qq_analysis(df)
+        create_comprehensive_qq_analysis(df, results=results)
         
         print("\n" + "="*60)
         print("Q-Q Plot Analysis Complete!")
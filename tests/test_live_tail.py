@@ -0,0 +1,55 @@
+import os
+import sys
+import sqlite3
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import live_tail
+from interval_set import IntervalSet
+
+MINUTE_MS = 60_000
+TREATMENT = {"name": "T1", "number": 1, "max_minutes_without_players": 5}
+# Ten hour window, so the first catch-up slice (CATCHUP_MS) ends before the window does
+ITERATION = ("1", 2025, 1, 1, 10, 0, 2025, 1, 1, 20, 0)
+
+
+def plan_database():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE plan_tps (date INTEGER, tps REAL, cpu_usage REAL, ram_usage INTEGER, players_online INTEGER)")
+    conn.execute("CREATE TABLE plan_ping (date INTEGER, avg_ping REAL)")
+    return conn
+
+
+def insert_minutes(conn, start_ms, minutes):
+    rows = [(start_ms + k * MINUTE_MS, 20.0, 10.0, 2048, 3) for k in range(minutes)]
+    conn.executemany("INSERT INTO plan_tps VALUES (?, ?, ?, ?, ?)", rows)
+    conn.executemany("INSERT INTO plan_ping VALUES (?, ?)", [(date, 40.0) for date, *_ in rows])
+    return rows[-1][0]
+
+
+def live_tail_for(window):
+    tail = live_tail.LiveTail.__new__(live_tail.LiveTail)
+    tail.exclusions = IntervalSet()
+    tail.open_task_ms = None
+    tail.windows = [window]
+    tail.summaries = {"T1": live_tail.RunningSummary()}
+    tail.counters = {"T1": {"excluded_rows": 0, "overloads": 0, "ms_behind": 0}}
+    return tail
+
+
+def test_poll_window_reads_rows_written_after_a_poll():
+    window = live_tail.LiveWindow(TREATMENT, ITERATION, resume_ms=0)
+    tail = live_tail_for(window)
+    conn = plan_database()
+
+    # First poll an hour into the window: the slice reaches past now and must not skip ahead
+    last_ms = insert_minutes(conn, window.start_ms, 60)
+    now_ms = last_ms + 30_000
+    tail.poll_window(conn, window, now_ms)
+    assert window.watermark_ms == last_ms
+    assert window.resume_point() <= now_ms
+
+    # Rows keep arriving; the next poll reads every one of them
+    last_ms = insert_minutes(conn, last_ms + MINUTE_MS, 30)
+    tail.poll_window(conn, window, last_ms + 30_000)
+    assert window.watermark_ms == last_ms
+    assert tail.summaries["T1"].rows == 90